@@ -0,0 +1,19 @@
+# aioutil.py - small asyncio helpers shared by the background loops
+
+import asyncio
+
+
+async def wait_event(event, timeout=None):
+    """
+    Clear event, then wait until it is set again or timeout seconds pass.
+    Uses a timer rather than asyncio.wait_for: on Python 3.11 wait_for can
+    swallow a cancel that lands just as the event fires, and then a
+    shutdown that cancels the loop never finishes.
+    """
+    event.clear()
+    timer = asyncio.get_running_loop().call_later(timeout, event.set) if timeout is not None else None
+    try:
+        await event.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
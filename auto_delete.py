@@ -0,0 +1,83 @@
+# auto_delete.py - persistent scheduler for "delete this message later"
+# Replaces sleeping inside handlers: deadlines live in a heap, backed by the
+# pending_deletes collection so a restart resumes them. When deadlines fire,
+# the due messages are deleted with one delete_messages call per chat.
+# Works with the async repository (main.py) or a plain pymongo collection (testbot.py).
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from aioutil import wait_event
+from repository import maybe_await
+
+DELETE_BATCH_SLACK = 1.0  # seconds: deadlines this close together share a call
+DELETE_MAX_IDS = 100  # Telegram limit per delete_messages call
+
+
+class DeleteScheduler:
+    def __init__(self, collection, slack=DELETE_BATCH_SLACK):
+        self.collection = collection
+        self.slack = slack
+        self._heap = []  # (due, seq, doc_id, chat_id, message_ids)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, due, doc_id, chat_id, message_ids):
+        heapq.heappush(self._heap, (due, next(self._seq), doc_id, chat_id, list(message_ids)))
+        self._wakeup.set()
+
+    async def schedule(self, chat_id, message_ids, seconds):
+        """Delete message_ids in chat_id after seconds (survives restarts)."""
+        due = time.time() + seconds
+        doc = {"chat_id": chat_id, "message_ids": list(message_ids), "due": due}
+        try:
+            res = await maybe_await(self.collection.insert_one(doc))
+            doc_id = res.inserted_id
+        except Exception as e:
+            # still delete on time in this process, just without persistence
+            print("Delete schedule persist error:", e)
+            doc_id = None
+        self._push(due, doc_id, chat_id, message_ids)
+
+    async def resume(self):
+        """Reload deletions that were pending when the bot last stopped."""
+        # repository find() is awaited to a list, a pymongo cursor is iterated
+        docs = list(await maybe_await(self.collection.find({})))
+        for doc in docs:
+            self._push(doc.get("due", 0), doc["_id"], doc["chat_id"], doc.get("message_ids", []))
+        return len(docs)
+
+    async def run(self, delete):
+        """Fire loop; delete(chat_id, message_ids) is awaited per chat batch."""
+        while True:
+            now = time.time()
+            if not self._heap or self._heap[0][0] > now:
+                await wait_event(self._wakeup, self._heap[0][0] - now if self._heap else None)
+                continue
+
+            per_chat = {}
+            doc_ids = []
+            while self._heap and self._heap[0][0] <= now + self.slack:
+                _, _, doc_id, chat_id, message_ids = heapq.heappop(self._heap)
+                per_chat.setdefault(chat_id, []).extend(message_ids)
+                if doc_id is not None:
+                    doc_ids.append(doc_id)
+
+            for chat_id, message_ids in per_chat.items():
+                for i in range(0, len(message_ids), DELETE_MAX_IDS):
+                    try:
+                        await delete(chat_id, message_ids[i:i + DELETE_MAX_IDS])
+                    except Exception as e:
+                        # already gone or no rights: nothing to retry
+                        print("Could not delete messages:", e)
+
+            if doc_ids:
+                try:
+                    await maybe_await(self.collection.delete_many({"_id": {"$in": doc_ids}}))
+                except Exception as e:
+                    print("Delete schedule cleanup error:", e)
@@ -0,0 +1,303 @@
+# backup.py - streaming filter export/import for /status -> Backup / Import
+# Filters are read through a batched cursor and written as gzip-compressed
+# NDJSON (one filter document per line, chat_id included) by a worker
+# thread, so memory stays at one batch regardless of group size and the
+# event loop never blocks on compression or disk writes.
+# Imports go the other way: a worker thread incrementally parses a JSON
+# array or NDJSON file (plain or gzip), normalizes each filter, and the
+# loop writes the batches with unordered bulk upserts. A backup of one
+# group is restored into the target group; a "Backup all groups" archive
+# (more than one chat_id) puts each filter back into its own group.
+
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from normalize import set_norm
+from payloads import build_payload
+
+BACKUP_BATCH = int(os.environ.get("BACKUP_BATCH", "500"))  # docs per cursor batch / write
+IMPORT_BATCH = int(os.environ.get("IMPORT_BATCH", "1000"))  # upserts per bulk_write
+IMPORT_ERRORS_KEPT = 20  # per-item errors listed in the report
+
+_READ_SIZE = 64 * 1024
+
+
+def _write_lines(fh, docs):
+    fh.write("".join(json.dumps(doc, ensure_ascii=False, default=str) + "\n" for doc in docs))
+
+
+async def export_filters(collection, chat_ids, path, batch_size=BACKUP_BATCH):
+    """
+    Write every filter of chat_ids to path (gzip NDJSON).
+    Returns {chat_id: number of filters written}.
+    """
+    counts = {chat_id: 0 for chat_id in chat_ids}
+    fh = await asyncio.to_thread(gzip.open, path, "wt", encoding="utf-8")
+    try:
+        for chat_id in chat_ids:
+            cursor = collection.cursor({"chat_id": chat_id}, {"_id": 0}, sort=[("keyword", 1)], batch_size=batch_size)
+            try:
+                batch = []
+                async for doc in cursor:
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        await asyncio.to_thread(_write_lines, fh, batch)
+                        counts[chat_id] += len(batch)
+                        batch = []
+                if batch:
+                    await asyncio.to_thread(_write_lines, fh, batch)
+                    counts[chat_id] += len(batch)
+            finally:
+                await cursor.close()
+    finally:
+        await asyncio.to_thread(fh.close)
+    return counts
+
+
+@asynccontextmanager
+async def backup_file(name):
+    """Path for a backup named name inside a temp dir removed on exit."""
+    tmp_dir = tempfile.mkdtemp(prefix="backup-")
+    try:
+        yield os.path.join(tmp_dir, name)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
+
+
+# ---------------- import ----------------
+
+def _open_backup(path):
+    """Text stream over a backup file, transparently gunzipping."""
+    with open(path, "rb") as fh:
+        magic = fh.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8-sig")
+
+
+def _iter_array(fh, buf):
+    """(position, item) for each element of a JSON array, read in chunks."""
+    decoder = json.JSONDecoder()
+    pos = buf.index("[") + 1
+    eof = False
+    n = 0
+    while True:
+        # skip whitespace and separators, reading more as needed
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = fh.read(_READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+        if pos >= len(buf):
+            raise ValueError(f"unexpected end of file after item {n}")
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"item {n + 1}: {e.msg}") from None
+            chunk = fh.read(_READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        n += 1
+        yield f"item {n}", item
+        pos = end
+
+
+def iter_backup(path):
+    """
+    (position, item) for each filter in a JSON array or NDJSON backup,
+    without loading the file. An item is a ValueError for lines that don't
+    parse; a malformed array raises, since it can't be resynchronized.
+    """
+    with _open_backup(path) as fh:
+        buf = fh.read(_READ_SIZE)
+        while buf and not buf.strip():
+            buf = fh.read(_READ_SIZE)
+        if buf.lstrip().startswith("["):
+            yield from _iter_array(fh, buf)
+            return
+        lineno = 0
+        for line in _chain_lines(buf, fh):
+            lineno += 1
+            if not line.strip():
+                continue
+            try:
+                yield f"line {lineno}", json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"line {lineno}", ValueError(e.msg)
+
+
+def _chain_lines(buf, fh):
+    # the first chunk was already read for format detection
+    head, sep, rest = buf.rpartition("\n")
+    if sep:
+        yield from head.split("\n")
+        buf = rest
+    for line in fh:
+        if buf:
+            line, buf = buf + line, ""
+        yield line
+    if buf:
+        yield buf
+
+
+def _scan_chat_ids(path):
+    chat_ids = set()
+    try:
+        for _, item in iter_backup(path):
+            if isinstance(item, dict) and item.get("chat_id") is not None:
+                try:
+                    chat_ids.add(int(item["chat_id"]))
+                except (ValueError, TypeError):
+                    pass  # reported as a bad item by the import
+    except (ValueError, UnicodeDecodeError, OSError, EOFError):
+        pass  # the import stops at the same place and reports it
+    return chat_ids
+
+
+async def backup_chat_ids(path):
+    """Set of chat_ids the filters in the backup at path were exported from."""
+    return await asyncio.to_thread(_scan_chat_ids, path)
+
+
+def normalize_item(item, chat_id, own_chat=False):
+    """
+    Filter document ready to upsert into chat_id (into its own chat_id, if
+    it has one and own_chat is set); raises ValueError if unusable.
+    """
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("not a JSON object")
+    keyword = item.get("keyword")
+    if not isinstance(keyword, str) or not keyword.strip():
+        raise ValueError("missing keyword")
+    doc = dict(item)
+    doc.pop("_id", None)
+    if own_chat and item.get("chat_id") is not None:
+        doc["chat_id"] = int(item["chat_id"])
+    else:
+        doc["chat_id"] = chat_id
+    doc["keyword"] = keyword.strip().lower()
+    buttons = doc.get("buttons") or []
+    if not isinstance(buttons, list):
+        raise ValueError("buttons must be a list")
+    doc["buttons"] = buttons
+    if not isinstance(doc.get("text") or "", str):
+        raise ValueError("text must be a string")
+    if doc.get("type") not in ("photo", "text"):
+        doc["type"] = "photo" if doc.get("file_id") else "text"
+    doc["payload"] = build_payload(doc)
+    set_norm(doc)
+    return doc
+
+
+def _next_batch(items, chat_id, size, own_chat=False):
+    """
+    Up to size normalized docs (deduplicated by chat and keyword), the
+    items that failed, how many items were read, and a fatal parse error
+    (or None).
+    """
+    docs = {}
+    errors = []
+    seen = 0
+    while seen < size:
+        try:
+            where, item = next(items)
+        except StopIteration:
+            break
+        except (ValueError, UnicodeDecodeError, OSError, EOFError) as e:
+            return list(docs.values()), errors, seen, str(e)
+        seen += 1
+        try:
+            doc = normalize_item(item, chat_id, own_chat)
+        except (ValueError, TypeError) as e:
+            errors.append((where, str(e)))
+        else:
+            # a repeated keyword in one unordered batch would race its own upsert
+            docs[doc["chat_id"], doc["keyword"]] = doc
+    return list(docs.values()), errors, seen, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0       # items read from the file
+        self.upserted = 0   # new filters
+        self.modified = 0   # existing filters overwritten
+        self.failed = 0
+        self.errors = []    # first IMPORT_ERRORS_KEPT (position, message)
+        self.chats = {}     # chat_id -> new filters, for every chat written to
+
+    def _upserted(self, docs, indexes):
+        for doc in docs:
+            self.chats.setdefault(doc["chat_id"], 0)
+        for i in indexes:
+            self.chats[docs[i]["chat_id"]] += 1
+        self.upserted += len(indexes)
+
+    def error(self, where, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_ERRORS_KEPT:
+            self.errors.append((where, message))
+
+
+async def import_filters(collection, path, chat_id, progress=None, batch_size=IMPORT_BATCH, report=None, own_chat=False):
+    """
+    Upsert every filter in the backup at path into chat_id, or with
+    own_chat into the chat_id stored with each filter (chat_id if none).
+    progress(report) is awaited after each batch. Bad items are reported
+    and skipped; a file that can't be parsed any further stops the import
+    with what was written so far (the error is in the report). Pass a
+    report to still have the counts if a write raises midway.
+    """
+    report = report if report is not None else ImportReport()
+    items = iter_backup(path)
+    try:
+        while True:
+            done = await _import_batch(collection, items, chat_id, batch_size, report, own_chat)
+            if progress is not None:
+                await progress(report)
+            if done:
+                return report
+    finally:
+        await asyncio.to_thread(items.close)
+
+
+async def _import_batch(collection, items, chat_id, batch_size, report, own_chat):
+    """Parse and write one batch into report; True once the file is exhausted."""
+    docs, errors, seen, fatal = await asyncio.to_thread(_next_batch, items, chat_id, batch_size, own_chat)
+    report.read += seen
+    for where, message in errors:
+        report.error(where, message)
+    if docs:
+        ops = [UpdateOne({"chat_id": d["chat_id"], "keyword": d["keyword"]}, {"$set": d}, upsert=True) for d in docs]
+        try:
+            res = await collection.bulk_write(ops, ordered=False, timeout=120)
+            report._upserted(docs, list(res.upserted_ids))
+            report.modified += res.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            report._upserted(docs, [u["index"] for u in details.get("upserted", [])])
+            report.modified += details.get("nMatched", 0)
+            for err in details.get("writeErrors", []):
+                report.error(f"keyword {docs[err['index']]['keyword']!r}", err.get("errmsg", "write failed"))
+    if fatal is not None:
+        report.error("file", fatal)
+        return True
+    return seen < batch_size
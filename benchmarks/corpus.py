@@ -0,0 +1,104 @@
+# benchmarks/corpus.py - deterministic synthetic scenepack data for the benchmarks
+# Keyword corpora mix transliterated Tamil titles, Tamil-script titles and
+# English words; message streams mix typos, exact titles, chatter and
+# emoji noise the way a busy group does. Same seed, same data, on every
+# machine and commit.
+
+import random
+
+CONSONANTS = ["k", "g", "ch", "j", "t", "d", "th", "n", "p", "b", "m", "y", "r", "l", "v", "zh", "s", "h", "sh", "f"]
+VOWELS = ["a", "aa", "i", "ee", "u", "oo", "e", "ai", "o", "au"]
+ENGLISH = [
+    "love", "story", "the", "king", "return", "of", "night", "boys", "girl", "master",
+    "beast", "warrior", "mission", "dark", "city", "game", "life", "secret", "hero", "police",
+]
+TAMIL = [
+    "விக்ரம்", "மாஸ்டர்", "பீஸ்ட்", "ஜெயிலர்", "லியோ", "காதல்", "வாழ்க்கை", "கனவு",
+    "இரவு", "போலீஸ்", "அசுரன்", "கைதி", "வடசென்னை", "பேட்ட", "தெறி", "மெர்சல்",
+]
+CHATTER = [
+    "bro any update", "good morning nanba", "super scene", "when will you upload",
+    "thanks bro", "romba nalla iruku", "send link pls", "hi all",
+    "வணக்கம் நண்பா", "semma bro 🔥🔥", "admin pls reply 🙏", "ok",
+]
+EMOJI = ["🔥", "❤️", "🙏", "😍", "🎬", "💥"]
+
+
+def make_word(rnd):
+    return "".join(rnd.choice(CONSONANTS) + rnd.choice(VOWELS) for _ in range(rnd.randint(1, 3)))
+
+
+def make_title(rnd):
+    words = []
+    for _ in range(rnd.randint(1, 3)):
+        r = rnd.random()
+        if r < 0.15:
+            words.append(rnd.choice(ENGLISH))
+        elif r < 0.25:
+            words.append(rnd.choice(TAMIL))
+        else:
+            words.append(make_word(rnd))
+    title = " ".join(words)
+    if rnd.random() < 0.2:
+        title += f" {rnd.randint(1, 3)}"
+    return title
+
+
+def typo(rnd, s):
+    """One substituted, dropped or doubled character."""
+    if len(s) < 3:
+        return s
+    i = rnd.randrange(len(s))
+    kind = rnd.random()
+    if kind < 0.5:
+        return s[:i] + rnd.choice("aeioukmnrt") + s[i + 1:]
+    if kind < 0.75:
+        return s[:i] + s[i + 1:]
+    return s[:i] + s[i] + s[i:]
+
+
+def make_corpus(size, seed=1):
+    """size distinct lowercase keywords."""
+    rnd = random.Random(seed)
+    seen = set()
+    while len(seen) < size:
+        seen.add(make_title(rnd).lower())
+    return sorted(seen)
+
+
+def make_queries(keywords, count=300, seed=2):
+    """A group message stream: 1/3 typos of known titles, 1/3 chatter, 1/3 unknown titles."""
+    rnd = random.Random(seed)
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            q = typo(rnd, rnd.choice(keywords))
+            if rnd.random() < 0.3:
+                q = q.title()
+            if rnd.random() < 0.2:
+                q += " " + rnd.choice(EMOJI) * rnd.randint(1, 3)
+            queries.append(q)
+        elif kind == 1:
+            queries.append(rnd.choice(CHATTER))
+        else:
+            queries.append(make_title(rnd))
+    return queries
+
+
+def make_filter_docs(keywords, seed=3):
+    """Filter documents as /filter stores them, about half with buttonurl markup."""
+    rnd = random.Random(seed)
+    docs = []
+    for kw in keywords:
+        text = f"{kw.title()} scenepack\nQuality: 1080p"
+        if rnd.random() < 0.5:
+            text += "".join(
+                f"\n[Part {i}](buttonurl:https://t.me/c/123/{rnd.randint(1, 99999)})"
+                for i in range(1, rnd.randint(2, 4))
+            )
+        doc = {"chat_id": -100, "keyword": kw, "type": "photo", "text": text, "file_id": "AgAC" + "x" * 60}
+        if rnd.random() < 0.3:
+            doc["buttons"] = [{"text": "Channel", "url": "https://t.me/sachu"}]
+        docs.append(doc)
+    return docs
@@ -0,0 +1,635 @@
+# benchmarks/fakemongo.py - in-process MongoDB stand-in for the replay harness
+# Enough of the pymongo API for what the bots actually issue: find (filter
+# operators, dotted paths, sort, limit, projection), find_one, insert,
+# update ($set/$unset/$inc/$addToSet/$push/$setOnInsert, upsert),
+# find_one_and_update, delete, count_documents, distinct, bulk_write,
+# aggregate ($match/$group/$sort/$limit), create_index and explain.
+# FakeMongoClient is the sync client (db.py), AsyncFakeMongoClient the
+# AsyncMongoClient one (repository.py). Every operation is counted per
+# collection/op and can be given an artificial latency. Not modelled:
+# unique index enforcement, transactions, write concerns.
+
+import asyncio
+import copy
+import time
+from collections import Counter
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+# ---------------- query evaluation ----------------
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _compare(value, cond, op):
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > cond
+        if op == "$gte":
+            return value >= cond
+        if op == "$lt":
+            return value < cond
+        return value <= cond
+    except TypeError:
+        return False  # Mongo only compares within a type bracket
+
+
+def _equals(value, cond):
+    if value is _MISSING:
+        return cond is None
+    if isinstance(value, list) and not isinstance(cond, list):
+        return cond in value
+    return value == cond
+
+
+def _match_value(value, cond):
+    if not (isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)):
+        return _equals(value, cond)
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = _equals(value, arg)
+        elif op == "$ne":
+            ok = not _equals(value, arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _compare(value, arg, op)
+        elif op == "$in":
+            ok = any(_equals(value, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equals(value, a) for a in arg)
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(arg)
+        else:
+            raise NotImplementedError(f"fakemongo: query operator {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc, query):
+    for key, cond in (query or {}).items():
+        if key == "$and":
+            ok = all(matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(matches(doc, q) for q in cond)
+        else:
+            ok = _match_value(_get(doc, key), cond)
+        if not ok:
+            return False
+    return True
+
+
+def _sort_key(value):
+    # Mongo orders missing/null first, then numbers, then strings
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, str(value))
+
+
+def sort_docs(docs, sort):
+    if isinstance(sort, dict):
+        sort = list(sort.items())
+    for key, direction in reversed(sort or []):
+        docs.sort(key=lambda d: _sort_key(_get(d, key)), reverse=direction < 0)
+    return docs
+
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = dict.fromkeys(projection, 1)
+    include = [k for k, v in projection.items() if v and k != "_id"]
+    if include:
+        out = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+# ---------------- updates ----------------
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def apply_update(doc, update, inserting=False):
+    if not any(k.startswith("$") for k in update):
+        # replacement document
+        keep = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if keep is not None:
+            doc["_id"] = keep
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$addToSet", "$push"):
+                current = _get(doc, path)
+                items = current if isinstance(current, list) else []
+                if current is _MISSING:
+                    _set(doc, path, items)
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for v in values:
+                    if op == "$push" or v not in items:
+                        items.append(copy.deepcopy(v))
+            else:
+                raise NotImplementedError(f"fakemongo: update operator {op}")
+
+
+def _upsert_base(query):
+    """New document seeded from the equality conditions of query."""
+    doc = {}
+    for key, cond in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            if "$eq" in cond:
+                _set(doc, key, copy.deepcopy(cond["$eq"]))
+            continue
+        _set(doc, key, copy.deepcopy(cond))
+    return doc
+
+
+# ---------------- sync API ----------------
+
+class FakeCursor:
+    """pymongo Cursor subset: sort/limit chaining, iteration, to_list, explain."""
+
+    def __init__(self, collection, query, projection=None, sort=None, limit=0):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self._sort = list(sort.items()) if isinstance(sort, dict) else list(sort or [])
+        self._limit = limit
+        self._docs = None
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort.append((key_or_list, direction))
+        else:
+            self._sort.extend(key_or_list)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def _results(self):
+        if self._docs is None:
+            docs = [d for d in self.collection.docs.values() if matches(d, self.query)]
+            sort_docs(docs, self._sort)
+            if self._limit:
+                docs = docs[:self._limit]
+            self._docs = [project(d, self.projection) for d in docs]
+        return self._docs
+
+    def __iter__(self):
+        return iter(self._results())
+
+    def to_list(self, length=None):
+        docs = self._results()
+        return list(docs if length is None else docs[:length])
+
+    def close(self):
+        self._docs = []
+
+    def explain(self):
+        return self.collection.explain(self.query, self._sort)
+
+
+class FakeCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.docs = {}  # _id -> document, insertion ordered
+        self.indexes = {"_id_": [("_id", 1)]}
+
+    def _call(self, op):
+        self.database.client._record(self.name, op)
+
+    def _matching(self, query, limit=0):
+        if query and set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        found = []
+        for doc in self.docs.values():
+            if matches(doc, query):
+                found.append(doc)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    def _insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs[doc["_id"]] = doc
+        return doc["_id"]
+
+    def seed(self, docs):
+        """Load documents without counting them as operations."""
+        for doc in docs:
+            self._insert(copy.deepcopy(doc))
+
+    # ---- reads ----
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, **kwargs):
+        self._call("find")
+        return FakeCursor(self, filter or {}, projection, sort, limit)
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        self._call("find_one")
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        sort = kwargs.get("sort")
+        found = self._matching(filter or {}, 0 if sort else 1)
+        if sort:
+            sort_docs(found, sort)
+        return project(found[0], projection) if found else None
+
+    def count_documents(self, filter, **kwargs):
+        self._call("count_documents")
+        return len(self._matching(filter))
+
+    def distinct(self, key, filter=None, **kwargs):
+        self._call("distinct")
+        values = []
+        for doc in self._matching(filter or {}):
+            value = _get(doc, key)
+            for v in value if isinstance(value, list) else [value]:
+                if v is not _MISSING and v not in values:
+                    values.append(v)
+        return values
+
+    def aggregate(self, pipeline, **kwargs):
+        self._call("aggregate")
+        docs = list(self.docs.values())
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [d for d in docs if matches(d, spec)]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = sort_docs(list(docs), spec)
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$project":
+                docs = [project(d, spec) for d in docs]
+            else:
+                raise NotImplementedError(f"fakemongo: aggregate stage {name}")
+        return FakeCursor(_Rows(docs), {})
+
+    # ---- writes ----
+
+    def insert_one(self, document, **kwargs):
+        self._call("insert_one")
+        # pymongo adds _id to the caller's dict; keep our own copy
+        document.setdefault("_id", ObjectId())
+        return InsertOneResult(self._insert(copy.deepcopy(document)), True)
+
+    def insert_many(self, documents, **kwargs):
+        self._call("insert_many")
+        for doc in documents:
+            doc.setdefault("_id", ObjectId())
+            self._insert(copy.deepcopy(doc))
+
+    def _update(self, query, update, upsert, many):
+        found = self._matching(query, 0 if many else 1)
+        modified = 0
+        for doc in found:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            modified += doc != before
+        if found or not upsert:
+            return {"n": len(found), "nModified": modified}, found
+        doc = _upsert_base(query)
+        apply_update(doc, update, inserting=True)
+        _id = self._insert(doc)
+        return {"n": 1, "nModified": 0, "upserted": _id}, [doc]
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        self._call("update_one")
+        return UpdateResult(self._update(filter, update, upsert, False)[0], True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        self._call("update_many")
+        return UpdateResult(self._update(filter, update, upsert, True)[0], True)
+
+    def find_one_and_update(self, filter, update, projection=None, upsert=False, return_document=False, **kwargs):
+        self._call("find_one_and_update")
+        found = self._matching(filter, 1)
+        before = project(found[0], projection) if found else None
+        _, docs = self._update(filter, update, upsert, False)
+        if return_document:  # ReturnDocument.AFTER
+            return project(docs[0], projection) if docs else None
+        return before
+
+    def delete_one(self, filter, **kwargs):
+        self._call("delete_one")
+        found = self._matching(filter, 1)
+        for doc in found:
+            del self.docs[doc["_id"]]
+        return DeleteResult({"n": len(found)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        self._call("delete_many")
+        found = self._matching(filter)
+        for doc in found:
+            del self.docs[doc["_id"]]
+        return DeleteResult({"n": len(found)}, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        self._call("bulk_write")
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        for index, request in enumerate(requests):
+            if isinstance(request, (UpdateOne, UpdateMany)):
+                raw, _ = self._update(request._filter, request._doc, request._upsert, isinstance(request, UpdateMany))
+                if "upserted" in raw:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                else:
+                    result["nMatched"] += raw["n"]
+                    result["nModified"] += raw["nModified"]
+            elif isinstance(request, InsertOne):
+                self._insert(copy.deepcopy(request._doc))
+                result["nInserted"] += 1
+            elif isinstance(request, (DeleteOne, DeleteMany)):
+                found = self._matching(request._filter, 0 if isinstance(request, DeleteMany) else 1)
+                for doc in found:
+                    del self.docs[doc["_id"]]
+                result["nRemoved"] += len(found)
+            else:
+                raise NotImplementedError(f"fakemongo: bulk request {type(request).__name__}")
+        return BulkWriteResult(result, True)
+
+    # ---- indexes ----
+
+    def create_index(self, keys, **kwargs):
+        self._call("create_index")
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = kwargs.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        self.indexes[name] = list(keys)
+        return name
+
+    def explain(self, query, sort=None):
+        """queryPlanner-shaped plan: IXSCAN if an index prefix covers the query, else COLLSCAN."""
+        fields = [k for k in (query or {}) if not k.startswith("$")]
+        sort_fields = [k for k, _ in sort or []]
+        for name, keys in self.indexes.items():
+            prefix = [k for k, _ in keys]
+            if fields and set(fields) <= set(prefix[:len(fields)]) or (not fields and sort_fields and prefix[:1] == sort_fields[:1]):
+                return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}}}
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+
+class _Rows:
+    """Result rows of an aggregate, readable through FakeCursor."""
+
+    def __init__(self, docs):
+        self.docs = {i: d for i, d in enumerate(docs)}
+
+
+def _group(docs, spec):
+    groups = {}
+    key_expr = spec["_id"]
+    for doc in docs:
+        key = _get(doc, key_expr[1:]) if isinstance(key_expr, str) and key_expr.startswith("$") else key_expr
+        key = None if key is _MISSING else key
+        out = groups.get(key)
+        if out is None:
+            out = groups[key] = {"_id": key}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, arg), = acc.items()
+            if op != "$sum":
+                raise NotImplementedError(f"fakemongo: accumulator {op}")
+            value = _get(doc, arg[1:]) if isinstance(arg, str) and arg.startswith("$") else arg
+            out[field] = out.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+    return list(groups.values())
+
+
+class FakeDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        col = self._collections.get(name)
+        if col is None:
+            col = self._collections[name] = FakeCollection(self, name)
+        return col
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, command, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        self.client._record("$cmd", name)
+        if name == "dbstats":
+            size = sum(len(repr(d)) for db in self.client._databases.values()
+                       for c in db._collections.values() for d in c.docs.values())
+            return {"db": self.name, "dataSize": size, "storageSize": size, "ok": 1.0}
+        return {"ok": 1.0}
+
+
+class FakeMongoClient:
+    """
+    Drop-in for pymongo.MongoClient (constructor arguments are ignored).
+    calls counts operations per (collection, op); on_call(collection, op),
+    if set, is called for each; latency (seconds) is slept before each one.
+    """
+
+    def __init__(self, *args, latency=0.0, on_call=None, **kwargs):
+        self.latency = latency
+        self.on_call = on_call
+        self.calls = Counter()
+        self._databases = {}
+
+    def __getitem__(self, name):
+        db = self._databases.get(name)
+        if db is None:
+            db = self._databases[name] = FakeDatabase(self, name)
+        return db
+
+    def get_database(self, name):
+        return self[name]
+
+    @property
+    def admin(self):
+        return self["admin"]
+
+    def _record(self, collection, op):
+        self.calls[(collection, op)] += 1
+        if self.on_call is not None:
+            self.on_call(collection, op)
+        self._wait()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def close(self):
+        pass
+
+
+# ---------------- async API ----------------
+
+class AsyncFakeCursor:
+    """AsyncCursor subset: to_list, async iteration, close, explain."""
+
+    def __init__(self, cursor, latency):
+        self._cursor = cursor
+        self._latency = latency
+        self._iter = None
+
+    def sort(self, key_or_list, direction=1):
+        self._cursor.sort(key_or_list, direction)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self._latency)
+        return self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iter is None:
+            await asyncio.sleep(self._latency)
+            self._iter = iter(self._cursor)
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self._cursor.close()
+
+    async def explain(self):
+        return self._cursor.explain()
+
+
+class AsyncFakeCollection:
+    """Async face of a FakeCollection; the data and call counts are shared."""
+
+    def __init__(self, collection, latency):
+        self._col = collection
+        self._latency = latency
+        self.name = collection.name
+
+    async def _wait(self):
+        await asyncio.sleep(self._latency)  # 0 still yields, like a real round trip
+
+    def seed(self, docs):
+        self._col.seed(docs)
+
+    def find(self, *args, **kwargs):
+        kwargs.pop("batch_size", None)
+        return AsyncFakeCursor(self._col.find(*args, **kwargs), self._latency)
+
+    async def aggregate(self, pipeline, **kwargs):
+        await self._wait()
+        return AsyncFakeCursor(self._col.aggregate(pipeline, **kwargs), 0)
+
+    def __getattr__(self, op):
+        if op.startswith("_"):
+            raise AttributeError(op)
+        method = getattr(self._col, op)
+
+        async def call(*args, **kwargs):
+            await self._wait()
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncFakeDatabase:
+    def __init__(self, database, latency):
+        self._db = database
+        self._latency = latency
+        self.name = database.name
+
+    def __getitem__(self, name):
+        return AsyncFakeCollection(self._db[name], self._latency)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command, **kwargs):
+        return self._db.command(command, **kwargs)
+
+
+class AsyncFakeMongoClient:
+    """Drop-in for pymongo.AsyncMongoClient; latency is awaited instead of slept."""
+
+    def __init__(self, *args, latency=0.0, on_call=None, **kwargs):
+        self._client = FakeMongoClient(on_call=on_call)
+        self.latency = latency
+
+    @property
+    def calls(self):
+        return self._client.calls
+
+    def __getitem__(self, name):
+        return AsyncFakeDatabase(self._client[name], self.latency)
+
+    def get_database(self, name):
+        return self[name]
+
+    @property
+    def admin(self):
+        return self["admin"]
+
+    async def close(self):
+        pass
@@ -0,0 +1,46 @@
+# benchmarks/match_bench.py - fuzzy match latency, full scan vs n-gram index
+# Run from the repo root:  python -m benchmarks.match_bench [sizes...]
+# (benchmarks.suite covers this and more, with JSON output)
+# No network, Mongo or Telegram needed.
+
+import sys
+import time
+
+from benchmarks.corpus import make_corpus, make_queries
+from filter_cache import ChatFilters
+from matcher import FUZZY_THRESHOLD, best_match, match_indexed
+from normalize import normalize
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentile(samples, 50), percentile(samples, 99)
+
+
+def run(size):
+    keywords = make_corpus(size)
+    chat = ChatFilters(1, [{"keyword": k} for k in keywords])
+    queries = [normalize(q) for q in make_queries(keywords)]
+    full = timed(lambda q: best_match(q, chat.keywords, FUZZY_THRESHOLD), queries)
+    indexed = timed(lambda q: match_indexed(q, chat.index, FUZZY_THRESHOLD), queries)
+    cand = sum(len(chat.index.candidates(q) or chat.index.keys) for q in queries) / len(queries)
+    print(
+        f"{size:>7} keywords | full p50 {full[0]:.3f} ms p99 {full[1]:.3f} ms"
+        f" | indexed p50 {indexed[0]:.3f} ms p99 {indexed[1]:.3f} ms"
+        f" | avg candidates {cand:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    for n in sizes:
+        run(n)
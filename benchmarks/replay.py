@@ -0,0 +1,707 @@
+# benchmarks/replay.py - end-to-end replay / load harness for main.py and testbot.py
+# Run from the repo root:
+#   python -m benchmarks.replay main [--count 2000] [--rate 200] [--out report.json]
+#   python -m benchmarks.replay testbot --events stream.jsonl --rate 0
+#   python -m benchmarks.replay main --save-events stream.jsonl   (keep the synthetic stream)
+# Updates go through the bot's real registered handlers: Pyrogram's dispatch
+# order (first matching handler per group) for main.py,
+# Application.process_update for testbot.py. Telegram is a fake that
+# records every outbound API call, Mongo is benchmarks.fakemongo seeded with
+# synthetic filters. Reports throughput, per-handler and per-chat latency, DB calls per
+# update and outbound calls. Needs the bot's own dependencies, no network.
+#
+# Event stream (JSONL, one update per line):
+#   {"kind": "text", "chat": -1001000000001, "user": 1042, "text": "leo"}
+#   {"kind": "photo", "chat": 1, "user": 1, "caption": "/filter \"leo\"\n..."}
+#   {"kind": "callback", "chat": -1001000000001, "user": 1042, "data": "fpage|..."}
+# Negative chat ids are supergroups, positive ones private chats. An optional
+# "t" (seconds since the first update) replays recorded timing when --rate
+# is not given.
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import importlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from benchmarks.corpus import make_corpus, make_filter_docs, make_queries, make_title
+from benchmarks.fakemongo import AsyncFakeMongoClient, FakeMongoClient
+from benchmarks.suite import git_commit, percentile
+from callbacks import encode_cb
+from filter_pages import FILTERS_PER_PAGE, NEXT
+from normalize import set_norm
+from payloads import build_payload
+
+ADMIN_ID = 1
+BOT_USER = {"id": 999, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+GROUP_BASE = -1001000000000
+USER_BASE = 1000
+USERS = 200  # distinct group members sending texts
+ADMIN_PAGE = 10  # main.PER_PAGE, keywords per admin listing page
+
+DEFAULT_COUNT = 2000
+DEFAULT_RATE = 200.0  # updates/sec when events carry no timing
+DEFAULT_CHATS = 5
+DEFAULT_FILTERS = 1000  # per chat
+TOP_CHATS = 8  # chats listed in the per-chat latency table
+DRAIN_SECONDS = 5.0  # wait this long for queued sends after the last update
+
+# per-update accounting, set around each handler call (DB calls from tasks
+# spawned by the handler are charged to the same update)
+_current = ContextVar("replay_update", default=None)
+
+
+# ---------------- synthetic streams ----------------
+
+class Scenario:
+    """Groups, their filter keywords and message streams, all from one seed."""
+
+    def __init__(self, chats=DEFAULT_CHATS, filters=DEFAULT_FILTERS, seed=1):
+        self.groups = [GROUP_BASE - i for i in range(1, chats + 1)]
+        self.keywords = {g: make_corpus(filters, seed + i) for i, g in enumerate(self.groups)}
+        self.queries = {g: make_queries(self.keywords[g], 300, seed + 100 + i) for i, g in enumerate(self.groups)}
+        self.seed = seed
+
+    @property
+    def admin_group(self):
+        return self.groups[0]
+
+
+def _button(rnd):
+    return f"[Part 1](buttonurl:https://t.me/c/123/{rnd.randint(1, 99999)})"
+
+
+def _group_event(rnd, scenario, **fields):
+    group = rnd.choice(scenario.groups)
+    return dict({"chat": group, "user": USER_BASE + rnd.randrange(USERS)}, **fields), group
+
+
+def _main_event(kind, rnd, scenario):
+    if kind == "group_text":
+        event, group = _group_event(rnd, scenario, kind="text")
+        event["text"] = rnd.choice(scenario.queries[group])
+        return event
+    if kind == "group_filters":
+        return _group_event(rnd, scenario, kind="text", text="/filters")[0]
+    if kind == "group_page":
+        event, group = _group_event(rnd, scenario, kind="callback")
+        # page 2 of the listing, as the first page's Next button encodes it
+        anchor = scenario.keywords[group][min(FILTERS_PER_PAGE, len(scenario.keywords[group])) - 1]
+        event["data"] = encode_cb("fpage", 2, NEXT, anchor)
+        return event
+    if kind == "group_request":
+        return _group_event(rnd, scenario, kind="text", text=f"/request {make_title(rnd)}")[0]
+    if kind == "group_start":
+        return _group_event(rnd, scenario, kind="text", text="/start")[0]
+    admin = {"chat": ADMIN_ID, "user": ADMIN_ID}
+    keywords = scenario.keywords[scenario.admin_group]
+    if kind == "admin_filter_photo":
+        title = make_title(rnd)
+        return dict(admin, kind="photo", caption=f'/filter "{title.lower()}"\n{title} scenepack\n{_button(rnd)}')
+    if kind == "admin_filters":
+        return dict(admin, kind="text", text="/filters")
+    if kind == "admin_page":
+        anchor = keywords[min(ADMIN_PAGE, len(keywords)) - 1]
+        return dict(admin, kind="callback", data=encode_cb("filters_page", scenario.admin_group, 2, NEXT, anchor))
+    if kind == "admin_view":
+        return dict(admin, kind="callback", data=encode_cb("view", rnd.choice(keywords)))
+    raise ValueError(kind)
+
+
+def _testbot_event(kind, rnd, scenario):
+    keywords = scenario.keywords[scenario.admin_group]
+    if kind == "group_text":
+        return _group_event(rnd, scenario, kind="text", text=rnd.choice(scenario.queries[scenario.admin_group]))[0]
+    if kind == "group_filters":
+        return _group_event(rnd, scenario, kind="text", text="/filters")[0]
+    if kind == "group_request":
+        return _group_event(rnd, scenario, kind="text", text=f'/request "{make_title(rnd)}"')[0]
+    if kind == "group_start":
+        return _group_event(rnd, scenario, kind="text", text="/start")[0]
+    admin = {"chat": ADMIN_ID, "user": ADMIN_ID}
+    if kind == "admin_movie_photo":
+        title = make_title(rnd)
+        return dict(admin, kind="photo", caption=f"𝗠𝗼𝘃𝗶𝗲 : {title}\nQuality: 1080p\n{_button(rnd)}")
+    if kind == "admin_filter":
+        return dict(admin, kind="text", text=f'/filter "{rnd.choice(keywords)}"')
+    if kind == "admin_del":
+        return dict(admin, kind="text", text=f'/del "{rnd.choice(keywords)}"')
+    raise ValueError(kind)
+
+
+# (kind, weight): a busy group day, mostly titles and chatter
+MAIN_MIX = (
+    ("group_text", 70), ("group_filters", 5), ("group_page", 5), ("group_request", 4), ("group_start", 1),
+    ("admin_filter_photo", 5), ("admin_filters", 4), ("admin_page", 4), ("admin_view", 2),
+)
+TESTBOT_MIX = (
+    ("group_text", 75), ("group_filters", 5), ("group_request", 5), ("group_start", 2),
+    ("admin_movie_photo", 6), ("admin_filter", 5), ("admin_del", 2),
+)
+
+
+def synthetic_events(target, scenario, count=DEFAULT_COUNT, seed=2):
+    mix, make = (MAIN_MIX, _main_event) if target == "main" else (TESTBOT_MIX, _testbot_event)
+    rnd = random.Random(seed)
+    kinds = rnd.choices([k for k, _ in mix], weights=[w for _, w in mix], k=count)
+    return [make(kind, rnd, scenario) for kind in kinds]
+
+
+def load_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_events(events, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+# ---------------- fakes ----------------
+
+class FakeTelegram:
+    """Counts outbound API calls by method; each one takes latency seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._ids = itertools.count(1_000_000)
+
+    async def call(self, method):
+        self.calls[method] += 1
+        await asyncio.sleep(self.latency)
+        return next(self._ids)
+
+
+def _count_db_call(background):
+    def on_call(collection, op):
+        entry = _current.get()
+        if entry is None:
+            background[(collection, op)] += 1
+        else:
+            entry["db"] += 1
+    return on_call
+
+
+# ---------------- main.py (Pyrogram) ----------------
+
+class MainTarget:
+    """main.py with a recording Pyrogram client and an async fake Mongo."""
+
+    name = "main"
+    # Client methods the handlers reach, directly or through bound type methods
+    API_METHODS = (
+        "send_message", "send_photo", "send_document", "edit_message_text", "delete_messages",
+        "get_chat", "answer_callback_query", "download_media",
+    )
+
+    def __init__(self, telegram, db_latency=0.0, unthrottled=False, shards=0):
+        self.telegram = telegram
+        self.db_latency = db_latency
+        self.unthrottled = unthrottled
+        self.shards = shards
+        self.background_db = Counter()
+        self.tasks = []
+        self._ids = itertools.count(1)
+
+    async def setup(self, scenario):
+        os.environ.update({
+            "API_ID": "1", "API_HASH": "0" * 32, "BOT_TOKEN": "1:replay",
+            "MONGO_URI": "mongodb://replay.invalid", "ADMINS": str(ADMIN_ID),
+            "SHARD_WORKERS": str(self.shards),
+        })
+        if self.unthrottled:
+            os.environ.update({"OUTBOX_GLOBAL_RATE": "1e9", "OUTBOX_CHAT_RATE": "1e9", "OUTBOX_GROUP_PER_MIN": "1e9"})
+        import repository
+        from pyrogram.types import User
+
+        self.mongo = AsyncFakeMongoClient(latency=self.db_latency, on_call=_count_db_call(self.background_db))
+        repository.connect = lambda uri, **kwargs: repository.Repository(self.mongo)
+        # handlers register through tasks on the running loop (Dispatcher.add_handler)
+        bot = self.bot = importlib.import_module("main")
+        await asyncio.sleep(0)
+        self.client = bot.client
+        self.client.me = User(id=BOT_USER["id"], is_bot=True, first_name=BOT_USER["first_name"], username=BOT_USER["username"])
+        for method in self.API_METHODS:
+            setattr(self.client, method, self._api(method))
+        self.workers = self.client.workers
+
+        self._seed(bot.repo, scenario)
+        await bot.ensure_schema(bot.repo.db, bot.MAIN_INDEXES, bot.MAIN_HOT_QUERIES)
+        # the background jobs main() starts, minus Telegram and the HTTP endpoint
+        if bot.shard_pool is not None:
+            await bot.shard_pool.start()
+        await bot.delete_scheduler.resume()
+        self.tasks = [
+            asyncio.create_task(bot.outbox.run()),
+            asyncio.create_task(bot.delete_scheduler.run(self.client.delete_messages)),
+            asyncio.create_task(bot.request_digest.run(bot.send_digest, bot.ADMINS)),
+            asyncio.create_task(bot.stats.run()),
+        ]
+        self.mongo.calls.clear()
+        self.background_db.clear()
+
+    def _seed(self, repo, scenario):
+        for group in scenario.groups:
+            docs = make_filter_docs(scenario.keywords[group], scenario.seed)
+            for doc in docs:
+                doc["chat_id"] = group
+                doc["payload"] = build_payload(doc)
+                set_norm(doc)
+            repo.filters.col.seed(docs)
+            repo.stats.col.seed([{"_id": group, "filters": len(docs), "hits": 0, "misses": 0}])
+        repo.stats.col.seed([{"_id": "global", "filters": sum(map(len, scenario.keywords.values())), "groups": len(scenario.groups)}])
+        repo.connections.col.seed(
+            [{"admin_id": ADMIN_ID, "group_id": g, "group_name": f"Group {g}"} for g in scenario.groups]
+        )
+        repo.user_conn.col.seed([{
+            "user_id": ADMIN_ID, "active_group": scenario.admin_group,
+            "groups": [{"id": g, "name": f"Group {g}"} for g in scenario.groups],
+        }])
+
+    def _chat(self, chat_id):
+        from pyrogram.enums import ChatType
+        from pyrogram.types import Chat
+
+        chat_id = int(chat_id)
+        if chat_id < 0:
+            return Chat(client=self.client, id=chat_id, type=ChatType.SUPERGROUP, title=f"Group {chat_id}")
+        return Chat(client=self.client, id=chat_id, type=ChatType.PRIVATE, first_name=f"User {chat_id}")
+
+    def _message(self, chat_id, **fields):
+        from pyrogram.types import Message
+
+        return Message(client=self.client, id=next(self._ids), chat=self._chat(chat_id), date=datetime.now(), **fields)
+
+    def _api(self, method):
+        async def call(*args, **kwargs):
+            await self.telegram.call(method)
+            chat_id = kwargs.get("chat_id", args[0] if args else ADMIN_ID)
+            if method == "get_chat":
+                return self._chat(chat_id)
+            if method in ("answer_callback_query", "delete_messages"):
+                return True
+            if method == "download_media":
+                return None
+            return self._message(chat_id)
+        return call
+
+    def _update(self, event):
+        from pyrogram.handlers import CallbackQueryHandler, MessageHandler
+        from pyrogram.types import CallbackQuery, Photo, User
+
+        user = User(client=self.client, id=event["user"], is_bot=False, first_name=f"User {event['user']}")
+        if event["kind"] == "callback":
+            bot = User(client=self.client, id=BOT_USER["id"], is_bot=True, first_name=BOT_USER["first_name"])
+            message = self._message(event["chat"], from_user=bot, text="listing")
+            cq = CallbackQuery(
+                client=self.client, id=str(next(self._ids)), from_user=user, chat_instance="replay",
+                message=message, data=event["data"],
+            )
+            return cq, CallbackQueryHandler
+        if event["kind"] == "photo":
+            n = next(self._ids)
+            photo = Photo(
+                client=self.client, file_id=f"AgAC{n:012d}", file_unique_id=f"replay{n}",
+                width=1280, height=720, file_size=100_000, date=datetime.now(),
+            )
+            return self._message(event["chat"], from_user=user, photo=photo, caption=event.get("caption")), MessageHandler
+        return self._message(event["chat"], from_user=user, text=event.get("text")), MessageHandler
+
+    async def handle(self, event):
+        """Dispatch like Pyrogram: the first handler whose filters pass, per group."""
+        update, handler_type = self._update(event)
+        label = None
+        for group in self.client.dispatcher.groups.values():
+            for handler in group:
+                if isinstance(handler, handler_type) and await handler.check(self.client, update):
+                    label = handler.callback.__name__
+                    if event["kind"] == "callback":
+                        label += ":" + event["data"].split("|", 1)[0].split("~", 1)[0]
+                    queued = await handler.callback(self.client, update)
+                    if isinstance(queued, asyncio.Future):
+                        # fair dispatch: the worker is free again, the job runs later
+                        _current.get()["queued"] = queued
+                    break
+        return label
+
+    async def drain(self, seconds):
+        bot = self.bot
+        deadline = time.monotonic() + seconds
+        while bot.outbox.depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        extras = {
+            "outbox_backlog": bot.outbox.depth(),
+            "outbox_sent": bot.outbox.sent,
+            "outbox_failed": bot.outbox.failed,
+            "pending_deletes": len(bot.delete_scheduler),
+            "filter_pages": bot.filter_pages.stats(),
+            "sessions": bot.sessions.stats(),
+            "match_memo": bot.match_memo.stats(),
+            "negative_cache": bot.negative_cache.stats(),
+            "dispatch": {"handled": bot.fair_dispatch.handled, "dropped": bot.fair_dispatch.dropped},
+        }
+        if bot.shard_pool is not None:
+            extras["shards"] = await bot.shard_pool.stats()
+            await bot.shard_pool.close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # what main() does on shutdown
+        await bot.request_digest.flush(self.client.send_message, bot.ADMINS)
+        await bot.stats.flush()
+        return extras
+
+    @property
+    def db_calls(self):
+        return self.mongo.calls
+
+
+# ---------------- testbot.py (python-telegram-bot) ----------------
+
+class TestbotTarget:
+    """testbot.py with a recording Bot API backend and a sync fake Mongo."""
+
+    name = "testbot"
+
+    def __init__(self, telegram, db_latency=0.0, unthrottled=False, shards=0):
+        self.telegram = telegram
+        self.db_latency = db_latency
+        self.background_db = Counter()
+        self.tasks = set()
+        self._ids = itertools.count(1)
+
+    async def setup(self, scenario):
+        import pymongo
+
+        self.mongo = FakeMongoClient(latency=self.db_latency, on_call=_count_db_call(self.background_db))
+        real = pymongo.MongoClient
+        pymongo.MongoClient = lambda *args, **kwargs: self.mongo  # db.py connects at import
+        try:
+            bot = self.bot = importlib.import_module("testbot")
+        finally:
+            pymongo.MongoClient = real
+        self._seed(bot, scenario)
+
+        app = self.app = bot.build_application("1:replay", request=self._request())
+        for group in app.handlers.values():
+            for handler in group:
+                handler.callback = self._track(handler.callback)
+        app.add_error_handler(self._error)
+        self.workers = app.update_processor.max_concurrent_updates
+        await app.initialize()
+        await app.start()
+        before = asyncio.all_tasks()
+        await bot.on_startup(app)
+        # the delete scheduler loop started by on_startup; Application.stop() waits for it
+        self.tasks = asyncio.all_tasks() - before
+        self.mongo.calls.clear()
+        self.background_db.clear()
+
+    def _seed(self, bot, scenario):
+        rnd = random.Random(scenario.seed)
+        movies, messages = [], []
+        for doc in make_filter_docs(scenario.keywords[scenario.admin_group], scenario.seed):
+            message_id = f"{rnd.getrandbits(96):024x}"
+            movies.append({"_id": f"{rnd.getrandbits(96):024x}", "name": doc["keyword"], "enabled": 1,
+                           "message_id": message_id, "timestamp": 0})
+            messages.append({"_id": message_id, "text": doc["text"], "file_id": doc["file_id"], "enabled": 1,
+                             "button": doc.get("buttons") or [{"text": "Part 1", "url": "https://t.me/c/123/1"}],
+                             "movie_name": doc["keyword"], "timestamp": 0})
+        bot.movie_collection.seed(movies)
+        bot.collection.seed(messages)
+
+    def _request(self):
+        from telegram.request import BaseRequest
+
+        telegram = self.telegram
+
+        class RecordingRequest(BaseRequest):
+            @property
+            def read_timeout(self):
+                return None
+
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            async def do_request(self, url, method, request_data=None, read_timeout=None,
+                                 write_timeout=None, connect_timeout=None, pool_timeout=None):
+                api = url.rsplit("/", 1)[-1]
+                params = request_data.parameters if request_data is not None else {}
+                message_id = await telegram.call(api)
+                if api == "getMe":
+                    result = dict(BOT_USER, can_join_groups=True, can_read_all_group_messages=False,
+                                  supports_inline_queries=False)
+                elif api.startswith(("send", "edit", "copy", "forward")):
+                    chat_id = int(params.get("chat_id", ADMIN_ID))
+                    result = {"message_id": message_id, "date": int(time.time()), "chat": _chat_json(chat_id)}
+                else:
+                    result = True
+                return 200, json.dumps({"ok": True, "result": result}).encode()
+
+        return RecordingRequest()
+
+    @staticmethod
+    def _track(callback):
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            entry = _current.get()
+            if entry is not None:
+                entry["label"] = callback.__name__
+            return await callback(update, context)
+        return wrapper
+
+    @staticmethod
+    async def _error(update, context):
+        entry = _current.get()
+        if entry is not None:
+            entry["error"] = f"{type(context.error).__name__}: {context.error}"
+
+    def _update_json(self, event):
+        n = next(self._ids)
+        user = {"id": event["user"], "is_bot": False, "first_name": f"User {event['user']}"}
+        message = {"message_id": n, "date": int(time.time()), "chat": _chat_json(event["chat"]), "from": user}
+        if event["kind"] == "callback":
+            message.update({"from": BOT_USER, "text": "listing"})
+            return {"update_id": n, "callback_query": {
+                "id": str(n), "from": user, "chat_instance": "replay", "message": message, "data": event["data"],
+            }}
+        if event["kind"] == "photo":
+            message["photo"] = [{"file_id": f"AgAC{n:012d}", "file_unique_id": f"replay{n}", "width": 1280, "height": 720}]
+            message["caption"] = event.get("caption")
+        else:
+            text = event.get("text") or ""
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": n, "message": message}
+
+    async def handle(self, event):
+        from telegram import Update
+
+        await self.app.process_update(Update.de_json(self._update_json(event), self.app.bot))
+        return None  # the tracked callback records which handler ran
+
+    async def drain(self, seconds):
+        extras = {"pending_deletes": len(self.bot.delete_scheduler)}
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.app.stop()
+        await self.app.shutdown()
+        return extras
+
+    @property
+    def db_calls(self):
+        return self.mongo.calls
+
+
+def _chat_json(chat_id):
+    chat_id = int(chat_id)
+    if chat_id < 0:
+        return {"id": chat_id, "type": "supergroup", "title": f"Group {chat_id}"}
+    return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"}
+
+
+TARGETS = {"main": MainTarget, "testbot": TestbotTarget}
+
+
+# ---------------- replay ----------------
+
+def offered_rate(events, rate):
+    """Updates/sec to feed at: rate, else "recorded" if every event has "t", else DEFAULT_RATE."""
+    if rate is not None:
+        return rate
+    return "recorded" if events and all("t" in e for e in events) else DEFAULT_RATE
+
+
+def _offsets(events, rate):
+    """Seconds after start at which each event is due."""
+    rate = offered_rate(events, rate)
+    if rate == "recorded":
+        first = events[0]["t"]
+        return [e["t"] - first for e in events]
+    if rate <= 0:
+        return [0.0] * len(events)
+    return [i / rate for i in range(len(events))]
+
+
+async def replay(target, events, rate=None, workers=None):
+    """Feed events at the requested pace; [(label, wait_ms, took_ms, entry)] per update."""
+    results = []
+    slots = asyncio.Semaphore(workers or target.workers)
+
+    async def run_one(event, due):
+        begin = time.perf_counter()
+        entry = {"label": None, "db": 0, "error": None, "chat": event["chat"]}
+        token = _current.set(entry)
+        released = False
+        try:
+            label = await target.handle(event)
+            entry["label"] = entry["label"] or label
+            queued = entry.pop("queued", None)
+            if queued is not None:
+                released = True
+                slots.release()
+                try:
+                    await queued
+                except asyncio.CancelledError:
+                    entry["error"] = "dropped: chat queue full"
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            _current.reset(token)
+            end = time.perf_counter()
+            if not released:
+                slots.release()
+            results.append((entry["label"] or "(unhandled)", (begin - due) * 1000, (end - begin) * 1000, entry))
+
+    tasks = []
+    start = time.perf_counter()
+    for event, offset in zip(events, _offsets(events, rate)):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # waits here when every worker is busy, like a backed-up update queue
+        await slots.acquire()
+        tasks.append(asyncio.create_task(run_one(event, start + offset)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def summarize(target, results, wall, rate, extras):
+    handlers = {}
+    for label, wait, took, entry in results:
+        handlers.setdefault(label, []).append((wait, took, entry))
+    rows = []
+    for label, samples in sorted(handlers.items(), key=lambda item: -len(item[1])):
+        took = [s[1] for s in samples]
+        e2e = [s[0] + s[1] for s in samples]
+        rows.append({
+            "handler": label,
+            "count": len(samples),
+            "p50_ms": round(percentile(took, 50), 3),
+            "p99_ms": round(percentile(took, 99), 3),
+            "max_ms": round(max(took), 3),
+            "e2e_p99_ms": round(percentile(e2e, 99), 3),
+            "db_per_update": round(sum(s[2]["db"] for s in samples) / len(samples), 2),
+            "errors": sum(1 for s in samples if s[2]["error"]),
+        })
+    chats = {}
+    for label, wait, took, entry in results:
+        chats.setdefault(entry["chat"], []).append(wait + took)
+    # busiest chats first: does one noisy group push up everyone's tail?
+    chat_rows = [
+        {"chat": chat, "count": len(e2e), "e2e_p50_ms": round(percentile(e2e, 50), 3), "e2e_p99_ms": round(percentile(e2e, 99), 3)}
+        for chat, e2e in sorted(chats.items(), key=lambda item: -len(item[1]))[:TOP_CHATS]
+    ]
+    errors = Counter(entry["error"] for _, _, _, entry in results if entry["error"])
+    return {
+        "target": target.name,
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "updates": len(results),
+        "seconds": round(wall, 3),
+        "offered_rate": rate,
+        "throughput": round(len(results) / wall, 1) if wall else None,
+        "handlers": rows,
+        "chats": chat_rows,
+        "api_calls": dict(target.telegram.calls.most_common()),
+        "db_calls": {f"{c}.{op}": n for (c, op), n in target.db_calls.most_common()},
+        "db_background": {f"{c}.{op}": n for (c, op), n in target.background_db.most_common()},
+        "errors": dict(errors.most_common(10)),
+        "extras": extras,
+    }
+
+
+def render(report):
+    rate = report["offered_rate"]
+    offered = "recorded timing" if rate == "recorded" else f"{rate:g}/s" if rate else "max"
+    lines = [
+        f"{report['target']} @ {report['commit']}: {report['updates']} updates in {report['seconds']} s"
+        f" | offered {offered} | handled {report['throughput']}/s",
+        f"{'handler':<34} {'n':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'e2e p99':>9} {'db/upd':>7} {'err':>5}",
+    ]
+    for r in report["handlers"]:
+        lines.append(
+            f"{r['handler'][:34]:<34} {r['count']:>6} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f}"
+            f" {r['e2e_p99_ms']:>9.3f} {r['db_per_update']:>7.2f} {r['errors']:>5}"
+        )
+    lines.append(f"{'chat':<34} {'n':>6} {'e2e p50':>9} {'e2e p99':>9}")
+    for r in report["chats"]:
+        lines.append(f"{r['chat']:<34} {r['count']:>6} {r['e2e_p50_ms']:>9.3f} {r['e2e_p99_ms']:>9.3f}")
+    for title, key in (("API calls", "api_calls"), ("DB calls", "db_calls"), ("DB calls outside handlers", "db_background")):
+        if report[key]:
+            lines.append(f"{title}: " + ", ".join(f"{k} {v}" for k, v in report[key].items()))
+    for name, value in report["extras"].items():
+        lines.append(f"{name}: {value}")
+    for error, n in report["errors"].items():
+        lines.append(f"error x{n}: {error}")
+    return "\n".join(lines)
+
+
+async def run(args):
+    scenario = Scenario(args.chats, args.filters, args.seed)
+    if args.events:
+        events = load_events(args.events)
+    else:
+        events = synthetic_events(args.target, scenario, args.count, args.seed + 1)
+    if args.save_events:
+        save_events(events, args.save_events)
+
+    target = TARGETS[args.target](FakeTelegram(args.api_latency / 1000), args.db_latency / 1000, args.unthrottled, args.shards)
+    # the bots print per message; keep that out of the report unless asked
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        await target.setup(scenario)
+        results, wall = await replay(target, events, args.rate, args.workers)
+        extras = await target.drain(args.drain)
+    return summarize(target, results, wall, offered_rate(events, args.rate), extras)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay update streams through a bot's handlers offline")
+    parser.add_argument("target", choices=sorted(TARGETS), help="which bot to drive")
+    parser.add_argument("--events", help="JSONL event stream to replay (default: synthetic)")
+    parser.add_argument("--save-events", help="write the replayed stream here as JSONL")
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT, help="synthetic updates")
+    parser.add_argument("--rate", type=float, help=f"updates/sec, 0 = as fast as possible (default: recorded timing or {DEFAULT_RATE:g})")
+    parser.add_argument("--workers", type=int, help="concurrent updates (default: the framework's own)")
+    parser.add_argument("--chats", type=int, default=DEFAULT_CHATS, help="groups to seed")
+    parser.add_argument("--filters", type=int, default=DEFAULT_FILTERS, help="filters per group")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="ms per Telegram API call")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="ms per Mongo operation")
+    parser.add_argument("--unthrottled", action="store_true", help="lift the outbox rate limits (main)")
+    parser.add_argument("--shards", type=int, default=0, help="SHARD_WORKERS for main (0 = match in process)")
+    parser.add_argument("--drain", type=float, default=DRAIN_SECONDS, help="seconds to wait for queued sends")
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print(render(report), file=sys.stderr)
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/suite.py - microbenchmarks for the group reply hot path
+# Run from the repo root:
+#   python -m benchmarks.suite [--sizes 1000 10000] [--out results.json]
+#   python -m benchmarks.suite --compare old.json new.json
+# No network, Mongo or Telegram needed. Every case reports ops/sec, p50/p99
+# latency per call and peak traced memory; --out writes the same as JSON
+# tagged with the git commit so runs can be compared across commits.
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.corpus import make_corpus, make_filter_docs, make_queries
+from filter_cache import ChatFilters
+from filter_pages import FilterPages, Page, listing_text
+from matcher import FUZZY_THRESHOLD, best_match, match_indexed, match_tiered
+from normalize import normalize, set_norm
+from payloads import build_payload
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+MIN_SECONDS = 0.5  # each case repeats its inputs until at least this long
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def measure(fn, inputs, min_seconds=MIN_SECONDS):
+    """Call fn on each input (cycling) for at least min_seconds; latency stats in ms."""
+    samples = []
+    elapsed = 0.0
+    while elapsed < min_seconds or len(samples) < len(inputs):
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            took = time.perf_counter() - start
+            samples.append(took * 1000)
+            elapsed += took
+    # peak memory on a separate pass: tracing would distort the timings
+    tracemalloc.start()
+    for x in inputs:
+        fn(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "calls": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+class _MemoryFilters:
+    """In-memory stand-in for the repository filters collection (find/count only)."""
+
+    def __init__(self, keywords):
+        self.keywords = sorted(keywords)
+
+    async def find(self, query, projection=None, sort=None, limit=0):
+        cond = query.get("keyword", {})
+        kws = [k for k in self.keywords if ("$gt" not in cond or k > cond["$gt"]) and ("$lt" not in cond or k < cond["$lt"])]
+        if sort and sort[0][1] == -1:
+            kws.reverse()
+        return [{"keyword": k} for k in kws[:limit or None]]
+
+    async def count_documents(self, query):
+        return len(self.keywords)
+
+
+def cases(size):
+    """(name, fn, inputs) for one corpus size."""
+    keywords = make_corpus(size)
+    messages = make_queries(keywords)
+    queries = [normalize(q) for q in messages]
+    docs = make_filter_docs(keywords[:2000])
+    chat = ChatFilters(1, [set_norm({"keyword": k}) for k in keywords])
+
+    # once per incoming message, once per keyword at write time
+    yield "normalize.message", normalize, messages
+    yield "normalize.keyword", normalize, keywords[:2000]
+    yield "match.full_scan", lambda q: best_match(q, chat.keywords, FUZZY_THRESHOLD), queries
+    yield "match.indexed", lambda q: match_indexed(q, chat.index, FUZZY_THRESHOLD), queries
+    yield "match.tiered", lambda q: match_tiered(q, chat.index, FUZZY_THRESHOLD), queries
+    yield "payload.build", build_payload, docs[:500]
+
+    pages = [Page(keywords[i:i + 30], i // 30 + 1, 30, size, i > 0, i + 30 < size) for i in range(0, min(size, 3000), 30)]
+    yield "listing.render", lambda p: listing_text(p, "🎬 Filters in this group"), pages
+
+    loop = asyncio.new_event_loop()
+    listing = FilterPages(_MemoryFilters(keywords), lambda chat_id: 0)
+    render = lambda p: listing_text(p, "🎬 Filters in this group")
+    loop.run_until_complete(listing.get(1, render))
+    yield "listing.cached_page", lambda _: loop.run_until_complete(listing.get(1, render)), [None] * 50
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, min_seconds=MIN_SECONDS):
+    results = []
+    for size in sizes:
+        for name, fn, inputs in cases(size):
+            result = {"case": name, "size": size, **measure(fn, inputs, min_seconds)}
+            results.append(result)
+            print(
+                f"{name:<22} {size:>7} | {result['ops_per_sec']:>10.1f} ops/s"
+                f" | p50 {result['p50_ms']:.4f} ms p99 {result['p99_ms']:.4f} ms | peak {result['peak_kb']:.1f} KB",
+                file=sys.stderr,
+            )
+    return {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(old_path, new_path):
+    """Print p50 and ops/sec change per case between two --out files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {(r["case"], r["size"]): r for r in old["results"]}
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for r in new["results"]:
+        prev = before.get((r["case"], r["size"]))
+        if prev is None:
+            print(f"{r['case']:<22} {r['size']:>7} | new")
+            continue
+        speed = r["ops_per_sec"] / prev["ops_per_sec"] if prev["ops_per_sec"] else float("inf")
+        print(
+            f"{r['case']:<22} {r['size']:>7} | p50 {prev['p50_ms']:.4f} -> {r['p50_ms']:.4f} ms"
+            f" | {speed:.2f}x ops/s | peak {prev['peak_kb']:.0f} -> {r['peak_kb']:.0f} KB"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Group reply hot path microbenchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="keyword corpus sizes")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="minimum time per case")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args(argv)
+    if args.compare:
+        return compare(*args.compare)
+    report = run(args.sizes, args.min_seconds)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
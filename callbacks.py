@@ -0,0 +1,125 @@
+# callbacks.py - callback data codec and prefix router
+# Callback data is "<prefix>|<base64url payload>" so keywords containing ':'
+# or '|' survive, and anything longer than Telegram's 64-byte limit is kept
+# server side as "<prefix>~<token>" for CALLBACK_TOKEN_TTL seconds.
+
+import base64
+import inspect
+import os
+import re
+import secrets
+import time
+
+CALLBACK_MAX_BYTES = 64  # Telegram limit for callback_data
+CALLBACK_TOKEN_TTL = int(os.environ.get("CALLBACK_TOKEN_TTL", "3600"))  # seconds
+CALLBACK_TOKEN_MAX = int(os.environ.get("CALLBACK_TOKEN_MAX", "50000"))
+
+_SEP = "\x1f"  # unit separator, never typed in a keyword
+_PAYLOAD_RE = re.compile(r"[A-Za-z0-9_-]*")
+
+
+class TokenStore:
+    """Short-lived server-side storage for payloads too long to inline."""
+
+    def __init__(self, ttl=CALLBACK_TOKEN_TTL, max_size=CALLBACK_TOKEN_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = {}  # token -> (expires, parts)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, parts):
+        now = time.monotonic()
+        if len(self._items) >= self.max_size:
+            self._prune(now)
+        token = secrets.token_urlsafe(6)
+        self._items[token] = (now + self.ttl, parts)
+        return token
+
+    def get(self, token):
+        item = self._items.get(token)
+        if item is None or item[0] < time.monotonic():
+            self._items.pop(token, None)
+            return None
+        return item[1]
+
+    def _prune(self, now):
+        for token in [t for t, (exp, _) in self._items.items() if exp < now]:
+            del self._items[token]
+        # still full: drop the oldest (dicts keep insertion order)
+        while len(self._items) >= self.max_size:
+            del self._items[next(iter(self._items))]
+
+
+tokens = TokenStore()
+
+
+def encode_cb(prefix, *parts):
+    """Callback data for prefix and parts (any str()-able values)."""
+    raw = _SEP.join(str(p) for p in parts).encode("utf-8")
+    data = prefix + "|" + base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    if len(data.encode("utf-8")) <= CALLBACK_MAX_BYTES:
+        return data
+    return prefix + "~" + tokens.put([str(p) for p in parts])
+
+
+def decode_cb(data):
+    """
+    (prefix, parts) from callback data; parts is None for an expired/unknown
+    token. Raises ValueError for a payload that is not base64url UTF-8.
+    """
+    data = data or ""
+    for i, ch in enumerate(data):
+        if ch == "|":
+            body = data[i + 1:]
+            # urlsafe_b64decode quietly skips characters it doesn't know
+            if not _PAYLOAD_RE.fullmatch(body):
+                raise ValueError("callback payload is not base64url")
+            raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)).decode("utf-8")
+            return data[:i], raw.split(_SEP) if raw else []
+        if ch == "~":
+            return data[:i], tokens.get(data[i + 1:])
+    return data, []
+
+
+class CallbackRouter:
+    """
+    One callback_query handler for the whole bot: decodes the data once and
+    dispatches on its prefix with a dict lookup. Route handlers are called
+    as handler(client, cq, *parts); types given to route() convert the
+    leading parts (e.g. int for a group id). Data that does not decode, fit
+    the handler's parameters or convert is answered "Invalid data"; errors
+    raised by the handler itself propagate to the caller.
+    """
+
+    def __init__(self, admins=()):
+        self.admins = admins
+        self.routes = {}
+
+    def route(self, prefix, *types, admin_only=True):
+        def register(fn):
+            self.routes[prefix] = (fn, inspect.signature(fn), types, admin_only)
+            return fn
+        return register
+
+    async def dispatch(self, client, cq):
+        try:
+            prefix, parts = decode_cb(cq.data)
+        except ValueError:
+            return await cq.answer("Invalid data", show_alert=True)
+        route = self.routes.get(prefix)
+        if route is None:
+            return await cq.answer("⌛ This button is no longer valid.", show_alert=True)
+        fn, signature, types, admin_only = route
+        if admin_only and cq.from_user.id not in self.admins:
+            return await cq.answer("⚠️ Only admins can use this.", show_alert=True)
+        if parts is None:
+            return await cq.answer("⌛ This button expired, open the menu again.", show_alert=True)
+        try:
+            signature.bind(client, cq, *parts)
+            args = [convert(part) for convert, part in zip(types, parts)] + parts[len(types):]
+        except (TypeError, ValueError):
+            # wrong number/type of parts: stale or forged data
+            return await cq.answer("Invalid data", show_alert=True)
+        return await fn(client, cq, *args)
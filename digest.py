@@ -0,0 +1,110 @@
+# digest.py - batched admin notifications for unmatched titles and /request
+# Instead of one DM per admin per message, requests are deduplicated per chat
+# and sent as one digest per admin every DIGEST_INTERVAL seconds.
+
+import asyncio
+import os
+
+from normalize import normalize
+
+DIGEST_INTERVAL = int(os.environ.get("DIGEST_INTERVAL", "300"))  # seconds
+DIGEST_TOP = int(os.environ.get("DIGEST_TOP", "20"))  # titles listed per digest
+
+
+def normalize_request(text):
+    """Key used to treat 'Leo!!', 'leo' and ' 𝗟𝗘𝗢 ' as the same request: the matcher's normal form."""
+    return normalize(text)
+
+
+class RequestDigest:
+    """Collects requests between flushes; add() is cheap and never sends."""
+
+    def __init__(self, interval=DIGEST_INTERVAL, top=DIGEST_TOP):
+        self.interval = interval
+        self.top = top
+        self.pending = {}  # (chat_id, normalized text) -> entry
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, chat_id, text, user_id, source="auto"):
+        key = normalize_request(text)
+        if not key:
+            return
+        entry = self.pending.get((chat_id, key))
+        if entry is None:
+            entry = self.pending[(chat_id, key)] = {
+                "chat_id": chat_id,
+                "text": text.strip(),
+                "count": 0,
+                "users": set(),
+                "sources": set(),
+            }
+        entry["count"] += 1
+        entry["users"].add(user_id)
+        entry["sources"].add(source)
+
+    def render(self, entries):
+        """Digest text for a drained batch of entries (most requested first)."""
+        entries = sorted(entries, key=lambda e: (-e["count"], -len(e["users"])))
+        total = sum(e["count"] for e in entries)
+        lines = [f"📩 Requests digest: {total} requests, {len(entries)} titles\n"]
+        for idx, e in enumerate(entries[:self.top], start=1):
+            title = e["text"] if len(e["text"]) <= 60 else e["text"][:57] + "..."
+            via = " (/request)" if "request" in e["sources"] else ""
+            lines.append(
+                f"{idx}. `{title}` ×{e['count']} — {len(e['users'])} users — in `{e['chat_id']}`{via}"
+            )
+        if len(entries) > self.top:
+            lines.append(f"\n…and {len(entries) - self.top} more")
+        return "\n".join(lines)
+
+    def drain(self):
+        entries = list(self.pending.values())
+        self.pending = {}
+        return entries
+
+    def restore(self, entries):
+        """Put drained entries back, merged with anything added since."""
+        for old in entries:
+            key = (old["chat_id"], normalize_request(old["text"]))
+            entry = self.pending.get(key)
+            if entry is None:
+                self.pending[key] = old
+                continue
+            entry["text"] = old["text"]
+            entry["count"] += old["count"]
+            entry["users"] |= old["users"]
+            entry["sources"] |= old["sources"]
+
+    async def flush(self, send, admins):
+        """
+        Send one digest to every admin; send(admin_id, text) returns an
+        awaitable. If a send is cancelled (the outbox dropped it as stale
+        or over its queue bound), the entries go back for the next flush.
+        """
+        entries = self.drain()
+        if not entries:
+            return
+        text = self.render(entries)
+        dropped = False
+        for admin in admins:
+            sending = asyncio.ensure_future(send(admin, text))
+            # wait() rather than await: the send's own cancellation must not
+            # end this task (and the run loop with it)
+            await asyncio.wait({sending})
+            if sending.cancelled():
+                dropped = True
+            elif sending.exception() is not None:
+                print("Admin digest error:", sending.exception())
+        if dropped:
+            self.restore(entries)
+
+    async def run(self, send, admins):
+        """Flush loop, started once at bot startup."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush(send, admins)
+            except Exception as e:
+                print("Admin digest error:", e)
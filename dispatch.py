@@ -0,0 +1,140 @@
+# dispatch.py - per-chat fair scheduling of update handlers
+# Pyrogram hands updates to a small pool of workers in arrival order, so one
+# busy group can keep every worker on its own texts while quieter groups
+# wait behind it. Handlers decorated with per_chat only enqueue the update
+# and return; the dispatcher keeps a queue per chat and starts jobs by
+# taking one from each chat in turn (round-robin), with a cap on jobs in
+# flight per chat and overall. A chat whose queue overflows loses its
+# oldest queued update rather than delaying everyone else.
+# Env: DISPATCH_WORKERS, DISPATCH_CHAT_INFLIGHT, DISPATCH_CHAT_QUEUE, DISPATCH_TOP_CHATS
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import logging
+import os
+from collections import deque
+
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "16"))  # handlers running at once, all chats
+DISPATCH_CHAT_INFLIGHT = int(os.environ.get("DISPATCH_CHAT_INFLIGHT", "1"))  # per chat; 1 keeps a chat's updates in order
+DISPATCH_CHAT_QUEUE = int(os.environ.get("DISPATCH_CHAT_QUEUE", "100"))  # queued updates per chat before dropping the oldest
+DISPATCH_TOP_CHATS = int(os.environ.get("DISPATCH_TOP_CHATS", "20"))  # chats reported in the per-chat depth metric
+
+
+class _Chat:
+    __slots__ = ("jobs", "inflight", "ready")
+
+    def __init__(self):
+        self.jobs = deque()  # (job, future, context)
+        self.inflight = 0
+        self.ready = False  # waiting in the round-robin ring
+
+
+def update_chat_id(update):
+    """Chat an update belongs to: the message chat, else the user (inline callbacks)."""
+    chat = getattr(update, "chat", None) or getattr(getattr(update, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "from_user", None)
+    return user.id if user is not None else 0
+
+
+class FairDispatcher:
+    """
+    submit(chat_id, job) queues job (a zero-arg callable returning an
+    awaitable) and returns a future with its result. Jobs run in the
+    submitter's context (contextvars), FIFO within a chat.
+    """
+
+    def __init__(self, workers=DISPATCH_WORKERS, chat_inflight=DISPATCH_CHAT_INFLIGHT, chat_queue=DISPATCH_CHAT_QUEUE):
+        self.workers = max(1, workers)
+        self.chat_inflight = max(1, chat_inflight)
+        self.chat_queue = max(1, chat_queue)
+        self._chats = {}
+        self._ring = deque()  # chat ids with a queued job and a free slot, in turn order
+        self._tasks = set()
+        self.inflight = 0
+        self.handled = 0
+        self.dropped = 0
+
+    def depth(self):
+        """Updates queued (not counting ones in flight)."""
+        return sum(len(c.jobs) for c in self._chats.values())
+
+    def depths(self, top=DISPATCH_TOP_CHATS):
+        """{(chat_id,): queued} for the chats with the longest queues."""
+        busiest = heapq.nlargest(top, ((len(c.jobs), chat_id) for chat_id, c in self._chats.items() if c.jobs))
+        return {(chat_id,): n for n, chat_id in busiest}
+
+    def submit(self, chat_id, job):
+        future = asyncio.get_running_loop().create_future()
+        # handlers' errors are logged when they happen; nobody has to await this
+        future.add_done_callback(_retrieve)
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat()
+        if len(chat.jobs) >= self.chat_queue:
+            _, stale, _ = chat.jobs.popleft()
+            stale.cancel()
+            self.dropped += 1
+        chat.jobs.append((job, future, contextvars.copy_context()))
+        self._offer(chat_id, chat)
+        self._pump()
+        return future
+
+    def per_chat(self, fn):
+        """Decorator for Pyrogram handlers: queue the update on its chat and return."""
+        @functools.wraps(fn)
+        async def wrapper(client, update):
+            return self.submit(update_chat_id(update), lambda: fn(client, update))
+
+        return wrapper
+
+    def _offer(self, chat_id, chat):
+        if chat.jobs and not chat.ready and chat.inflight < self.chat_inflight:
+            chat.ready = True
+            self._ring.append(chat_id)
+
+    def _pump(self):
+        while self._ring and self.inflight < self.workers:
+            chat_id = self._ring.popleft()
+            chat = self._chats[chat_id]
+            chat.ready = False
+            job, future, context = chat.jobs.popleft()
+            chat.inflight += 1
+            self.inflight += 1
+            # create_task(context=) is 3.11+; a task started inside
+            # context.run copies that context instead, on any version
+            task = context.run(asyncio.create_task, self._run(chat_id, chat, job, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            # back of the line: every other waiting chat gets a turn first
+            self._offer(chat_id, chat)
+
+    async def _run(self, chat_id, chat, job, future):
+        try:
+            result = await job()
+        except Exception as e:
+            logging.exception("Handler failed in chat %s", chat_id)
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            if not future.done():
+                future.cancel()
+            self.handled += 1
+            chat.inflight -= 1
+            self.inflight -= 1
+            if not chat.jobs and not chat.inflight:
+                del self._chats[chat_id]
+            else:
+                self._offer(chat_id, chat)
+            self._pump()
+
+
+def _retrieve(future):
+    if not future.cancelled():
+        future.exception()
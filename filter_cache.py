@@ -0,0 +1,200 @@
+# filter_cache.py - per-chat in-memory filter index used by the group auto reply
+# Loaded on first use per chat, patched by every filter write path in main.py,
+# and bounded by FILTER_CACHE_MB (cold chats are evicted LRU first).
+
+import os
+import sys
+from collections import OrderedDict
+
+from matcher import TieredIndex
+from normalize import keyword_norm
+
+FILTER_CACHE_MB = float(os.environ.get("FILTER_CACHE_MB", "64"))
+
+_DOC_OVERHEAD = 240  # dict + bookkeeping per cached filter (rough)
+_INDEX_BYTES_PER_CHAR = 120  # n-gram postings per keyword character (rough)
+
+
+def _value_size(value):
+    if isinstance(value, dict):
+        return sum(sys.getsizeof(k) + _value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_value_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def doc_size(doc):
+    """Approximate number of bytes a cached filter document (and its index entries) holds."""
+    keyword = doc.get("keyword", "")
+    return _DOC_OVERHEAD + _value_size(doc) + _INDEX_BYTES_PER_CHAR * len(keyword)
+
+
+class ChatFilters:
+    """
+    All filters of one chat, keyed by keyword in load/insert order.
+    Each keyword also gets a stable integer id (increasing in insert order)
+    used by the matcher's index, which is kept in step on every change.
+    """
+
+    def __init__(self, chat_id, docs=()):
+        self.chat_id = chat_id
+        self.by_keyword = {}
+        self.by_id = {}
+        self.replies = {}  # id -> ready-to-send reply, built by the caller
+        self.index = TieredIndex()
+        self._ids = {}
+        self._next_id = 0
+        self.size = 0
+        self._docs = None
+        self._keywords = None
+        for doc in docs:
+            self.upsert(doc)
+
+    def __len__(self):
+        return len(self.by_keyword)
+
+    def get(self, keyword):
+        return self.by_keyword.get(keyword)
+
+    def _changed(self):
+        self._docs = None
+        self._keywords = None
+
+    @property
+    def docs(self):
+        """Filters as a list, parallel to keywords."""
+        if self._docs is None:
+            self._docs = list(self.by_keyword.values())
+        return self._docs
+
+    @property
+    def keywords(self):
+        """Normalized keywords for batch matching, built once per change."""
+        if self._keywords is None:
+            self._keywords = [keyword_norm(d) for d in self.docs]
+        return self._keywords
+
+    def upsert(self, doc):
+        """Insert or merge a filter ($set semantics). Returns the byte delta."""
+        keyword = doc.get("keyword", "")
+        old = self.by_keyword.get(keyword)
+        before = self.size
+        if old is not None:
+            self.size -= doc_size(old)
+            merged = dict(old)
+            merged.update(doc)
+            doc = merged
+        else:
+            doc = dict(doc)
+        doc.pop("_id", None)
+        self.by_keyword[keyword] = doc
+        kid = self._ids.get(keyword)
+        if kid is None:
+            kid = self._ids[keyword] = self._next_id
+            self._next_id += 1
+            self.index.add(kid, keyword_norm(doc))
+        self.by_id[kid] = doc
+        self.replies.pop(kid, None)
+        self._changed()
+        self.size += doc_size(doc)
+        return self.size - before
+
+    def remove(self, keyword):
+        """Drop a filter. Returns the byte delta (0 if it was not cached)."""
+        old = self.by_keyword.pop(keyword, None)
+        if old is None:
+            return 0
+        kid = self._ids.pop(keyword)
+        self.by_id.pop(kid, None)
+        self.replies.pop(kid, None)
+        self.index.remove(kid)
+        self._changed()
+        delta = -doc_size(old)
+        self.size += delta
+        return delta
+
+
+class FilterCache:
+    """LRU of ChatFilters with a byte budget and per-chat change versions."""
+
+    def __init__(self, budget_mb=FILTER_CACHE_MB):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.bytes = 0
+        self._chats = OrderedDict()
+        # versions survive eviction so callers can tell a filter set changed
+        self._versions = {}
+        # told about writes even for chats not cached here:
+        # filter_added(chat_id, doc) on upsert, clear(chat_id) on invalidate
+        self.listeners = []
+
+    def __contains__(self, chat_id):
+        return chat_id in self._chats
+
+    def __len__(self):
+        return len(self._chats)
+
+    def version(self, chat_id):
+        return self._versions.get(chat_id, 0)
+
+    def _bump(self, chat_id):
+        self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+
+    def get(self, chat_id):
+        """Cached ChatFilters for chat_id, or None if it must be loaded."""
+        entry = self._chats.get(chat_id)
+        if entry is not None:
+            self._chats.move_to_end(chat_id)
+        return entry
+
+    def put(self, chat_id, docs, version=None):
+        """
+        Store freshly loaded docs for a chat and return the entry.
+        If version is given and a write happened since, the result is
+        returned but not cached (the load raced a write).
+        """
+        entry = ChatFilters(chat_id, docs)
+        if version is not None and version != self.version(chat_id):
+            return entry
+        old = self._chats.pop(chat_id, None)
+        if old is not None:
+            self.bytes -= old.size
+        self._chats[chat_id] = entry
+        self.bytes += entry.size
+        self._evict()
+        return entry
+
+    def upsert(self, chat_id, doc):
+        """Write-through for a created/updated filter."""
+        self._bump(chat_id)
+        for listener in self.listeners:
+            listener.filter_added(chat_id, doc)
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            return
+        self.bytes += entry.upsert(doc)
+        self._evict()
+
+    def remove(self, chat_id, keyword):
+        """Write-through for a deleted filter."""
+        self._bump(chat_id)
+        entry = self._chats.get(chat_id)
+        if entry is not None:
+            self.bytes += entry.remove(keyword)
+
+    def invalidate(self, chat_id):
+        """Forget a chat after bulk changes (delall, clear, import)."""
+        self._bump(chat_id)
+        for listener in self.listeners:
+            listener.clear(chat_id)
+        entry = self._chats.pop(chat_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _evict(self):
+        # always keep the most recently used chat, even if it alone is over budget
+        while self.bytes > self.budget and len(self._chats) > 1:
+            _, entry = self._chats.popitem(last=False)
+            self.bytes -= entry.size
+
+    def stats(self):
+        return {"chats": len(self._chats), "bytes": self.bytes, "budget": self.budget}
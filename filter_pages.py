@@ -0,0 +1,129 @@
+# filter_pages.py - keyset-paged /filters listings with a rendered page cache
+# Pages are range queries on keyword (only the keyword field is fetched),
+# anchored on the first/last keyword of the neighbouring page. The keyset
+# slices are cached under the chat's filter-set version (FilterCache.version),
+# so repeat /filters calls cost no DB reads until the next filter write.
+# Pages are rendered on every call, not cached: their buttons may carry
+# short-lived callback tokens (callbacks.py) that must be issued fresh.
+
+import os
+from collections import OrderedDict
+
+from repository import maybe_await
+
+FILTERS_PER_PAGE = int(os.environ.get("FILTERS_PER_PAGE", "30"))  # keywords per group listing page
+FILTER_PAGES_MAX = int(os.environ.get("FILTER_PAGES_MAX", "5000"))  # page slices kept
+MAX_KEYWORD_DISPLAY = 100  # keeps a full listing page well under Telegram's 4096 chars
+
+NEXT = ">"  # page of keywords after anchor
+PREV = "<"  # page of keywords before anchor
+
+
+class Page:
+    __slots__ = ("keywords", "number", "size", "total", "has_prev", "has_next")
+
+    def __init__(self, keywords, number, size, total, has_prev, has_next):
+        self.keywords = keywords
+        self.number = number
+        self.size = size
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    @property
+    def pages(self):
+        return max(1, (self.total + self.size - 1) // self.size)
+
+    @property
+    def first(self):
+        return self.keywords[0] if self.keywords else ""
+
+    @property
+    def last(self):
+        return self.keywords[-1] if self.keywords else ""
+
+
+def listing_text(page, title):
+    """Numbered keyword list for a page, headed by title."""
+    start = (page.number - 1) * page.size
+    lines = [f"{title} ({page.total}) · Page {page.number}/{page.pages}:\n"]
+    for idx, keyword in enumerate(page.keywords, start=start + 1):
+        lines.append(f"{idx}. {keyword[:MAX_KEYWORD_DISPLAY]}")
+    return "\n".join(lines)
+
+
+class FilterPages:
+    """
+    get(chat_id, render, ...) returns render(page) for one page; the Page
+    is cached per (chat, version, size, anchor). collection is the async
+    repository filters collection, version a callable chat_id -> int that
+    changes on every filter write.
+    """
+
+    def __init__(self, collection, version, max_pages=FILTER_PAGES_MAX):
+        self.col = collection
+        self.version = version
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._totals = {}  # chat_id -> (version, count)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._pages)
+
+    async def _total(self, chat_id, version):
+        cached = self._totals.get(chat_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        total = await self.col.count_documents({"chat_id": chat_id})
+        self._totals[chat_id] = (version, total)
+        return total
+
+    async def fetch(self, chat_id, number=1, direction=NEXT, anchor="", size=FILTERS_PER_PAGE, version=None):
+        """One Page straight from the DB (no cache)."""
+        query = {"chat_id": chat_id}
+        if direction == PREV and anchor:
+            query["keyword"] = {"$lt": anchor}
+            sort = [("keyword", -1)]
+        else:
+            if anchor:
+                query["keyword"] = {"$gt": anchor}
+            sort = [("keyword", 1)]
+        # one extra row tells whether there is a page beyond this one
+        docs = await self.col.find(query, {"_id": 0, "keyword": 1}, sort=sort, limit=size + 1)
+        more = len(docs) > size
+        keywords = [d.get("keyword", "") for d in docs[:size]]
+        if direction == PREV and anchor:
+            keywords.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = bool(anchor), more
+        if version is None:
+            version = self.version(chat_id)
+        total = await self._total(chat_id, version)
+        return Page(keywords, max(1, number), size, total, has_prev, has_next)
+
+    async def get(self, chat_id, render, number=1, direction=NEXT, anchor="", size=FILTERS_PER_PAGE):
+        """render(page) (sync or async) for the requested page; the page is cached per filter-set version."""
+        version = self.version(chat_id)
+        key = (chat_id, version, size, direction, anchor)
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            page = await self.fetch(chat_id, number, direction, anchor, size, version)
+            if not page.keywords and anchor:
+                # stale anchor (filters changed under an old button): start over
+                return await self.get(chat_id, render, size=size)
+            # a write during the fetch bumped the version: don't cache a stale page
+            if version == self.version(chat_id):
+                self._pages[key] = page
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return await maybe_await(render(page))
+
+    def stats(self):
+        return {"pages": len(self._pages), "hits": self.hits, "misses": self.misses}
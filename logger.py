@@ -1,5 +1,7 @@
 import logging
+import os
 import sys
+from logging.handlers import RotatingFileHandler
 
 
 # Create main logger
@@ -23,3 +25,17 @@ console_handler.setFormatter(logging.Formatter(
 # Add handlers
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
+
+# ---------------- Slow query log ----------------
+# Written by mongo_monitor.py: one JSON line per slow Mongo operation
+slow_logger = logging.getLogger("slow_queries")
+slow_logger.setLevel(logging.INFO)
+slow_logger.propagate = False
+
+slow_handler = RotatingFileHandler(
+    os.environ.get("SLOW_LOG_FILE", "slow_queries.log"),
+    maxBytes=int(os.environ.get("SLOW_LOG_MAX_BYTES", str(5 * 1024 * 1024))),
+    backupCount=3,
+)
+slow_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+slow_logger.addHandler(slow_handler)
@@ -1,26 +1,41 @@
 # main.py - Cleaned & working Sachu ScencesPacks bot
-# Requirements: pyrogram, pymongo, rapidfuzz, flask (flask optional but keepalive included)
+# Requirements: pyrogram, pymongo, rapidfuzz
 # Env vars required: API_ID, API_HASH, BOT_TOKEN, MONGO_URI
 # Optional env var: ADMINS (comma separated list)
 
 import os
-import json
 import re
-import tempfile
-from threading import Thread
-from urllib.parse import quote_plus, unquote_plus
+import time
 from datetime import datetime
-from flask import Flask
-from pyrogram import Client, filters
+from pyrogram import Client, filters, idle
+from pyrogram.errors import FloodWait
 from pyrogram.types import (
     Message,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
 )
+from asyncio import create_task
+from filter_cache import ChatFilters, FilterCache
+from shards import SHARD_WORKERS, ShardError, ShardPool, ShardedFilterCache
+from matcher import FUZZY_THRESHOLD, match_tiered
+from match_memo import MatchMemo
+from negative_cache import NegativeCache
+from repository import connect as mongo_connect
+from payloads import BUTTON_RE, build_payload, get_payload
+from normalize import normalize, set_norm
+from digest import RequestDigest
+from outbox import Outbox, HIGH, LOW
+from dispatch import FairDispatcher
+from auto_delete import DeleteScheduler
+from schema import MAIN_INDEXES, MAIN_HOT_QUERIES, ensure_schema
+from callbacks import CallbackRouter, encode_cb
+from filter_pages import FilterPages, MAX_KEYWORD_DISPLAY, NEXT, PREV, listing_text
+from stats import Stats
+from backup import ImportReport, backup_chat_ids, backup_file, export_filters, import_filters
+from sessions import SessionCache
+from metrics import Counter, Gauge, MATCHES, MATCH_SCORE, MATCH_TIERS, serve as serve_metrics, timed
+from mongo_monitor import monitor as mongo_monitor
 from pymongo import MongoClient
-from rapidfuzz import fuzz
-from urllib.parse import quote_plus
-from asyncio import sleep
 
 # ---------------- Environment / Config ----------------
 API_ID = int(os.environ["API_ID"])
@@ -33,29 +48,111 @@ ADMIN_ID = ADMINS[0] if ADMINS else None
 if not (API_ID and API_HASH and BOT_TOKEN and MONGO_URI):
     raise RuntimeError("Missing one of API_ID/API_HASH/BOT_TOKEN/MONGO_URI env vars")
 
-# ---------------- Keepalive (Flask) ----------------
-app = Flask("keepalive")
-
-@app.route("/")
-def home():
-    return "✅ Sachuscencespacks Bot is running!"
-
-def _run_web():
-    app.run(host="0.0.0.0", port=8080)
-
-Thread(target=_run_web, daemon=True).start()
-
 # ---------------- MongoDB ----------------
-mongo = MongoClient(MONGO_URI, tls=True)
-db = mongo["Sachuscencespacks_db"]
-filters_col = db["filters"]
-connections_col = db["connections"]
-user_conn_col = db["user_conn"]
-requests_col = db["requests"]
-sync_col = db["sync"]
+# Async, pooled, per-operation timeouts (see repository.py)
+repo = mongo_connect(MONGO_URI, event_listeners=[mongo_monitor])
+# slow operations are explained from a small sync client in a background thread
+mongo_monitor.explain_with(MongoClient(MONGO_URI, tls=True, maxPoolSize=2, connect=False))
+
+# ---------------- Filter cache ----------------
+# Per-chat filters kept in memory for the auto reply; every write path below
+# must patch or invalidate it (see filter_cache.py, budget via FILTER_CACHE_MB).
+# With SHARD_WORKERS set, matching runs in worker processes that own the
+# filters (shards.py); this process then keeps only the versions and the
+# cache forwards each write to the owning worker.
+shard_pool = ShardPool(SHARD_WORKERS) if SHARD_WORKERS else None
+filter_cache = ShardedFilterCache(shard_pool) if shard_pool else FilterCache()
+
+async def load_chat_filters(chat_id):
+    """(docs, keep): keep is False if a write landed while loading."""
+    version = filter_cache.version(chat_id)
+    docs = await repo.filters.find({"chat_id": chat_id}, {"_id": 0})
+    return docs, version == filter_cache.version(chat_id)
+
+async def get_chat_filters(chat_id):
+    entry = filter_cache.get(chat_id)
+    if entry is None:
+        docs, keep = await load_chat_filters(chat_id)
+        # a write landing while we load bumps the version and skips caching
+        entry = filter_cache.put(chat_id, docs) if keep else ChatFilters(chat_id, docs)
+    return entry
+
+# /filters listings: keyset pages, rendered once per filter-set version
+filter_pages = FilterPages(repo.filters, filter_cache.version)
+
+# Repeated group texts: results memoized per (chat, normalized text) and
+# filter-set version (match_memo.py)
+match_memo = MatchMemo()
+Gauge("bot_match_memo_entries", "Match results memoized.", fn=lambda: len(match_memo))
+Counter("bot_match_memo_hits_total", "Group texts answered from the match memo.", fn=lambda: match_memo.hits)
+Counter("bot_match_memo_misses_total", "Group texts the match memo did not have.", fn=lambda: match_memo.misses)
+
+# Recently unmatched texts skip matching and the admin digest for a while;
+# adding a filter that matches one drops it (negative_cache.py)
+negative_cache = NegativeCache(filter_cache.version)
+filter_cache.listeners.append(negative_cache)
+Gauge("bot_negative_cache_entries", "Unmatched group texts remembered.", fn=lambda: len(negative_cache))
+Counter("bot_negative_cache_hits_total", "Group texts answered from the negative cache.", fn=lambda: negative_cache.hits)
+Counter("bot_negative_cache_evicted_total", "Remembered misses dropped for NEGATIVE_MAX.", fn=lambda: negative_cache.evicted)
+
+# ---------------- Stats ----------------
+# /status reads precomputed counters (stats.py); filter writes below report
+# how many filters they added/removed, a background job reconciles hourly
+stats = Stats(repo.stats, repo.filters, repo.dbstats)
+
+# ---------------- Admin sessions ----------------
+# user_conn (active group, pending import/clear) is read through this cache;
+# update it with sessions.update so the cached copy stays in step
+sessions = SessionCache(repo.user_conn)
 
 # ---------------- Pyrogram client ----------------
 client = Client("Sachuscencespacks", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+
+# ---------------- Update dispatch ----------------
+# Every handler below is queued per chat and served round-robin (dispatch.py),
+# so a noisy group cannot hold all of Pyrogram's workers
+fair_dispatch = FairDispatcher()
+Gauge("bot_dispatch_queue_depth", "Updates queued per chat (busiest chats).", ["chat"], fn=fair_dispatch.depths)
+Gauge("bot_dispatch_queued", "Updates queued across all chats.", fn=fair_dispatch.depth)
+Gauge("bot_dispatch_inflight", "Handlers running.", fn=lambda: fair_dispatch.inflight)
+Counter("bot_dispatch_dropped_total", "Queued updates dropped by a full chat queue.", fn=lambda: fair_dispatch.dropped)
+
+# ---------------- Admin request digest ----------------
+# Unmatched titles and /request are batched into one DM per admin (digest.py)
+request_digest = RequestDigest()
+
+# ---------------- Outbound queue ----------------
+# Group-facing sends go through the outbox (outbox.py): rate limited per chat
+# and globally, FloodWait retried, handlers don't wait for Telegram
+outbox = Outbox(flood_wait=FloodWait)
+Gauge("bot_outbox_depth", "Sends queued in the outbox.", fn=outbox.depth)
+Counter("bot_outbox_sent_total", "Sends delivered by the outbox.", fn=lambda: outbox.sent)
+Counter("bot_outbox_failed_total", "Sends that failed for good.", fn=lambda: outbox.failed)
+Counter("bot_outbox_dropped_total", "Sends dropped: chat queue full or waited too long.", fn=lambda: outbox.dropped)
+Counter("bot_flood_waits_total", "FloodWait errors hit by outbox sends.", fn=lambda: outbox.flood_waits)
+if shard_pool is not None:
+    Gauge("bot_shard_pending", "Match requests waiting on shard workers.", fn=shard_pool.depth)
+    Counter("bot_shard_restarts_total", "Shard worker processes restarted.", fn=lambda: shard_pool.restarts)
+    SHARD_FALLBACKS = Counter("bot_shard_fallbacks_total", "Group texts matched in process because their shard failed.")
+
+# ---------------- Callback router ----------------
+# Every callback query goes through one handler that dispatches on the data
+# prefix (callbacks.py); routes are admin-only unless registered otherwise
+router = CallbackRouter(ADMINS)
+
+@client.on_callback_query()
+@fair_dispatch.per_chat
+@timed
+async def callback_router(client, cq):
+    await router.dispatch(client, cq)
+
+def send_digest(admin, text):
+    return outbox.submit(admin, lambda: client.send_message(admin, text), LOW)
+
+# ---------------- Auto delete ----------------
+# Pending deletions are persisted in pending_deletes and resumed on restart
+delete_scheduler = DeleteScheduler(repo.pending_deletes)
+schedule_tasks = set()  # strong refs: the loop only keeps weak ones
 # ---------------- Helpers ----------------
 
 def parse_buttons_from_text(text: str):
@@ -95,14 +192,72 @@ def build_reply_markup_from_db(button_rows):
             rows.append(btns)
     return InlineKeyboardMarkup(rows) if rows else None
 
-def encode_cb(*parts):
-    return "|".join(quote_plus(str(p)) for p in parts)
+def cached_reply(chat_filters, kid):
+    """(payload, reply_markup) for a cached filter, built once per filter version."""
+    reply = chat_filters.replies.get(kid)
+    if reply is None:
+        payload = get_payload(chat_filters.by_id[kid])
+        reply = chat_filters.replies[kid] = (payload, build_reply_markup_from_db(payload["buttons"]))
+    return reply
 
-def decode_cb(data):
-    return [unquote_plus(p) for p in data.split("|")]
+async def match_chat(chat_id, text):
+    """
+    (has_filters, (score, payload, reply_markup) or None) for a normalized
+    group text: memoized, else matched in process or on the chat's shard.
+    """
+    # read before matching: a write landing meanwhile makes the entry stale
+    version = filter_cache.version(chat_id)
+    result = match_memo.get(chat_id, text, version)
+    if result is None:
+        result = await match_filters(chat_id, text)
+        match_memo.put(chat_id, text, version, result)
+    return result
+
+async def match_filters(chat_id, text):
+    if shard_pool is not None:
+        try:
+            has_filters, found, tier = await shard_pool.match(chat_id, text, lambda: load_chat_filters(chat_id), FUZZY_THRESHOLD)
+        except ShardError as e:
+            # worker restarting, crashed or too slow: still answer, from here
+            print("Shard match error, matching in process:", e)
+            SHARD_FALLBACKS.inc()
+        else:
+            if tier:
+                MATCH_TIERS.inc(tier=tier)
+            if found is None:
+                return has_filters, None
+            _, score, payload = found
+            return True, (score, payload, build_reply_markup_from_db(payload["buttons"]))
+    chat_filters = await get_chat_filters(chat_id)
+    if not chat_filters:
+        return False, None
+    # exact / prefix / token fast paths, fuzzy over n-gram candidates last
+    tier, kid, score = match_tiered(text, chat_filters.index, FUZZY_THRESHOLD)
+    MATCH_TIERS.inc(tier=tier)
+    if kid is None:
+        return True, None
+    payload, reply_markup = cached_reply(chat_filters, kid)
+    return True, (score, payload, reply_markup)
+
+async def send_payload(message, payload, reply_markup=None, **kwargs):
+    """Reply to message with a filter payload (photo or text)."""
+    if reply_markup is None:
+        reply_markup = build_reply_markup_from_db(payload["buttons"])
+    if payload["type"] == "photo":
+        return await message.reply_photo(
+            photo=payload["file_id"],
+            caption=payload["caption"],
+            reply_markup=reply_markup,
+            **kwargs
+        )
+    return await message.reply_text(
+        payload["caption"] or "No text found",
+        reply_markup=reply_markup,
+        **kwargs
+    )
 
 PER_PAGE = 10
-FUZZY_THRESHOLD = 80  # match threshold
+IMPORT_PROGRESS_EVERY = 3  # seconds between import progress edits
 
 # ---------------- Commands & Handlers ----------------
 
@@ -110,36 +265,41 @@ async def handle_delete_message(client, message, remove_msg="", seconds=10):
     chat_id = message.chat.id
     user_msg_id = message.id
 
-    reply_message = await client.send_message(
+    sent = outbox.submit(chat_id, lambda: client.send_message(
         chat_id=chat_id,
         text=remove_msg,
         reply_to_message_id=user_msg_id
-    )
-    bot_msg_id = reply_message.id
+    ))
 
-    await sleep(seconds)
+    def schedule_delete(sent):
+        if sent.cancelled() or sent.exception() is not None:
+            return
+        bot_msg_id = sent.result().id
+        task = create_task(delete_scheduler.schedule(chat_id, [bot_msg_id], seconds))
+        schedule_tasks.add(task)
+        task.add_done_callback(schedule_tasks.discard)
 
-    try:
-        await client.delete_messages(chat_id=chat_id, message_ids=bot_msg_id)
-    except Exception as e:
-        print(e)
-        return
+    sent.add_done_callback(schedule_delete)
 
 
 @client.on_message(filters.command("start"))
+@fair_dispatch.per_chat
+@timed
 async def start_cmd(_, message: Message):
     name = (message.from_user.first_name or "Friend")
-    await message.reply_text(
+    outbox.submit(message.chat.id, lambda: message.reply_text(
         f"👋 Hi {name}!\n\n"
         "Welcome to Sachu ScenesPacks 🎬\n"
         "Type a movie name in the group to check available scenepack filters.\n\n"
         "Use `/filters` to see available filters (in group for members, in private for admins).\n\n"
         "🔥 Created for Namakaga ❤️",
         quote=True
-    )
+    ))
 
 # ---------------- /connect (admin private) - manual group id ----------------
 @client.on_message(filters.private & filters.command("connect"))
+@fair_dispatch.per_chat
+@timed
 async def connect_group(client, message: Message):
     user_id = message.from_user.id
     if user_id not in ADMINS:
@@ -162,13 +322,13 @@ async def connect_group(client, message: Message):
     except:
         pass
 
-    connections_col.update_one(
+    await repo.connections.update_one(
         {"admin_id": user_id, "group_id": group_id},
         {"$set": {"admin_id": user_id, "group_id": group_id, "group_name": group_name}},
         upsert=True
     )
-    user_conn_col.update_one(
-        {"user_id": user_id},
+    await sessions.update(
+        user_id,
         {"$set": {"active_group": group_id}, "$addToSet": {"groups": {"id": group_id, "name": group_name}}},
         upsert=True
     )
@@ -177,12 +337,14 @@ async def connect_group(client, message: Message):
 
 # ---------------- /connections (admin private) ----------------
 @client.on_message(filters.private & filters.command("connections"))
+@fair_dispatch.per_chat
+@timed
 async def show_connections(client, message: Message):
     user_id = message.from_user.id
     if user_id not in ADMINS:
         return await message.reply_text("❌ Admins only.", quote=True)
 
-    conns = list(connections_col.find({"admin_id": user_id}))
+    conns = await repo.connections.find({"admin_id": user_id})
     if not conns:
         return await message.reply_text("🔗 No connected groups found.", quote=True)
 
@@ -194,15 +356,9 @@ async def show_connections(client, message: Message):
 
     await message.reply_text("🔗 Your connected groups:", reply_markup=InlineKeyboardMarkup(buttons), quote=True)
 
-@client.on_callback_query(filters.regex(r"^conn_group\|"))
-async def conn_group_cb(client, cq):
-    try:
-        _, gid_str = decode_cb(cq.data)
-        gid = int(gid_str)
-    except:
-        return await cq.answer("Invalid data", show_alert=True)
-
-    conn = connections_col.find_one({"group_id": gid})
+@router.route("conn_group", int)
+async def conn_group_cb(client, cq, gid):
+    conn = await repo.connections.find_one({"group_id": gid})
     gname = conn.get("group_name") if conn else "Unknown Group"
 
     buttons = [
@@ -214,51 +370,40 @@ async def conn_group_cb(client, cq):
     ]
     await cq.message.edit_text(f"⚙️ Manage: {gname}\nID: `{gid}`", reply_markup=InlineKeyboardMarkup(buttons))
 
-@client.on_callback_query(filters.regex(r"^conn_"))
-async def conn_actions_cb(client, cq):
-    data = cq.data
-    user_id = cq.from_user.id
-
-    if user_id not in ADMINS:
-        return await cq.answer("Not allowed", show_alert=True)
-
-    if data.startswith("conn_status|"):
-        _, gid_str = decode_cb(data)
-        gid = int(gid_str)
-        conn = connections_col.find_one({"group_id": gid})
-        await cq.answer("✅ Connected" if conn else "❌ Not connected", show_alert=True)
-
-    elif data.startswith("conn_connect|"):
-        _, gid_str = decode_cb(data)
-        gid = int(gid_str)
-        if connections_col.find_one({"group_id": gid}):
-            return await cq.answer("Already connected", show_alert=True)
-        connections_col.insert_one({"admin_id": user_id, "group_id": gid, "group_name": "Unknown Group"})
-        await cq.answer("Connected", show_alert=True)
-
-    elif data.startswith("conn_disconnect|"):
-        _, gid_str = decode_cb(data)
-        gid = int(gid_str)
-        connections_col.delete_one({"group_id": gid})
-        await cq.answer("Disconnected", show_alert=True)
-
-    elif data.startswith("conn_delete|"):
-        _, gid_str = decode_cb(data)
-        gid = int(gid_str)
-        connections_col.delete_one({"group_id": gid})
-        await cq.answer("Deleted", show_alert=True)
-
-    elif data.startswith("conn_back|"):
-        _, admin_id_str = decode_cb(data)
-        admin_id = int(admin_id_str)
-        conns = list(connections_col.find({"admin_id": admin_id}))
-        if not conns:
-            return await cq.message.edit_text("🔗 No connected groups found.")
-        buttons = [[InlineKeyboardButton(c.get("group_name","Unknown"), callback_data=encode_cb("conn_group", c["group_id"]))] for c in conns]
-        await cq.message.edit_text("🔗 Your connected groups:", reply_markup=InlineKeyboardMarkup(buttons))
+@router.route("conn_status", int)
+async def conn_status_cb(client, cq, gid):
+    conn = await repo.connections.find_one({"group_id": gid})
+    await cq.answer("✅ Connected" if conn else "❌ Not connected", show_alert=True)
+
+@router.route("conn_connect", int)
+async def conn_connect_cb(client, cq, gid):
+    if await repo.connections.find_one({"group_id": gid}):
+        return await cq.answer("Already connected", show_alert=True)
+    await repo.connections.insert_one({"admin_id": cq.from_user.id, "group_id": gid, "group_name": "Unknown Group"})
+    await cq.answer("Connected", show_alert=True)
+
+@router.route("conn_disconnect", int)
+async def conn_disconnect_cb(client, cq, gid):
+    await repo.connections.delete_one({"group_id": gid})
+    await cq.answer("Disconnected", show_alert=True)
+
+@router.route("conn_delete", int)
+async def conn_delete_cb(client, cq, gid):
+    await repo.connections.delete_one({"group_id": gid})
+    await cq.answer("Deleted", show_alert=True)
+
+@router.route("conn_back", int)
+async def conn_back_cb(client, cq, admin_id):
+    conns = await repo.connections.find({"admin_id": admin_id})
+    if not conns:
+        return await cq.message.edit_text("🔗 No connected groups found.")
+    buttons = [[InlineKeyboardButton(c.get("group_name","Unknown"), callback_data=encode_cb("conn_group", c["group_id"]))] for c in conns]
+    await cq.message.edit_text("🔗 Your connected groups:", reply_markup=InlineKeyboardMarkup(buttons))
 
 # ---------------- /filter add (private admin) ----------------
 @client.on_message(filters.private & filters.photo & filters.caption)
+@fair_dispatch.per_chat
+@timed
 async def create_filter_from_caption(client, message: Message):
     user_id = message.from_user.id
 
@@ -270,7 +415,7 @@ async def create_filter_from_caption(client, message: Message):
         return  # Ignore normal photos
 
     # Active group check
-    user_data = user_conn_col.find_one({"user_id": user_id})
+    user_data = await sessions.get(user_id)
     if not user_data or not user_data.get("active_group"):
         return await message.reply_text("❗ No active group connected. Use /connect <group_id> first.")
 
@@ -291,16 +436,12 @@ async def create_filter_from_caption(client, message: Message):
     msg_type = "photo"
 
     # --- Parse buttonurl lines ---
-    button_pattern = re.compile(
-        r"\[([^\]]+)\]\(buttonurl:\s*<?([^>\s)]+)>?\)",
-        re.IGNORECASE
-    )
     buttons = []
-    matches = button_pattern.findall(text_content)
+    matches = BUTTON_RE.findall(text_content)
     if matches:
         for btn_text, btn_url in matches:
             buttons.append({"text": btn_text.strip(), "url": btn_url.strip()})
-        text_content = button_pattern.sub("", text_content).strip()
+        text_content = BUTTON_RE.sub("", text_content).strip()
 
     # Prepare data for DB
     data = {
@@ -311,40 +452,40 @@ async def create_filter_from_caption(client, message: Message):
         "file_id": file_id,
         "buttons": buttons
     }
+    data["payload"] = build_payload(data)
+    set_norm(data)
 
-    filters_col.update_one(
+    res = await repo.filters.update_one(
         {"chat_id": group_id, "keyword": keyword},
         {"$set": data},
         upsert=True
     )
+    filter_cache.upsert(group_id, data)
+    if res.upserted_id is not None:
+        await stats.filters_changed(group_id, 1)
 
     await message.reply_text(f"✅ Filter '{keyword}' added successfully with photo.")
 
 # ---------------- /filters (group plain + admin private inline) ----------------
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from rapidfuzz import fuzz
 from pyrogram.enums import ChatType  # add this import at top if not already
 
 
-MAX_LEN = 4000   # safe limit
-
-def split_message(text):
-    chunks = []
-    while len(text) > MAX_LEN:
-        # find the last newline before the limit
-        split_at = text.rfind("\n", 0, MAX_LEN)
-
-        if split_at == -1:  # no newline found
-            split_at = MAX_LEN
-
-        chunks.append(text[:split_at])
-        text = text[split_at:].lstrip()
-
-    chunks.append(text)
-    return chunks
+def render_group_page(page):
+    if not page.keywords:
+        return None, None
+    text = listing_text(page, "🎬 Filters in this group")
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=encode_cb("fpage", page.number - 1, PREV, page.first)))
+    if page.has_next:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=encode_cb("fpage", page.number + 1, NEXT, page.last)))
+    return text, InlineKeyboardMarkup([nav]) if nav else None
 
 
 @client.on_message(filters.command("filters"))
+@fair_dispatch.per_chat
+@timed
 async def list_filters(client, message: Message):
     # Normalize chat_type (supports both enum and string)
     chat_type = getattr(message.chat, "type", None)
@@ -354,25 +495,16 @@ async def list_filters(client, message: Message):
     # ---------- GROUP CHAT ----------
     if chat_type_str in ("group", "supergroup"):
         group_id = message.chat.id
-        filters_list = list(filters_col.find({"chat_id": group_id}).sort("keyword", 1))
+        text, markup = await filter_pages.get(group_id, render_group_page)
 
-        if not filters_list:
+        if text is None:
             msg = (
                         "📦 No filters found in this group yet.\n"
                         "Type the movie name to check scenepacks or use `/request <Movie Name>`."
                     )
             return await handle_delete_message(client, message, remove_msg=msg)
 
-        text = f"🎬 Filters in this group ({len(filters_list)}):\n\n"
-        for idx, f in enumerate(filters_list, start=1):
-            keyword = f.get("keyword", "❓")
-            text += f"{idx}. {keyword}\n"
-
-        parts = split_message(text)
-
-        for part in parts:
-            await message.reply_text(part, quote=True)
-        # await message.reply_text(text, quote=True)
+        outbox.submit(group_id, lambda: message.reply_text(text, reply_markup=markup, quote=True))
         return
 
     # ---------- PRIVATE CHAT (ADMINS ONLY) ----------
@@ -380,27 +512,11 @@ async def list_filters(client, message: Message):
         if user_id not in ADMINS:
             return await message.reply_text("⚠️ Only admins can use this command in private chat.", quote=True)
 
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
+        group_id = await get_active_group(user_id)
+        if not group_id:
             return await message.reply_text("❗ No active group connected. Use /connect <group_id> first.", quote=True)
 
-        group_id = int(user_data["active_group"])
-        filters_list = list(filters_col.find({"chat_id": group_id}).sort("keyword", 1))
-
-        if not filters_list:
-            return await message.reply_text("📦 No filters found in the connected group.", quote=True)
-
-        text = f"🎬 Filters in connected group ({len(filters_list)}):\n\n"
-        for idx, f in enumerate(filters_list, start=1):
-            keyword = f.get("keyword", "❓")
-            text += f"{idx}. {keyword}\n"
-
-        parts = split_message(text)
-
-        for part in parts:
-            await message.reply_text(part, quote=True)
-        # await message.reply_text(text, quote=True)
-        return
+        return await send_filters_page_private(client, message, group_id)
 
     # ---------- DEFAULT FALLBACK ----------
     await message.reply_text(
@@ -408,178 +524,173 @@ async def list_filters(client, message: Message):
         quote=True
     )
 
-async def send_filters_page_private(client, message_or_cq, gid, all_filters, page=1):
-    total = len(all_filters)
-    total_pages = (total + PER_PAGE - 1) // PER_PAGE
-    page = max(1, min(page, total_pages))
-    start = (page - 1) * PER_PAGE
-    end = start + PER_PAGE
-    chunk = all_filters[start:end]
+# Group listing pages: anyone in the group may flip through them
+@router.route("fpage", int, admin_only=False)
+async def group_filters_page_cb(client, callback_query, number, direction, anchor):
+    group_id = callback_query.message.chat.id
+    text, markup = await filter_pages.get(group_id, render_group_page, number, direction, anchor)
+    if text is None:
+        return await callback_query.answer("📦 No filters found.", show_alert=True)
+    await callback_query.message.edit_text(text, reply_markup=markup)
+    await callback_query.answer()
+
+async def send_filters_page_private(client, message_or_cq, gid, number=1, direction=NEXT, anchor=""):
+    async def render(page):
+        if not page.keywords:
+            return None, None
+        group_name = str(gid)
+        try:
+            chat = await client.get_chat(gid)
+            group_name = chat.title or group_name
+        except:
+            pass
 
-    group_name = str(gid)
-    try:
-        chat = await client.get_chat(gid)
-        group_name = chat.title or group_name
-    except:
-        pass
+        text = f"🎬 Filters for {group_name} ({page.total})\n📄 Page {page.number}/{page.pages}\n\nSelect a filter:"
+        buttons = []
+        for kw in page.keywords:
+            buttons.append([InlineKeyboardButton(kw[:MAX_KEYWORD_DISPLAY], callback_data=encode_cb("filters_view", gid, kw))])
 
-    text = f"🎬 Filters for {group_name}\n📄 Page {page}/{total_pages}\n\nSelect a filter:"
-    buttons = []
-    for f in chunk:
-        kw = f.get("keyword", "❓")
-        buttons.append([InlineKeyboardButton(kw, callback_data=encode_cb("filters_view", gid, kw))])
+        nav = []
+        if page.has_prev:
+            nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=encode_cb("filters_page", gid, page.number - 1, PREV, page.first)))
+        if page.has_next:
+            nav.append(InlineKeyboardButton("Next ➡️", callback_data=encode_cb("filters_page", gid, page.number + 1, NEXT, page.last)))
+        if nav:
+            buttons.append(nav)
 
-    nav = []
-    if page > 1:
-        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=encode_cb("filters_page", gid, page-1)))
-    if end < total:
-        nav.append(InlineKeyboardButton("Next ➡️", callback_data=encode_cb("filters_page", gid, page+1)))
-    if nav:
-        buttons.append(nav)
+        buttons.append([InlineKeyboardButton("🔙 Close", callback_data=encode_cb("filters_close", gid))])
+        return text, InlineKeyboardMarkup(buttons)
 
-    buttons.append([InlineKeyboardButton("🔙 Close", callback_data=encode_cb("filters_close", gid))])
-    markup = InlineKeyboardMarkup(buttons)
+    text, markup = await filter_pages.get(gid, render, number, direction, anchor, size=PER_PAGE)
+    if text is None:
+        text = "📦 No filters found in the connected group."
 
     if hasattr(message_or_cq, "reply_text"):
         await message_or_cq.reply_text(text, reply_markup=markup, quote=True)
     else:
         await message_or_cq.message.edit_text(text, reply_markup=markup)
 
-# pagination callback
-@client.on_callback_query()
-async def filters_callback(client, callback_query):
-    user_id = callback_query.from_user.id
+async def get_active_group(user_id):
+    user_data = await sessions.get(user_id)
+    if not user_data or not user_data.get("active_group"):
+        return None
+    return int(user_data["active_group"])
 
-    if user_id not in ADMINS:
-        return await callback_query.answer("⚠️ Only admins can use this.", show_alert=True)
-
-    data = callback_query.data
-
-    # Pagination handler
-    if data.startswith("filters_page:"):
-        page = int(data.split(":")[1])
-        # Get active group
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
-            return await callback_query.answer("❗ No active group connected.", show_alert=True)
-
-        group_id = int(user_data["active_group"])
-        filters_list = list(filters_col.find({"chat_id": group_id}).sort("keyword", 1))
-        keyboard = build_filters_buttons(filters_list, page=page)
-        await callback_query.message.edit_text(
-            f"📜 Filters in group ({len(filters_list)}):",
-            reply_markup=keyboard
-        )
-        return
+# pagination callbacks
+@router.route("filters_page", int, int)
+async def filters_page_cb(client, callback_query, gid, number=1, direction=NEXT, anchor=""):
+    await send_filters_page_private(client, callback_query, gid, number, direction, anchor)
 
-    # Filter actions
-    if data.startswith("filter:"):
-        keyword = data.split(":")[1]
-        # Show action buttons: View / Delete / Copy / Back
-        buttons = [
-            [InlineKeyboardButton("📄 View", callback_data=f"view:{keyword}")],
-            [InlineKeyboardButton("🗑 Delete", callback_data=f"del:{keyword}")],
-            [InlineKeyboardButton("📤 Copy", callback_data=f"copy:{keyword}")],
-            [InlineKeyboardButton("🔙 Back", callback_data="filters_page:0")]
-        ]
-        await callback_query.message.edit_text(
-            f"⚡ Actions for filter: {keyword}",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-        return
+@router.route("filters_close", int)
+async def filters_close_cb(client, callback_query, gid):
+    await callback_query.message.delete()
 
-    # View filter
-    if data.startswith("view:"):
-        keyword = data.split(":")[1]
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
-            return await callback_query.answer("❗ No active group connected.", show_alert=True)
-
-        group_id = int(user_data["active_group"])
-        fdata = filters_col.find_one({"chat_id": group_id, "keyword": keyword})
-        if not fdata:
-            return await callback_query.answer("❌ Filter not found.", show_alert=True)
-
-        # Send photo if exists
-        if fdata.get("file_id"):
-            await callback_query.message.reply_photo(
-                fdata["file_id"],
-                caption=fdata.get("text",""),
-                reply_markup=InlineKeyboardMarkup(
-                    [[InlineKeyboardButton(b["text"], url=b["url"]) for b in fdata.get("buttons",[])]]
-                ) if fdata.get("buttons") else None
-            )
-        else:
-            await callback_query.message.reply_text(fdata.get("text","No text found"))
-        await callback_query.answer()
-        return
+# Filter actions
+@router.route("filters_view", int)
+async def filters_view_cb(client, callback_query, gid, keyword):
+    # Show action buttons: View / Delete / Copy / Back
+    buttons = [
+        [InlineKeyboardButton("📄 View", callback_data=encode_cb("view", keyword))],
+        [InlineKeyboardButton("🗑 Delete", callback_data=encode_cb("del", keyword))],
+        [InlineKeyboardButton("📤 Copy", callback_data=encode_cb("copy", keyword))],
+        [InlineKeyboardButton("🔙 Back", callback_data=encode_cb("filters_page", gid, 1))]
+    ]
+    await callback_query.message.edit_text(
+        f"⚡ Actions for filter: {keyword}",
+        reply_markup=InlineKeyboardMarkup(buttons)
+    )
 
-    # Delete filter
-    if data.startswith("del:"):
-        keyword = data.split(":")[1]
-        # Ask confirmation Yes / No
-        buttons = [
-            [
-                InlineKeyboardButton("✅ Yes", callback_data=f"del_confirm:{keyword}"),
-                InlineKeyboardButton("❌ No", callback_data="filters_page:0")
-            ]
-        ]
-        await callback_query.message.edit_text(
-            f"⚠️ Are you sure you want to delete filter: {keyword}?",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-        return
+# View filter
+@router.route("view")
+async def view_cb(client, callback_query, keyword):
+    group_id = await get_active_group(callback_query.from_user.id)
+    if not group_id:
+        return await callback_query.answer("❗ No active group connected.", show_alert=True)
 
-    if data.startswith("del_confirm:"):
-        keyword = data.split(":")[1]
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
-            return await callback_query.answer("❗ No active group connected.", show_alert=True)
+    fdata = await repo.filters.find_one({"chat_id": group_id, "keyword": keyword})
+    if not fdata:
+        return await callback_query.answer("❌ Filter not found.", show_alert=True)
 
-        group_id = int(user_data["active_group"])
-        filters_col.delete_one({"chat_id": group_id, "keyword": keyword})
-        await callback_query.message.edit_text(f"✅ Filter '{keyword}' deleted successfully.")
-        return
+    await send_payload(callback_query.message, get_payload(fdata))
+    await callback_query.answer()
+
+# Delete filter
+@router.route("del")
+async def del_cb(client, callback_query, keyword):
+    group_id = await get_active_group(callback_query.from_user.id)
+    if not group_id:
+        return await callback_query.answer("❗ No active group connected.", show_alert=True)
 
-    # Copy filter
-    if data.startswith("copy:"):
-        keyword = data.split(":")[1]
-        # List all connected groups except active group
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
-            return await callback_query.answer("❗ No active group connected.", show_alert=True)
-
-        active_group = int(user_data["active_group"])
-        connected_groups = connections_col.find({"user_id": user_id, "chat_id": {"$ne": active_group}})
-        buttons = [
-            [InlineKeyboardButton(g.get("name","Unknown"), callback_data=f"copyto:{keyword}:{g['chat_id']}")]
-            for g in connected_groups
+    # Ask confirmation Yes / No
+    buttons = [
+        [
+            InlineKeyboardButton("✅ Yes", callback_data=encode_cb("del_confirm", keyword)),
+            InlineKeyboardButton("❌ No", callback_data=encode_cb("filters_page", group_id, 1))
         ]
-        buttons.append([InlineKeyboardButton("🔙 Back", callback_data="filters_page:0")])
-        await callback_query.message.edit_text("📤 Choose group to copy filter:", reply_markup=InlineKeyboardMarkup(buttons))
-        return
+    ]
+    await callback_query.message.edit_text(
+        f"⚠️ Are you sure you want to delete filter: {keyword}?",
+        reply_markup=InlineKeyboardMarkup(buttons)
+    )
+
+@router.route("del_confirm")
+async def del_confirm_cb(client, callback_query, keyword):
+    group_id = await get_active_group(callback_query.from_user.id)
+    if not group_id:
+        return await callback_query.answer("❗ No active group connected.", show_alert=True)
+
+    res = await repo.filters.delete_one({"chat_id": group_id, "keyword": keyword})
+    filter_cache.remove(group_id, keyword)
+    await stats.filters_changed(group_id, -res.deleted_count)
+    await callback_query.message.edit_text(f"✅ Filter '{keyword}' deleted successfully.")
+
+# Copy filter
+@router.route("copy")
+async def copy_cb(client, callback_query, keyword):
+    user_id = callback_query.from_user.id
+    # List all connected groups except active group
+    active_group = await get_active_group(user_id)
+    if not active_group:
+        return await callback_query.answer("❗ No active group connected.", show_alert=True)
+
+    connected_groups = await repo.connections.find({"user_id": user_id, "chat_id": {"$ne": active_group}})
+    buttons = [
+        [InlineKeyboardButton(g.get("name","Unknown"), callback_data=encode_cb("copyto", keyword, g["chat_id"]))]
+        for g in connected_groups
+    ]
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data=encode_cb("filters_page", active_group, 1))])
+    await callback_query.message.edit_text("📤 Choose group to copy filter:", reply_markup=InlineKeyboardMarkup(buttons))
+
+@router.route("copyto", str, int)
+async def copyto_cb(client, callback_query, keyword, target_group):
+    active_group = await get_active_group(callback_query.from_user.id)
+    if not active_group:
+        return await callback_query.answer("❗ No active group connected.", show_alert=True)
+
+    fdata = await repo.filters.find_one({"chat_id": active_group, "keyword": keyword})
+    if not fdata:
+        return await callback_query.answer("❌ Filter not found.", show_alert=True)
+
+    # Insert copy
+    new_filter = fdata.copy()
+    new_filter["chat_id"] = target_group
+    new_filter.pop("_id", None)
+    set_norm(new_filter)  # filters saved before norms existed get one now
+    # upsert: (chat_id, keyword) is unique, copying over an existing filter replaces it
+    res = await repo.filters.update_one(
+        {"chat_id": target_group, "keyword": keyword},
+        {"$set": new_filter},
+        upsert=True
+    )
+    filter_cache.upsert(target_group, new_filter)
+    if res.upserted_id is not None:
+        await stats.filters_changed(target_group, 1)
+    await callback_query.message.edit_text(f"✅ Filter '{keyword}' copied to group successfully.")
 
-    if data.startswith("copyto:"):
-        _, keyword, target_group = data.split(":")
-        target_group = int(target_group)
-        user_data = user_conn_col.find_one({"user_id": user_id})
-        if not user_data or not user_data.get("active_group"):
-            return await callback_query.answer("❗ No active group connected.", show_alert=True)
-
-        active_group = int(user_data["active_group"])
-        fdata = filters_col.find_one({"chat_id": active_group, "keyword": keyword})
-        if not fdata:
-            return await callback_query.answer("❌ Filter not found.", show_alert=True)
-
-        # Insert copy
-        new_filter = fdata.copy()
-        new_filter["chat_id"] = target_group
-        new_filter.pop("_id", None)
-        filters_col.insert_one(new_filter)
-        await callback_query.message.edit_text(f"✅ Filter '{keyword}' copied to group successfully.")
-        return
 # ---------------- quick del/delall commands (admin private) ----------
 @client.on_message(filters.private & filters.command("del"))
+@fair_dispatch.per_chat
+@timed
 async def del_private(client, message: Message):
     if message.from_user.id not in ADMINS:
         return await message.reply_text("⚠️ Admin only.", quote=True)
@@ -587,31 +698,39 @@ async def del_private(client, message: Message):
     if len(parts) < 2:
         return await message.reply_text("Usage: /del <keyword>", quote=True)
     keyword = parts[1].strip().lower()
-    ud = user_conn_col.find_one({"user_id": message.from_user.id}) or {}
+    ud = await sessions.get(message.from_user.id)
     active = ud.get("active_group")
     if not active:
         return await message.reply_text("❗ No active group.", quote=True)
     gid = int(active)
-    res = filters_col.delete_one({"chat_id": gid, "keyword": keyword})
+    res = await repo.filters.delete_one({"chat_id": gid, "keyword": keyword})
     if res.deleted_count:
+        filter_cache.remove(gid, keyword)
+        await stats.filters_changed(gid, -1)
         await message.reply_text(f"🗑️ '{keyword}' deleted from `{gid}`.", quote=True)
     else:
         await message.reply_text("❌ Not found.", quote=True)
 
 @client.on_message(filters.private & filters.command("delall"))
+@fair_dispatch.per_chat
+@timed
 async def delall_private(client, message: Message):
     if message.from_user.id not in ADMINS:
         return await message.reply_text("⚠️ Admin only.", quote=True)
-    ud = user_conn_col.find_one({"user_id": message.from_user.id}) or {}
+    ud = await sessions.get(message.from_user.id)
     active = ud.get("active_group")
     if not active:
         return await message.reply_text("❗ No active group.", quote=True)
     gid = int(active)
-    count = filters_col.delete_many({"chat_id": gid}).deleted_count
+    count = (await repo.filters.delete_many({"chat_id": gid})).deleted_count
+    filter_cache.invalidate(gid)
+    await stats.filters_changed(gid, -count)
     await message.reply_text(f"🧹 Deleted {count} filters from `{gid}`.", quote=True)
 
 # ---------------- /view private admin ----------------
 @client.on_message(filters.private & filters.command("view"))
+@fair_dispatch.per_chat
+@timed
 async def view_filter(client, message: Message):
     user_id = message.from_user.id
 
@@ -625,73 +744,65 @@ async def view_filter(client, message: Message):
 
     keyword = parts[1].strip().lower()
 
-    user_data = user_conn_col.find_one({"user_id": user_id})
+    user_data = await sessions.get(user_id)
     if not user_data or not user_data.get("active_group"):
         return await message.reply_text("❗ No active group connected. Use /connect <group_id> first.")
 
     group_id = int(user_data["active_group"])
 
     # Get filter from DB
-    f = filters_col.find_one({"chat_id": group_id, "keyword": keyword})
+    f = await repo.filters.find_one({"chat_id": group_id, "keyword": keyword})
     if not f:
         return await message.reply_text(f"⚠️ Filter '{keyword}' not found in group `{group_id}`.")
 
-    text_content = f.get("text", "")
-    buttons = []
-
-    # If buttons exist in DB, rebuild InlineKeyboard
-    for b in f.get("buttons", []):
-        if b.get("text") and b.get("url"):
-            buttons.append([InlineKeyboardButton(b["text"], url=b["url"])])
-
-    reply_markup = InlineKeyboardMarkup(buttons) if buttons else None
-
-    # Send photo or text
-    if f.get("type") == "photo" and f.get("file_id"):
-        await message.reply_photo(
-            photo=f["file_id"],
-            caption=text_content,
-            reply_markup=reply_markup
-        )
-    else:
-        await message.reply_text(
-            text_content,
-            reply_markup=reply_markup
-        )
+    await send_payload(message, get_payload(f))
 
 # ---------------- /request ----------------
 @client.on_message(filters.command("request") & (filters.private | filters.group))
+@fair_dispatch.per_chat
+@timed
 async def request_command(client, message: Message):
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        return await message.reply_text("Usage: /request <Movie Name>", quote=True)
+        outbox.submit(message.chat.id, lambda: message.reply_text("Usage: /request <Movie Name>", quote=True))
+        return
     movie = parts[1].strip()
-    requests_col.insert_one({"movie": movie, "from": message.from_user.id, "chat": message.chat.id, "time": datetime.utcnow()})
-    for admin in ADMINS:
-        try:
-            await client.send_message(admin, f"📩 Request from `{message.from_user.id}` in `{message.chat.id}`:\n\n{movie}")
-        except:
-            pass
-    await message.reply_text("📩 Request received. Admin will check soon. Thanks!", quote=True)
+    await repo.requests.insert_one({"movie": movie, "from": message.from_user.id, "chat": message.chat.id, "time": datetime.utcnow()})
+    request_digest.add(message.chat.id, movie, message.from_user.id, source="request")
+    stats.record_request()
+    outbox.submit(message.chat.id, lambda: message.reply_text("📩 Request received. Admin will check soon. Thanks!", quote=True))
+
+# ---------------- /slowq (admin private) ----------------
+@client.on_message(filters.private & filters.command("slowq"))
+@fair_dispatch.per_chat
+@timed
+async def slow_queries(client, message: Message):
+    if message.from_user.id not in ADMINS:
+        return await message.reply_text("⚠️ Admin only.", quote=True)
+    parts = message.text.split()
+    n = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+    await message.reply_text(mongo_monitor.render_top(min(n, 25))[:4000], quote=True)
 
 # ---------------- /status (admin placeholder: backup/import/clear) ----------------
 @client.on_message(filters.private & filters.command("status"))
+@fair_dispatch.per_chat
+@timed
 async def status_command(client, message: Message):
     if message.from_user.id not in ADMINS:
         return await message.reply_text("⚠️ Admin only.", quote=True)
-    try:
-        stats = mongo.admin.command("dbstats")
-        storage_mb = round(stats.get("storageSize",0) / (1024*1024), 2)
-    except:
-        storage_mb = "N/A"
-    total_filters = filters_col.count_documents({})
-    try:
-        total_groups = len(filters_col.distinct("chat_id"))
-    except:
-        total_groups = "N/A"
-    text = f"📊 Database Status\n\n• Filters total: {total_filters}\n• Groups with filters: {total_groups}\n• Storage used: {storage_mb} MB"
+    snap = await stats.snapshot()
+    hit_rate = f"{snap['hit_rate']:.0%}" if snap["hit_rate"] is not None else "N/A"
+    text = (
+        f"📊 Database Status\n\n"
+        f"• Filters total: {snap['filters']}\n"
+        f"• Groups with filters: {snap['groups']}\n"
+        f"• Storage used: {snap['storage_mb']} MB\n"
+        f"• Match hit rate: {hit_rate} ({snap['hits']} hits / {snap['misses']} misses)\n"
+        f"• Requests today: {snap['requests_today']}"
+    )
     buttons = [
         [InlineKeyboardButton("💾 Backup DB", callback_data=encode_cb("status","backup"))],
+        [InlineKeyboardButton("🗄 Backup all groups", callback_data=encode_cb("status","backup_all"))],
         [InlineKeyboardButton("📥 Import DB", callback_data=encode_cb("status","import"))],
         [InlineKeyboardButton("📋 Copy Filters", callback_data=encode_cb("status","copy"))],
         [InlineKeyboardButton("🧹 Clear DB", callback_data=encode_cb("status","clear"))],
@@ -699,66 +810,105 @@ async def status_command(client, message: Message):
     ]
     await message.reply_text(text, reply_markup=InlineKeyboardMarkup(buttons), quote=True)
 
-@client.on_callback_query(filters.regex(r"^status\|"))
-async def status_cb(client, cq):
-    if cq.from_user.id not in ADMINS:
-        return await cq.answer("Admin only", show_alert=True)
-    parts = decode_cb(cq.data)
-    if len(parts) < 2:
-        return await cq.answer("Invalid", show_alert=True)
-    action = parts[1]
+@router.route("status")
+async def status_cb(client, cq, action):
     if action == "backup":
-        ud = user_conn_col.find_one({"user_id": cq.from_user.id}) or {}
+        ud = await sessions.get(cq.from_user.id)
         if not ud.get("active_group"):
             return await cq.answer("No active group", show_alert=True)
         gid = int(ud["active_group"])
-        docs = list(filters_col.find({"chat_id": gid}, {"_id":0}))
-        if not docs:
-            return await cq.answer("No filters", show_alert=True)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        tmp.write(json.dumps(docs, ensure_ascii=False, indent=2).encode("utf-8"))
-        tmp.flush(); tmp.close()
-        await client.send_document(chat_id=cq.from_user.id, document=tmp.name, caption=f"Backup for group {gid}")
-        await cq.answer("Backup sent", show_alert=True)
+        await cq.answer("Preparing backup…")
+        async with backup_file(f"filters_{gid}.ndjson.gz") as path:
+            counts = await export_filters(repo.filters, [gid], path)
+            if not counts[gid]:
+                return await client.send_message(cq.from_user.id, "📦 No filters to back up.")
+            await client.send_document(chat_id=cq.from_user.id, document=path, caption=f"Backup for group {gid} ({counts[gid]} filters)")
+    elif action == "backup_all":
+        conns = await repo.connections.find({"admin_id": cq.from_user.id}, {"group_id": 1})
+        gids = sorted({int(c["group_id"]) for c in conns if c.get("group_id")})
+        if not gids:
+            return await cq.answer("No connected groups", show_alert=True)
+        await cq.answer("Preparing backup…")
+        async with backup_file("filters_all.ndjson.gz") as path:
+            counts = await export_filters(repo.filters, gids, path)
+            total = sum(counts.values())
+            if not total:
+                return await client.send_message(cq.from_user.id, "📦 No filters to back up.")
+            await client.send_document(chat_id=cq.from_user.id, document=path, caption=f"Backup of {len(gids)} groups ({total} filters)")
     elif action == "import":
-        await cq.message.edit_text("📥 Please send the backup JSON file (as document) to this chat now.")
-        user_conn_col.update_one({"user_id": cq.from_user.id}, {"$set": {"pending_import": True}}, upsert=True)
+        await cq.message.edit_text("📥 Please send the backup file (JSON, NDJSON or .gz, as document) to this chat now.")
+        await sessions.update(cq.from_user.id, {"$set": {"pending_import": True}}, upsert=True)
     elif action == "clear":
         await cq.message.edit_text("⚠️ Send admin password to confirm clear.")
-        user_conn_col.update_one({"user_id": cq.from_user.id}, {"$set": {"awaiting_clear_password": True}}, upsert=True)
+        await sessions.update(cq.from_user.id, {"$set": {"awaiting_clear_password": True}}, upsert=True)
     else:
         await cq.answer("Unknown action", show_alert=True)
 
 @client.on_message(filters.private & filters.document)
+@fair_dispatch.per_chat
+@timed
 async def handle_document_import(client, message: Message):
-    ud = user_conn_col.find_one({"user_id": message.from_user.id}) or {}
+    ud = await sessions.get(message.from_user.id)
     if ud.get("pending_import") and ud.get("active_group"):
+        gid = int(ud["active_group"])
         tmp_path = await message.download()
+        progress_msg = await message.reply_text("📥 Importing…", quote=True)
+        last_edit = 0
+
+        async def show_progress(report):
+            nonlocal last_edit
+            # Telegram rate-limits edits; one every few seconds is plenty
+            if time.monotonic() - last_edit < IMPORT_PROGRESS_EVERY:
+                return
+            last_edit = time.monotonic()
+            try:
+                await progress_msg.edit_text(f"📥 Importing… {report.read} read, {report.upserted} new, {report.failed} failed")
+            except Exception:
+                pass
+
+        report = ImportReport()
         try:
-            with open(tmp_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            gid = int(ud["active_group"])
-            imported = 0
-            for item in data:
-                item.pop("_id", None)
-                item["chat_id"] = gid
-                item["keyword"] = item.get("keyword","").lower()
-                item["buttons"] = item.get("buttons", [])
-                filters_col.update_one({"chat_id": gid, "keyword": item["keyword"]}, {"$set": item}, upsert=True)
-                imported += 1
-            await message.reply_text(f"✅ Imported {imported} filters into group `{gid}`.", quote=True)
+            # a "Backup all groups" archive goes back into each filter's own group
+            chat_ids = await backup_chat_ids(tmp_path)
+            own_chat = len(chat_ids) > 1
+            if own_chat:
+                conns = await repo.connections.find({"admin_id": message.from_user.id}, {"group_id": 1})
+                foreign = chat_ids - {int(c["group_id"]) for c in conns if c.get("group_id")}
+                if foreign:
+                    raise ValueError("backup has filters of groups you are not connected to: "
+                                     + ", ".join(map(str, sorted(foreign))))
+            await import_filters(repo.filters, tmp_path, gid, show_progress, report=report, own_chat=own_chat)
+            where = f"{len(report.chats)} groups" if own_chat else f"group `{gid}`"
+            text = (
+                f"✅ Imported {report.upserted + report.modified} filters into {where} "
+                f"({report.upserted} new, {report.modified} updated, {report.failed} failed)."
+            )
+            if report.errors:
+                text += "\n\n" + "\n".join(f"• {where}: {msg}" for where, msg in report.errors)
+                if report.failed > len(report.errors):
+                    text += f"\n… and {report.failed - len(report.errors)} more"
+            await progress_msg.edit_text(text[:4000])
         except Exception as e:
-            await message.reply_text(f"❌ Import failed: {e}", quote=True)
+            await progress_msg.edit_text(
+                f"❌ Import failed: {e}\n"
+                f"Written before the failure: {report.upserted} new, {report.modified} updated."
+            )
         finally:
-            user_conn_col.update_one({"user_id": message.from_user.id}, {"$unset": {"pending_import": ""}})
+            # batches written before a failure are in the db: drop the stale cache either way
+            for chat_id in report.chats.keys() | {gid}:
+                filter_cache.invalidate(chat_id)
+                await stats.filters_changed(chat_id, report.chats.get(chat_id, 0))
+            await sessions.update(message.from_user.id, {"$unset": {"pending_import": ""}})
             try: os.remove(tmp_path)
             except: pass
         return
     await message.reply_text("No import pending. Use /status -> Import DB first.", quote=True)
 
 @client.on_message(filters.private & filters.text)
+@fair_dispatch.per_chat
+@timed
 async def admin_text_handlers(client, message: Message):
-    ud = user_conn_col.find_one({"user_id": message.from_user.id}) or {}
+    ud = await sessions.get(message.from_user.id)
     if ud.get("awaiting_clear_password"):
         pwd = message.text.strip()
         if pwd == "04042726":
@@ -766,22 +916,24 @@ async def admin_text_handlers(client, message: Message):
                 await message.reply_text("❗ No active group set.", quote=True)
             else:
                 gid = int(ud["active_group"])
-                count = filters_col.delete_many({"chat_id": gid}).deleted_count
+                count = (await repo.filters.delete_many({"chat_id": gid})).deleted_count
+                filter_cache.invalidate(gid)
+                await stats.filters_changed(gid, -count)
                 await message.reply_text(f"🧹 Cleared {count} filters from `{gid}`.", quote=True)
         else:
             await message.reply_text("❌ Wrong password.", quote=True)
-        user_conn_col.update_one({"user_id": message.from_user.id}, {"$unset": {"awaiting_clear_password": ""}})
+        await sessions.update(message.from_user.id, {"$unset": {"awaiting_clear_password": ""}})
         return
 
 # ---------------- Auto fuzzy reply in groups ----------------
-from rapidfuzz import fuzz
 from pyrogram.enums import ChatType
 
-from rapidfuzz import fuzz
 from pyrogram.enums import ChatType
 import re
 
 @client.on_message(filters.text)
+@fair_dispatch.per_chat
+@timed
 async def filter_auto_reply(client, message: Message):
     # Skip bot/self messages only (not admins)
     if not message.from_user or message.from_user.is_bot:
@@ -799,100 +951,87 @@ async def filter_auto_reply(client, message: Message):
     if not text or text.startswith("/"):
         return
 
+    # normalized once here; keywords were normalized when they were saved
+    query = normalize(text)
+    if not query:
+        return  # only emoji / punctuation, nothing to look up
+
     chat_id = message.chat.id
     user_id = message.from_user.id
 
-    # Fetch all filters for this group
-    all_filters = list(filters_col.find({"chat_id": chat_id}))
-    if not all_filters:
+    # Missed recently? Then no matching, and the admins already know about it
+    repeat = negative_cache.get(chat_id, query)
+    if repeat is None:
+        # read first: a filter written while we match may match this text
+        version = filter_cache.version(chat_id)
+        # Filters for this group (cached in memory or on its shard, loaded on first use)
+        has_filters, found = await match_chat(chat_id, query)
+        if found is None and user_id not in ADMINS:
+            negative_cache.add(chat_id, query, has_filters, version)
+    else:
+        has_filters, found = repeat, None
+
+    if not has_filters:
+        stats.record_match(chat_id, False)
+        MATCHES.inc(result="miss")
         if user_id not in ADMINS:
-            await message.reply_text(
-                "🎞️ Indha scenepack enkita ila...\n"
-                "Soon naan upload pandren Nanba/Nanbi ❤️\n"
-                "Unga request ah naan Sachin ku send panidren!",
-                quote=True
-            )
-            # Notify admins
-            for admin in ADMINS:
-                try:
-                    await client.send_message(
-                        admin,
-                        f"📩 *Request:* `{text}`\n👤 From: {message.from_user.first_name} (`{user_id}`)\n💬 In: `{chat_id}`"
-                    )
-                except Exception as e:
-                    print("Admin notify error:", e)
+            if negative_cache.reply_allowed(chat_id, user_id):
+                outbox.submit(chat_id, lambda: message.reply_text(
+                    "🎞️ Indha scenepack enkita ila...\n"
+                    "Soon naan upload pandren Nanba/Nanbi ❤️\n"
+                    "Unga request ah naan Sachin ku send panidren!",
+                    quote=True
+                ))
+            # Notify admins (batched)
+            if repeat is None:
+                request_digest.add(chat_id, text, user_id)
         return
 
-    # Find best fuzzy match
-    best_filter = None
-    best_score = 0
-    for f in all_filters:
-        keyword = f.get("keyword", "").lower()
-        score = fuzz.ratio(keyword, text.lower())
-        if score > best_score:
-            best_score = score
-            best_filter = f
-
-    # Minimum similarity threshold
-    if not best_filter or best_score < 80:
+    stats.record_match(chat_id, found is not None)
+    MATCHES.inc(result="hit" if found else "miss")
+
+    if not found:
         if user_id not in ADMINS:
             msg = """🎞️ Indha scenepack enkita ila...
 Soon naan upload pandren Nanba/Nanbi ❤️
 Unga request ah naan Sachin ku send panidren sariyaa byeee 👋 """
-            
-            await handle_delete_message(client, message, remove_msg=msg)
-
-            for admin in ADMINS:
-                try:
-                    await client.send_message(
-                        admin,
-                        f"📩 *Request:* `{text}`\n👤 From: {message.from_user.first_name} (`{user_id}`)\n💬 In: `{chat_id}`"
-                    )
-                except Exception as e:
-                    print("Admin notify error:", e)
-        return
+            if negative_cache.reply_allowed(chat_id, user_id):
+                await handle_delete_message(client, message, remove_msg=msg)
 
-    # --- FOUND MATCH: send filter ---
-    text_content = best_filter.get("text", "")
-    buttons = []
-
-    # Regex for buttons in format:
-    # [Text](buttonurl:<https://link>)  or  [Text](buttonurl: https://link)
-    button_pattern = re.compile(
-        r"\[([^\]]+)\]\(buttonurl:\s*(?:<)?(https?://[^\s>]+)(?:>)?\)",
-        re.IGNORECASE
-    )
-
-    matches = button_pattern.findall(text_content)
-
-    if matches:
-        for btn_text, btn_url in matches:
-            buttons.append([InlineKeyboardButton(btn_text.strip(), url=btn_url.strip())])
-        # Remove buttonurl markup from caption
-        text_content = button_pattern.sub("", text_content).strip()
-
-    # Add extra buttons from DB (if any)
-    for b in best_filter.get("buttons", []):
-        if isinstance(b, dict) and b.get("text") and b.get("url"):
-            buttons.append([InlineKeyboardButton(b["text"], url=b["url"])])
-
-    reply_markup = InlineKeyboardMarkup(buttons) if buttons else None
+            if repeat is None:
+                request_digest.add(chat_id, text, user_id)
+        return
 
-    try:
-        if best_filter.get("type") == "photo" and best_filter.get("file_id"):
-            await message.reply_photo(
-                photo=best_filter["file_id"],
-                caption=text_content,
-                reply_markup=reply_markup
-            )
-        else:
-            await message.reply_text(
-                text_content,
-                reply_markup=reply_markup
-            )
-    except Exception as e:
-        print("❌ Error sending filter:", e)
+    # --- FOUND MATCH: send the prebuilt payload ---
+    score, payload, reply_markup = found
+    MATCH_SCORE.observe(score)
+    outbox.submit(chat_id, lambda: send_payload(message, payload, reply_markup), HIGH)
 # ---------------- Start client ----------------
+background_tasks = []
+
+async def main():
+    # keepalive "/" and Prometheus "/metrics" on the bot's own loop (metrics.py)
+    http_server = await serve_metrics()
+    await ensure_schema(repo.db, MAIN_INDEXES, MAIN_HOT_QUERIES)
+    if shard_pool is not None:
+        await shard_pool.start()
+    await client.start()
+    background_tasks.append(create_task(outbox.run()))
+    await delete_scheduler.resume()
+    background_tasks.append(create_task(delete_scheduler.run(client.delete_messages)))
+    background_tasks.append(create_task(request_digest.run(send_digest, ADMINS)))
+    background_tasks.append(create_task(stats.run()))
+    await idle()
+    for task in background_tasks:
+        task.cancel()
+    # don't lose requests collected since the last digest (outbox is stopped)
+    await request_digest.flush(client.send_message, ADMINS)
+    await stats.flush()
+    if shard_pool is not None:
+        await shard_pool.close()
+    http_server.close()
+    await client.stop()
+
 if __name__ == "__main__":
     print("Starting Sachu scencespacks Bot...")
-    client.run()
\ No newline at end of file
+    client.run(main())
\ No newline at end of file
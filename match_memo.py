@@ -0,0 +1,57 @@
+# match_memo.py - bounded LRU of group auto reply match results
+# The same titles are typed over and over in the same groups; the memo maps
+# (chat_id, normalized text) to the match result so a repeat skips the
+# matcher (and the shard round trip). Each entry remembers the chat's
+# filter-set version (FilterCache.version) it was computed at; any filter
+# write bumps the version, so stale entries are dropped on lookup instead
+# of being tracked down per chat.
+# Env: MATCH_MEMO_SIZE (entries, 0 disables)
+
+import os
+from collections import OrderedDict
+
+MATCH_MEMO_SIZE = int(os.environ.get("MATCH_MEMO_SIZE", "20000"))
+
+
+class MatchMemo:
+    """get/put of match results per (chat_id, text), valid for one filter-set version."""
+
+    def __init__(self, size=MATCH_MEMO_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # (chat_id, text) -> (version, result)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, chat_id, text, version):
+        """Memoized result, or None if there is none for this version."""
+        key = (chat_id, text)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, chat_id, text, version, result):
+        """Remember result; version must be read before matching started."""
+        if self.size <= 0:
+            return
+        key = (chat_id, text)
+        self._entries[key] = (version, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"entries": len(self._entries), "size": self.size, "hits": self.hits,
+                "misses": self.misses, "hit_ratio": round(self.hit_ratio(), 3)}
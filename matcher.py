@@ -0,0 +1,330 @@
+# matcher.py - keyword matching for the group auto reply
+# match_tiered() tries cheap tiers first and stops early on a confident
+# hit: exact (hash lookup), prefix (sorted keywords via bisect, plus
+# message prefixes that are keywords), token (every keyword word appears
+# in the message, in any order), and only then fuzzy: one rapidfuzz call
+# over the keywords an n-gram index says can still reach the threshold. Messages and keywords arrive already
+# normalized (normalize.py), so scoring compares them as they are.
+
+import bisect
+import math
+from rapidfuzz import fuzz, process
+
+FUZZY_THRESHOLD = 80  # match threshold
+NGRAM_SIZE = 2  # see min_overlap: trigrams give no guarantee at 80
+INDEX_MIN_KEYWORDS = 2000  # smaller chats are cheaper to scan in full
+PREFIX_SCAN = 64  # keywords starting with the message looked at, at most
+TOKEN_SCAN = 500  # token tier skipped when the message's words are this common
+# prefix/token hits below this still go through fuzzy, which may find a closer
+# keyword (a typo of "beast 3" is nearer to it than to "beast")
+FAST_EXIT_SCORE = 90
+
+# tiers, in the order they are tried ("none": no tier found a match)
+EXACT, PREFIX, TOKEN, FUZZY, NONE = "exact", "prefix", "token", "fuzzy", "none"
+
+
+def best_match(text, keywords, score_cutoff=FUZZY_THRESHOLD):
+    """
+    Best keyword for text, as (index, score), or None below score_cutoff.
+    text and keywords must already be normalized. Ties go to the earliest keyword,
+    same as the old per-filter loop.
+    """
+    if not keywords:
+        return None
+    found = process.extractOne(
+        text,
+        keywords,
+        scorer=fuzz.ratio,
+        processor=None,
+        score_cutoff=score_cutoff,
+    )
+    if found is None:
+        return None
+    _, score, index = found
+    return index, score
+
+
+def min_overlap(la, lb, score_cutoff, n=NGRAM_SIZE):
+    """
+    Fewest n-grams (multiset) two strings of length la and lb must share
+    for fuzz.ratio to reach score_cutoff, or None if their lengths alone
+    rule it out. Derived from the indel distance allowed by the cutoff:
+    every deletion breaks at most n grams, every insertion at most n - 1.
+    At a cutoff of 80 the trigram bound is never positive, bigrams are.
+    """
+    total = la + lb
+    if not total:
+        return 0
+    max_dist = math.floor(total * (100 - score_cutoff) / 100 + 1e-9)
+    lcs = math.ceil((total - max_dist) / 2)
+    if lcs > min(la, lb):
+        return None
+    a = (la - n + 1) - n * (la - lcs) - (n - 1) * (lb - lcs)
+    b = (lb - n + 1) - n * (lb - lcs) - (n - 1) * (la - lcs)
+    return max(a, b)
+
+
+class NgramIndex:
+    """
+    Inverted index of character n-grams over one chat's keywords.
+    Postings are sets keyed by (gram, keyword length) so candidates() applies
+    the length window for free and merges postings with C-level set unions.
+    candidates() returns every keyword id that can still score
+    >= score_cutoff (no false negatives).
+    """
+
+    def __init__(self, n=NGRAM_SIZE):
+        self.n = n
+        self.keys = {}       # id -> normalized keyword
+        self.postings = {}   # (gram, length) -> set of ids
+        self.by_len = {}     # keyword length -> set of ids
+        self._all = None     # (ids, keywords) in id order, for full scans
+
+    def __len__(self):
+        return len(self.keys)
+
+    def grams(self, s):
+        return [s[i:i + self.n] for i in range(len(s) - self.n + 1)]
+
+    def all(self):
+        """(ids, keywords) of every keyword, in id order."""
+        if self._all is None:
+            ids = sorted(self.keys)
+            self._all = (ids, [self.keys[k] for k in ids])
+        return self._all
+
+    def add(self, kid, keyword):
+        if kid in self.keys:
+            self.remove(kid)
+        self._all = None
+        self.keys[kid] = keyword
+        lb = len(keyword)
+        self.by_len.setdefault(lb, set()).add(kid)
+        for g in set(self.grams(keyword)):
+            self.postings.setdefault((g, lb), set()).add(kid)
+
+    def remove(self, kid):
+        keyword = self.keys.pop(kid, None)
+        if keyword is None:
+            return
+        self._all = None
+        lb = len(keyword)
+        bucket = self.by_len[lb]
+        bucket.discard(kid)
+        if not bucket:
+            del self.by_len[lb]
+        for g in set(self.grams(keyword)):
+            post = self.postings[(g, lb)]
+            post.discard(kid)
+            if not post:
+                del self.postings[(g, lb)]
+
+    def candidates(self, query, score_cutoff=FUZZY_THRESHOLD):
+        """
+        Sorted ids of keywords worth scoring against query (normalized),
+        or None when the filter would keep most of them anyway and a plain
+        full scan is cheaper.
+        """
+        if len(self.keys) < INDEX_MIN_KEYWORDS:
+            return None
+        la = len(query)
+        qgrams = self.grams(query)
+        buckets = []
+        posts_lists = []
+        estimate = 0
+        for lb, ids in self.by_len.items():
+            need = min_overlap(la, lb, score_cutoff, self.n)
+            if need is None:
+                continue
+            if need > 0:
+                # Prefix filter: a keyword sharing >= need grams with the query
+                # shares at least one of its (len - need + 1) rarest grams here.
+                posts = [self.postings.get((g, lb), ()) for g in qgrams]
+                posts.sort(key=len)
+                posts = posts[:len(posts) - need + 1]
+                size = sum(map(len, posts))
+                # merging postings that cover most of the bucket costs more
+                # than letting rapidfuzz score the whole bucket in C
+                if size * 2 < len(ids):
+                    posts_lists.extend(posts)
+                    estimate += size
+                    continue
+            buckets.append(ids)
+            estimate += len(ids)
+        # collecting and sorting ids costs about as much per id as scoring
+        # it, so the filter only pays off when it drops most keywords
+        if estimate * 4 >= len(self.keys):
+            return None
+        found = set()
+        found.update(*buckets, *posts_lists)
+        return sorted(found)
+
+
+def match_indexed(text, index, score_cutoff=FUZZY_THRESHOLD):
+    """
+    Best keyword id for text (normalized) using the n-gram index, as
+    (id, score), or None. Same winner as best_match over the full keyword list.
+    """
+    ids = index.candidates(text, score_cutoff)
+    if ids is None:
+        ids, keywords = index.all()
+    elif ids:
+        keywords = [index.keys[k] for k in ids]
+    else:
+        return None
+    found = best_match(text, keywords, score_cutoff)
+    if found is None:
+        return None
+    pos, score = found
+    return ids[pos], score
+
+
+def _length_ratio(la, lb):
+    """fuzz.ratio of two strings when the shorter is contained in the longer in order."""
+    return 200 * min(la, lb) / (la + lb)
+
+
+class TieredIndex(NgramIndex):
+    """
+    NgramIndex plus the structures of the fast tiers: keyword -> ids for
+    exact lookups, the keywords in sorted order for prefix lookups and
+    word -> ids for token containment. All are kept in step by add/remove.
+    """
+
+    def __init__(self, n=NGRAM_SIZE):
+        super().__init__(n)
+        self.exact = {}    # keyword -> set of ids
+        self.tokens = {}   # word -> set of ids
+        self.ntokens = {}  # id -> distinct words in its keyword
+        self._sorted = None  # sorted [(keyword, id)], built on first prefix lookup
+
+    def add(self, kid, keyword):
+        super().add(kid, keyword)
+        self.exact.setdefault(keyword, set()).add(kid)
+        words = keyword.split()
+        self.ntokens[kid] = len(words)
+        if len(set(words)) == len(words):  # repeated words are left to fuzzy
+            for w in words:
+                self.tokens.setdefault(w, set()).add(kid)
+        if self._sorted is not None:
+            bisect.insort(self._sorted, (keyword, kid))
+
+    def remove(self, kid):
+        keyword = self.keys.get(kid)
+        super().remove(kid)
+        if keyword is None:
+            return
+        _discard(self.exact, keyword, kid)
+        for w in keyword.split():
+            _discard(self.tokens, w, kid)
+        del self.ntokens[kid]
+        if self._sorted is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, (keyword, kid))]
+
+    def sorted_keys(self):
+        if self._sorted is None:
+            self._sorted = sorted((k, i) for i, k in self.keys.items())
+        return self._sorted
+
+    def match_exact(self, text):
+        ids = self.exact.get(text)
+        return (min(ids), 100.0) if ids else None
+
+    def match_prefix(self, text, score_cutoff=FUZZY_THRESHOLD):
+        """
+        Best keyword that starts with text or that text starts with, as
+        (id, score) if it reaches score_cutoff. For these pairs fuzz.ratio
+        only depends on the two lengths, so no scoring call is needed.
+        """
+        la = len(text)
+        best = None
+        # keywords extending the message, up to the longest that can still pass
+        max_len = la * (200 - score_cutoff) / score_cutoff
+        keys = self.sorted_keys()
+        i = bisect.bisect_left(keys, (text,))
+        for keyword, kid in keys[i:i + PREFIX_SCAN]:
+            if not keyword.startswith(text):
+                break
+            if len(keyword) <= max_len:
+                best = _better(best, kid, _length_ratio(la, len(keyword)))
+        # message prefixes that are keywords; the longest one scores highest
+        min_len = max(1, math.ceil(la * score_cutoff / (200 - score_cutoff)))
+        for length in range(la - 1, min_len - 1, -1):
+            ids = self.exact.get(text[:length])
+            if ids:
+                best = _better(best, min(ids), _length_ratio(la, length))
+                break
+        if best is None or best[1] < score_cutoff:
+            return None
+        return best
+
+    def match_tokens(self, text, score_cutoff=FUZZY_THRESHOLD):
+        """
+        Best keyword whose words all appear in text (any order), scored on
+        the two lengths like a prefix, as (id, score) if it reaches
+        score_cutoff. Catches reordered titles the fuzzy ratio misses.
+        """
+        words = set(text.split())
+        if len(words) < 2:
+            return None  # a one-word keyword inside a one-word message is exact
+        la = len(text)
+        # a keyword may leave out at most this many of the message's characters,
+        # so it must contain one of the rarest words that add up to more
+        budget = la - la * score_cutoff / (200 - score_cutoff)
+        candidates = set()
+        missing = 0
+        for w in sorted(words, key=lambda w: len(self.tokens.get(w, ()))):
+            candidates.update(self.tokens.get(w, ()))
+            missing += len(w)
+            if missing > budget:
+                break
+        if len(candidates) > TOKEN_SCAN:
+            return None
+        best = None
+        for kid in candidates:
+            keyword = self.keys[kid]
+            if self.ntokens[kid] <= len(words) and words.issuperset(keyword.split()):
+                best = _better(best, kid, _length_ratio(la, len(keyword)))
+        if best is None or best[1] < score_cutoff:
+            return None
+        return best
+
+
+def _discard(postings, key, kid):
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(kid)
+        if not ids:
+            del postings[key]
+
+
+def _better(best, kid, score):
+    """Higher score wins, then the earlier keyword (same tie rule as best_match)."""
+    if best is None or score > best[1] or (score == best[1] and kid < best[0]):
+        return kid, score
+    return best
+
+
+def match_tiered(text, index, score_cutoff=FUZZY_THRESHOLD):
+    """
+    (tier, id, score) of the keyword matching text (normalized) in a
+    TieredIndex, trying the cheap tiers first; (NONE, None, None) if no
+    tier finds one. Never worse than fuzzy alone: a prefix/token hit
+    under FAST_EXIT_SCORE only wins if fuzzy finds nothing closer.
+    """
+    found = index.match_exact(text)
+    if found is not None:
+        return EXACT, found[0], found[1]
+    fast = None
+    for tier, match in ((PREFIX, index.match_prefix), (TOKEN, index.match_tokens)):
+        found = match(text, score_cutoff)
+        if found is None:
+            continue
+        if found[1] >= FAST_EXIT_SCORE:
+            return tier, found[0], found[1]
+        if fast is None or found[1] > fast[2]:
+            fast = (tier, found[0], found[1])
+    found = match_indexed(text, index, score_cutoff)
+    if found is not None and (fast is None or found[1] >= fast[2]):
+        return FUZZY, found[0], found[1]
+    return fast or (NONE, None, None)
@@ -0,0 +1,187 @@
+# metrics.py - Prometheus-format metrics and the bot's HTTP endpoint
+# Counter / Gauge / Histogram are minimal in-process implementations of the
+# Prometheus text format (no client library needed). serve() runs an asyncio
+# HTTP server on the bot's event loop: "/" is the keepalive, "/metrics" the
+# scrape target.
+# Env: METRICS_HOST, PORT (default 0.0.0.0:8080, same as the old keepalive)
+
+import asyncio
+import bisect
+import functools
+import math
+import os
+import time
+from contextvars import ContextVar
+
+METRICS_HOST = os.environ.get("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.environ.get("PORT", "8080"))
+
+# seconds; handlers and Mongo ops are mostly in the 1 ms - 1 s range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn  # value (or {label values: value}) read at scrape time instead of stored
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def samples(self):
+        values = self._values
+        if self.fn is not None:
+            values = self.fn()
+            if not isinstance(values, dict):
+                yield self.name, "", values
+                return
+        for key, value in sorted(values.items()):
+            yield self.name, _labels(self.labelnames, key), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += 1
+        entry[2] += value
+
+    def samples(self):
+        for key, (counts, count, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                names = self.labelnames + ("le",)
+                yield f"{self.name}_bucket", _labels(names, key + (_number(bound),)), cumulative
+            yield f"{self.name}_count", _labels(self.labelnames, key), count
+            yield f"{self.name}_sum", _labels(self.labelnames, key), total
+
+
+def render():
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# ---------------- bot metrics ----------------
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Time spent in each update handler.", ["handler"])
+UPDATES = Counter("bot_updates_total", "Updates handled, by handler and outcome.", ["handler", "outcome"])
+MATCH_SCORE = Histogram("bot_match_score", "Score of matched filters (any matcher tier).", buckets=(80, 85, 90, 95, 99, 100))
+MATCHES = Counter("bot_matches_total", "Group texts checked against filters.", ["result"])
+MATCH_TIERS = Counter("bot_match_tier_total", "Group texts by the matcher tier that resolved them.", ["tier"])
+MONGO_SECONDS = Histogram("mongo_op_seconds", "MongoDB operation latency.", ["collection", "op"])
+MONGO_ERRORS = Counter("mongo_op_errors_total", "MongoDB operations that raised.", ["collection", "op"])
+
+
+# name of the @timed handler running in the current task (for attribution, e.g. mongo_monitor)
+current_handler = ContextVar("current_handler", default=None)
+
+
+def timed(fn):
+    """Decorator for async handlers: latency histogram plus an ok/error count."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        token = current_handler.set(name)
+        outcome = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            current_handler.reset(token)
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+            UPDATES.inc(handler=name, outcome=outcome)
+
+    return wrapper
+
+
+# ---------------- HTTP endpoint ----------------
+
+KEEPALIVE_TEXT = "✅ Sachuscencespacks Bot is running!"
+
+
+async def _handle(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 10)
+        # drain headers; nothing in them matters here
+        while (await asyncio.wait_for(reader.readline(), 10)).strip():
+            pass
+        parts = request.decode("latin-1").split()
+        path = parts[1].split("?", 1)[0] if len(parts) > 1 else "/"
+        if path == "/metrics":
+            status, ctype, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", render()
+        elif path == "/":
+            status, ctype, body = "200 OK", "text/plain; charset=utf-8", KEEPALIVE_TEXT
+        else:
+            status, ctype, body = "404 Not Found", "text/plain; charset=utf-8", "not found"
+        data = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=METRICS_HOST, port=METRICS_PORT):
+    """Start the keepalive/metrics server on the running loop; returns the server."""
+    return await asyncio.start_server(_handle, host, port)
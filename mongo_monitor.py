@@ -0,0 +1,267 @@
+# mongo_monitor.py - pymongo command listener: latency per collection/op and a slow-op log
+# Attach with event_listeners=[monitor] on a MongoClient / AsyncMongoClient.
+# Every command is timed per (collection, op). Operations slower than
+# MONGO_SLOW_MS are also grouped by query shape (the command with its values
+# replaced by "?"; only slow ones pay for building it) and handed to a
+# background thread that runs explain() on them and writes one JSON line
+# (shape, handler, latency, winning plan) to the rotating slow-query log
+# next to errors.log (logger.py).
+
+import json
+import os
+import queue
+import sys
+import threading
+
+from pymongo import monitoring
+
+from logger import slow_logger
+from metrics import current_handler
+
+MONGO_SLOW_MS = float(os.environ.get("MONGO_SLOW_MS", "200"))
+MONGO_MAX_SHAPES = 1000  # distinct slow query shapes tracked
+
+# commands whose first field names the collection
+_COLLECTION_COMMANDS = {"find", "insert", "update", "delete", "aggregate", "count", "distinct", "findAndModify"}
+_EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# session/driver bookkeeping that is not part of the operation itself
+_DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "autocommit",
+                  "startTransaction", "readConcern", "writeConcern", "maxTimeMS", "apiVersion"}
+_SHAPE_FIELDS = {
+    "find": ("filter", "sort", "projection"),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort", "update"),
+    "aggregate": ("pipeline",),
+}
+_APP_FILES = ("main.py", "testbot.py")
+
+
+def _shape(value):
+    """Value with literals replaced by '?', keeping field names and operators."""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [_shape(v) for v in value]
+        return "?"
+    if isinstance(value, str) and value.startswith("$"):
+        return value  # field path in a pipeline stage, part of the shape
+    return "?"
+
+
+def command_shape(name, command):
+    if name in ("update", "delete"):
+        ops = command.get("updates" if name == "update" else "deletes") or [{}]
+        return {name: {"q": _shape(ops[0].get("q", {}))}}
+    if name == "insert":
+        return {name: {}}
+    if name == "getMore":
+        return {name: {}}
+    fields = _SHAPE_FIELDS.get(name, ())
+    shape = {}
+    for field in fields:
+        if field in command:
+            if field == "pipeline":
+                shape[field] = [{k: _shape(v) for k, v in stage.items()} for stage in command[field]]
+            elif field == "key":
+                shape[field] = command[field]
+            else:
+                shape[field] = _shape(command[field])
+    return {name: shape}
+
+
+def _collection(name, command):
+    if name in _COLLECTION_COMMANDS:
+        value = command.get(name)
+        return value if isinstance(value, str) else ""
+    if name == "getMore":
+        return command.get("collection", "")
+    return ""
+
+
+def _caller():
+    """Function name of the nearest main.py/testbot.py frame (for sync callers)."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename.endswith(_APP_FILES):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def _plan_summary(plan):
+    """'FETCH < IXSCAN chat_keyword' style summary of a winning plan."""
+    stages = []
+    node = plan
+    while isinstance(node, dict):
+        stage = node.get("stage")
+        if stage:
+            stages.append(f"{stage} {node['indexName']}" if node.get("indexName") else stage)
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0] or node.get("queryPlan")
+    return " < ".join(stages)
+
+
+class _Stats:
+    __slots__ = ("count", "total_ms", "max_ms", "slow", "handler", "plan")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow = 0
+        self.handler = None
+        self.plan = None
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Command listener shared by all clients of the process. explain_with()
+    gives it a (sync) MongoClient for explain capture; without one, slow
+    operations are still logged, just without a plan.
+    """
+
+    def __init__(self, slow_ms=MONGO_SLOW_MS):
+        self.slow_ms = slow_ms
+        self.by_op = {}      # (collection, op) -> _Stats of every call
+        self.shapes = {}     # (collection, op, shape json) -> _Stats of its slow calls
+        self._started = {}   # (connection_id, request_id) -> (db, op, collection, command, handler)
+        self._explain_client = None
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def explain_with(self, client):
+        self._explain_client = client
+
+    # ---- listener callbacks (run on the driver's hot path: keep cheap) ----
+
+    def started(self, event):
+        name = event.command_name
+        collection = _collection(name, event.command)
+        if not collection:
+            return
+        self._started[(event.connection_id, event.request_id)] = (
+            event.database_name, name, collection, event.command, current_handler.get(),
+        )
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        info = self._started.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return
+        db, name, collection, command, handler = info
+        ms = event.duration_micros / 1000
+        slow = ms >= self.slow_ms
+        with self._lock:
+            op = self.by_op.get((collection, name))
+            if op is None:
+                op = self.by_op[(collection, name)] = _Stats()
+            op.count += 1
+            op.total_ms += ms
+            op.max_ms = max(op.max_ms, ms)
+            op.slow += slow
+        if not slow:
+            return
+        shape = json.dumps(command_shape(name, command), sort_keys=True)
+        key = (collection, name, shape)
+        handler = handler or _caller()
+        with self._lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                stats = _Stats()
+                # the cap only bounds the stats table; a shape past it is
+                # still logged and explained below, just not kept
+                if len(self.shapes) < MONGO_MAX_SHAPES:
+                    self.shapes[key] = stats
+            stats.count += 1
+            stats.total_ms += ms
+            stats.max_ms = max(stats.max_ms, ms)
+            stats.slow += 1
+            stats.handler = handler
+        record = {
+            "ms": round(ms, 1), "db": db, "collection": collection, "op": name,
+            "shape": shape, "handler": handler,
+            "error": getattr(event, "failure", None) and str(event.failure),
+        }
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((record, db, name, command, stats))
+        except queue.Full:
+            slow_logger.info(json.dumps(dict(record, plan="skipped: explain queue full"), default=str))
+
+    # ---- explain drain ----
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain, name="mongo-explain", daemon=True)
+            self._thread.start()
+
+    def _drain(self):
+        while True:
+            record, db, name, command, stats = self._queue.get()
+            # one explain per shape is enough; later slow runs reuse its plan
+            if stats.plan is None:
+                stats.plan = self._explain(db, name, command)
+            record["plan"] = stats.plan
+            slow_logger.info(json.dumps(record, default=str))
+
+    def _explain(self, db, name, command):
+        if self._explain_client is None or name not in _EXPLAINABLE:
+            return None
+        cmd = {k: v for k, v in command.items() if k not in _DRIVER_FIELDS}
+        try:
+            result = self._explain_client[db].command({"explain": cmd, "verbosity": "queryPlanner"})
+        except Exception as e:
+            return f"explain failed: {e}"
+        planner = result.get("queryPlanner") or {}
+        if not planner and result.get("stages"):
+            # aggregate: the plan lives in the first ($cursor) stage
+            planner = result["stages"][0].get("$cursor", {}).get("queryPlanner", {})
+        return _plan_summary(planner.get("winningPlan", {})) or None
+
+    # ---- reporting ----
+
+    def top(self, n=10):
+        """The n slowest query shapes by max latency: [(collection, op, shape, stats)]."""
+        with self._lock:
+            items = [(c, op, shape, s) for (c, op, shape), s in self.shapes.items()]
+        items.sort(key=lambda item: item[3].max_ms, reverse=True)
+        return items[:n]
+
+    def ops(self, n=10):
+        """The n (collection, op) pairs with the most total time: [(collection, op, stats)]."""
+        with self._lock:
+            items = [(c, op, s) for (c, op), s in self.by_op.items()]
+        items.sort(key=lambda item: item[2].total_ms, reverse=True)
+        return items[:n]
+
+    def render_top(self, n=10):
+        lines = [f"🐢 Mongo operations by total time (slow ≥ {self.slow_ms:g} ms)\n"]
+        for collection, op, s in self.ops(n):
+            lines.append(
+                f"• {collection}.{op} {s.count} calls, avg {s.total_ms / s.count:.1f} ms, "
+                f"max {s.max_ms:.1f} ms, {s.slow} slow"
+            )
+        if len(lines) == 1:
+            lines.append("No operations recorded yet.")
+            return "\n".join(lines)
+        lines.append("\nSlowest query shapes\n")
+        for i, (collection, op, shape, s) in enumerate(self.top(n), start=1):
+            lines.append(
+                f"{i}. {collection}.{op} max {s.max_ms:.1f} ms, avg {s.total_ms / s.count:.1f} ms "
+                f"over {s.slow} slow runs"
+            )
+            lines.append(f"   {shape[:300]}")
+            if s.handler or s.plan:
+                lines.append(f"   handler: {s.handler or '?'} · plan: {s.plan or '?'}")
+        if not self.shapes:
+            lines.append("None slower than the threshold yet.")
+        return "\n".join(lines)
+
+monitor = CommandMonitor()
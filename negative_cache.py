@@ -0,0 +1,150 @@
+# negative_cache.py - recently unmatched group texts, per chat
+# A missing title tends to be asked again and again. For NEGATIVE_TTL
+# seconds after a miss, the same normalized text in the same chat skips
+# matching and is not reported to the admins again (the first miss already
+# went into the request digest). Adding a filter that would match one of
+# them drops it at once: FilterCache calls filter_added() on every upsert.
+# A miss is only stored if the chat's filter-set version did not move
+# while it was being matched (a filter added meanwhile may match it).
+# NEGATIVE_MAX bounds all chats together: expired entries are swept every
+# NEGATIVE_TTL seconds, and past the bound the chats that missed least
+# recently lose their oldest entries first.
+# Optionally MISS_REPLY_COOLDOWN limits the "not found" reply to one per
+# user per chat in that many seconds.
+# Env: NEGATIVE_TTL, NEGATIVE_PER_CHAT, NEGATIVE_MAX, MISS_REPLY_COOLDOWN (default 0 = off)
+
+import os
+import time
+from collections import OrderedDict
+
+from matcher import FUZZY_THRESHOLD, TieredIndex, match_tiered
+from normalize import keyword_norm
+
+NEGATIVE_TTL = float(os.environ.get("NEGATIVE_TTL", "600"))  # seconds a miss is remembered
+NEGATIVE_PER_CHAT = int(os.environ.get("NEGATIVE_PER_CHAT", "500"))  # remembered misses per chat
+NEGATIVE_MAX = int(os.environ.get("NEGATIVE_MAX", "50000"))  # remembered misses, all chats
+MISS_REPLY_COOLDOWN = float(os.environ.get("MISS_REPLY_COOLDOWN", "0"))  # seconds per user, 0 = always reply
+
+
+class NegativeCache:
+    """
+    get/add of recent misses per (chat_id, normalized text), plus the
+    per-user reply cooldown. version(chat_id) is the chat's filter-set
+    version (FilterCache.version). Expired entries are dropped as they are
+    met and by a sweep every ttl seconds.
+    """
+
+    def __init__(self, version=None, ttl=NEGATIVE_TTL, per_chat=NEGATIVE_PER_CHAT, max_size=NEGATIVE_MAX,
+                 cooldown=MISS_REPLY_COOLDOWN):
+        self.version = version
+        self.ttl = ttl
+        self.per_chat = per_chat
+        self.max_size = max_size
+        self.cooldown = cooldown
+        # chat_id -> OrderedDict(text -> (expires, has_filters)), oldest first;
+        # chats in the order they last missed
+        self._chats = OrderedDict()
+        self._size = 0
+        self._next_sweep = time.monotonic() + ttl
+        self._replied = {}  # (chat_id, user_id) -> time of the last "not found" reply
+        self.hits = 0
+        self.cleared = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self._size
+
+    def get(self, chat_id, text):
+        """has_filters of a miss of text in the last ttl seconds, or None."""
+        misses = self._chats.get(chat_id)
+        entry = misses.get(text) if misses else None
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del misses[text]
+            self._size -= 1
+            if not misses:
+                del self._chats[chat_id]
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def add(self, chat_id, text, has_filters, version=None):
+        """Remember a miss; version must be read before matching started."""
+        if self.ttl <= 0:
+            return
+        if version is not None and self.version is not None and version != self.version(chat_id):
+            return  # a filter was written while matching; it may match text
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        misses = self._chats.get(chat_id)
+        if misses is None:
+            misses = self._chats[chat_id] = OrderedDict()
+        else:
+            self._chats.move_to_end(chat_id)
+        if misses.pop(text, None) is None:
+            self._size += 1
+        misses[text] = (now + self.ttl, has_filters)
+        while len(misses) > self.per_chat:
+            misses.popitem(last=False)
+            self._size -= 1
+        while self._size > self.max_size:
+            # the chat that missed least recently gives up its oldest miss
+            oldest_id, oldest = next(iter(self._chats.items()))
+            oldest.popitem(last=False)
+            self._size -= 1
+            self.evicted += 1
+            if not oldest:
+                del self._chats[oldest_id]
+
+    def _sweep(self, now):
+        """Drop every expired miss, including those of chats that went quiet."""
+        for chat_id, misses in list(self._chats.items()):
+            for text in [t for t, (expires, _) in misses.items() if expires <= now]:
+                del misses[text]
+                self._size -= 1
+            if not misses:
+                del self._chats[chat_id]
+        self._next_sweep = now + self.ttl
+
+    def filter_added(self, chat_id, doc):
+        """Drop the misses the new filter's keyword would now match."""
+        misses = self._chats.get(chat_id)
+        if not misses:
+            return
+        index = TieredIndex()
+        index.add(0, keyword_norm(doc))
+        for text, (_, has_filters) in list(misses.items()):
+            # "no filters at all" is no longer true for any of them
+            if not has_filters or match_tiered(text, index, FUZZY_THRESHOLD)[1] is not None:
+                del misses[text]
+                self._size -= 1
+                self.cleared += 1
+        if not misses:
+            del self._chats[chat_id]
+
+    def clear(self, chat_id):
+        """Forget a chat's misses (bulk filter changes)."""
+        dropped = len(self._chats.pop(chat_id, ()))
+        self._size -= dropped
+        self.cleared += dropped
+
+    def reply_allowed(self, chat_id, user_id):
+        """False if user_id got a "not found" reply in this chat within the cooldown."""
+        if self.cooldown <= 0:
+            return True
+        now = time.monotonic()
+        key = (chat_id, user_id)
+        last = self._replied.get(key)
+        if last is not None and now - last < self.cooldown:
+            return False
+        if len(self._replied) > 10000:
+            # forget users whose cooldown is over
+            self._replied = {k: t for k, t in self._replied.items() if now - t < self.cooldown}
+        self._replied[key] = now
+        return True
+
+    def stats(self):
+        return {"entries": self._size, "chats": len(self._chats), "hits": self.hits,
+                "cleared": self.cleared, "evicted": self.evicted}
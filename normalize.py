@@ -0,0 +1,124 @@
+# normalize.py - text normalization shared by filter keywords and group messages
+# normalize() folds what users type into the form the matcher compares:
+# NFKC (stylized 𝗕𝗼𝗹𝗱 / fullwidth letters become plain ones), casefold,
+# emoji, punctuation and symbols dropped, whitespace collapsed, and with
+# NORMALIZE_TRANSLIT=1 Tamil script and common spelling variants folded to
+# one Latin form (விக்ரம் / vikram, maaster / master). Keywords are
+# normalized once when a filter is written (stored as doc["norm"], see
+# keyword_norm) and each incoming message once, so equal texts compare
+# equal as plain strings and fuzzy scoring never re-normalizes.
+# Env: NORMALIZE_TRANSLIT (default 0)
+
+import os
+import re
+import unicodedata
+
+NORMALIZE_TRANSLIT = os.environ.get("NORMALIZE_TRANSLIT", "0") == "1"
+
+# stored with each norm; a norm written under other settings is recomputed
+NORM_VERSION = "2t" if NORMALIZE_TRANSLIT else "1"
+
+# kept: letters, numbers and combining marks (Tamil vowel signs are marks)
+_KEEP = ("L", "N", "Mn", "Mc")
+# marks that only style the character before them: variation selectors
+# (❤️ is ❤ + U+FE0F), emoji tag characters
+_STYLE_MARKS = {*range(0xFE00, 0xFE10), *range(0xE0100, 0xE01F0), *range(0xE0020, 0xE0080)}
+
+_char_cache = {}
+
+
+def _fold_char(ch):
+    """ch as kept (casefolded), or a space if it separates words."""
+    folded = _char_cache.get(ch)
+    if folded is None:
+        if ord(ch) in _STYLE_MARKS or not unicodedata.category(ch).startswith(_KEEP):
+            folded = " "
+        else:
+            folded = ch.casefold()
+        if len(_char_cache) < 65536:
+            _char_cache[ch] = folded
+    return folded
+
+
+# ---------------- transliteration ----------------
+
+_TAMIL_VOWELS = {
+    "அ": "a", "ஆ": "aa", "இ": "i", "ஈ": "ii", "உ": "u", "ஊ": "uu", "எ": "e",
+    "ஏ": "ee", "ஐ": "ai", "ஒ": "o", "ஓ": "oo", "ஔ": "au", "ஃ": "k",
+}
+_TAMIL_CONSONANTS = {
+    "க": "k", "ங": "ng", "ச": "ch", "ஞ": "nj", "ட": "t", "ண": "n", "த": "th",
+    "ந": "n", "ப": "p", "ம": "m", "ய": "y", "ர": "r", "ல": "l", "வ": "v",
+    "ழ": "zh", "ள": "l", "ற": "r", "ன": "n", "ஜ": "j", "ஷ": "sh", "ஸ": "s", "ஹ": "h",
+}
+_TAMIL_SIGNS = {
+    "ா": "aa", "ி": "i", "ீ": "ii", "ு": "u", "ூ": "uu", "ெ": "e", "ே": "ee",
+    "ை": "ai", "ொ": "o", "ோ": "oo", "ௌ": "au", "ௗ": "au", "்": "",
+}
+
+# spelling variants of the same Tamil sounds in Latin script, folded after
+# the Tamil letters are romanized; order matters (digraphs before doubles),
+# and the folds repeat until nothing changes ("nighht" -> "night" -> "nigt")
+_LATIN_FOLDS = [
+    (re.compile(r"zh"), "l"),
+    (re.compile(r"([tdbkpgc])h"), r"\1"),
+    (re.compile(r"ee|ii"), "i"),
+    (re.compile(r"oo|uu"), "u"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+]
+
+
+def _romanize_tamil(text):
+    out = []
+    for i, ch in enumerate(text):
+        if ch in _TAMIL_CONSONANTS:
+            out.append(_TAMIL_CONSONANTS[ch])
+            # inherent "a" unless a vowel sign or pulli follows
+            if i + 1 == len(text) or text[i + 1] not in _TAMIL_SIGNS:
+                out.append("a")
+        elif ch in _TAMIL_SIGNS:
+            out.append(_TAMIL_SIGNS[ch])
+        else:
+            out.append(_TAMIL_VOWELS.get(ch, ch))
+    return "".join(out)
+
+
+def transliterate(text):
+    """Tamil script romanized and Latin spelling variants folded (text already normalized)."""
+    text = _romanize_tamil(text)
+    while True:
+        # every fold shortens the text or removes a "w", so this ends
+        folded = text
+        for pattern, repl in _LATIN_FOLDS:
+            folded = pattern.sub(repl, folded)
+        if folded == text:
+            return text
+        text = folded
+
+
+# ---------------- pipeline ----------------
+
+def normalize(text, translit=NORMALIZE_TRANSLIT):
+    """Comparable form of a keyword or message; "" if nothing but emoji/punctuation."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    text = " ".join("".join(map(_fold_char, text)).split())
+    if translit and text:
+        text = transliterate(text)
+    return text
+
+
+def keyword_norm(doc):
+    """Stored norm of a filter's keyword, or one computed on the fly for older filters."""
+    if doc.get("norm_v") == NORM_VERSION and "norm" in doc:
+        return doc["norm"]
+    return normalize(doc.get("keyword", ""))
+
+
+def set_norm(doc):
+    """Store the keyword's norm on a filter document before it is written."""
+    doc["norm"] = normalize(doc.get("keyword", ""))
+    doc["norm_v"] = NORM_VERSION
+    return doc
@@ -0,0 +1,219 @@
+# outbox.py - central outbound send queue with Telegram rate limits
+# Handlers submit() a send and return; one dispatcher task releases sends
+# under a global token bucket and per-chat buckets (1 msg/s per chat,
+# 20 msg/min per group), in priority order, and backs off on FloodWait.
+# A chat's queue is capped (the lowest-priority, newest send gives way) and
+# NORMAL/LOW sends that waited too long are dropped rather than sent late.
+# Env: OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_GROUP_PER_MIN, OUTBOX_MAX_RETRIES,
+#      OUTBOX_CHAT_QUEUE, OUTBOX_STALE_AFTER
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from aioutil import wait_event
+
+OUTBOX_GLOBAL_RATE = float(os.environ.get("OUTBOX_GLOBAL_RATE", "25"))  # msgs/sec, all chats
+OUTBOX_CHAT_RATE = float(os.environ.get("OUTBOX_CHAT_RATE", "1"))  # msgs/sec per chat
+OUTBOX_GROUP_PER_MIN = float(os.environ.get("OUTBOX_GROUP_PER_MIN", "20"))  # msgs/min per group
+OUTBOX_MAX_RETRIES = int(os.environ.get("OUTBOX_MAX_RETRIES", "3"))
+OUTBOX_CHAT_QUEUE = int(os.environ.get("OUTBOX_CHAT_QUEUE", "50"))  # queued sends per chat
+OUTBOX_STALE_AFTER = float(os.environ.get("OUTBOX_STALE_AFTER", "120"))  # seconds before a NORMAL/LOW send is dropped
+
+# Priorities (lower goes first)
+HIGH = 0    # filter replies
+NORMAL = 1  # notices, listings
+LOW = 2     # admin digests
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def delay(self, now):
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Chat:
+    __slots__ = ("jobs", "second", "minute", "busy", "scheduled", "paused_until")
+
+    def __init__(self, chat_id):
+        self.jobs = []  # heap of (priority, seq, send, future, retries, queued_at)
+        self.second = TokenBucket(OUTBOX_CHAT_RATE, max(1, OUTBOX_CHAT_RATE))
+        # negative ids are groups/channels: Telegram also caps them per minute
+        self.minute = TokenBucket(OUTBOX_GROUP_PER_MIN / 60, OUTBOX_GROUP_PER_MIN) if chat_id < 0 else None
+        self.busy = False
+        self.scheduled = False
+        self.paused_until = 0
+
+
+class Outbox:
+    """
+    submit(chat_id, send, priority) queues send (a zero-arg callable returning
+    an awaitable) and returns a future with its result. Per chat, sends go out
+    one at a time in priority/FIFO order. flood_wait is the exception class
+    that carries a retry delay in .value (pyrogram.errors.FloodWait).
+    Dropped sends have their future cancelled.
+    """
+
+    def __init__(self, flood_wait=None, global_rate=OUTBOX_GLOBAL_RATE, max_retries=OUTBOX_MAX_RETRIES,
+                 chat_queue=OUTBOX_CHAT_QUEUE, stale_after=OUTBOX_STALE_AFTER):
+        self.flood_wait = flood_wait
+        self.max_retries = max_retries
+        self.chat_queue = max(1, chat_queue)
+        self.stale_after = stale_after
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._global_paused_until = 0
+        self._chats = {}
+        self._ready = []     # heap of (ready_at, seq, chat_id): waiting on a chat bucket
+        self._runnable = []  # heap of (priority, seq, chat_id): may send now
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.dropped = 0
+
+    def depth(self):
+        """Number of queued sends (not counting ones in flight)."""
+        return sum(len(c.jobs) for c in self._chats.values())
+
+    def submit(self, chat_id, send, priority=NORMAL):
+        future = asyncio.get_running_loop().create_future()
+        # nobody may await a fire-and-forget send; still surface its errors
+        future.add_done_callback(_log_failure)
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(chat_id)
+        job = (priority, next(self._seq), send, future, 0, time.monotonic())
+        if len(chat.jobs) >= self.chat_queue:
+            # full: the lowest-priority, newest send gives way (maybe this one)
+            worst = max(chat.jobs)
+            if job > worst:
+                future.cancel()
+                self.dropped += 1
+                return future
+            chat.jobs.remove(worst)
+            heapq.heapify(chat.jobs)
+            worst[3].cancel()
+            self.dropped += 1
+        heapq.heappush(chat.jobs, job)
+        self._schedule(chat_id, chat)
+        return future
+
+    def _schedule(self, chat_id, chat):
+        if chat.busy or chat.scheduled:
+            return
+        now = time.monotonic()
+        if not chat.jobs:
+            # forget idle chats once their buckets have refilled
+            if chat.second.full(now) and (chat.minute is None or chat.minute.full(now)) and chat.paused_until <= now:
+                del self._chats[chat_id]
+            return
+        ready_at = max(
+            now + chat.second.delay(now),
+            now + (chat.minute.delay(now) if chat.minute else 0),
+            chat.paused_until,
+        )
+        chat.scheduled = True
+        if ready_at <= now:
+            heapq.heappush(self._runnable, (chat.jobs[0][0], next(self._seq), chat_id))
+        else:
+            heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def run(self):
+        """Dispatcher loop, started once at bot startup."""
+        while True:
+            now = time.monotonic()
+            while self._ready and self._ready[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._ready)
+                chat = self._chats[chat_id]
+                heapq.heappush(self._runnable, (chat.jobs[0][0], next(self._seq), chat_id))
+
+            if not self._runnable:
+                await wait_event(self._wakeup, self._ready[0][0] - now if self._ready else None)
+                continue
+
+            wait = max(self._global.delay(now), self._global_paused_until - now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._runnable)
+            chat = self._chats[chat_id]
+            chat.scheduled = False
+            job = self._next_job(chat, now)
+            if job is None:
+                self._schedule(chat_id, chat)
+                continue
+            self._global.take(now)
+            chat.second.take(now)
+            if chat.minute:
+                chat.minute.take(now)
+            chat.busy = True
+            task = asyncio.create_task(self._send(chat_id, chat, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _next_job(self, chat, now):
+        """Pop the chat's next send, dropping NORMAL/LOW ones that went stale."""
+        while chat.jobs:
+            job = heapq.heappop(chat.jobs)
+            if job[0] == HIGH or self.stale_after <= 0 or now - job[5] <= self.stale_after:
+                return job
+            job[3].cancel()
+            self.dropped += 1
+        return None
+
+    async def _send(self, chat_id, chat, job):
+        priority, seq, send, future, retries, queued_at = job
+        try:
+            result = await send()
+        except Exception as e:
+            wait = getattr(e, "value", None) if self.flood_wait and isinstance(e, self.flood_wait) else None
+            if wait is not None and retries < self.max_retries:
+                # back off this chat (and everyone, briefly) then retry in place
+                self.flood_waits += 1
+                until = time.monotonic() + float(wait)
+                chat.paused_until = max(chat.paused_until, until)
+                self._global_paused_until = max(self._global_paused_until, time.monotonic() + min(float(wait), 1))
+                heapq.heappush(chat.jobs, (priority, seq, send, future, retries + 1, queued_at))
+            else:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self.sent += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            chat.busy = False
+            self._schedule(chat_id, chat)
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print("Outbox send error:", future.exception())
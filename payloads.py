@@ -0,0 +1,48 @@
+# payloads.py - normalized reply payload for a filter
+# Built once when a filter is written (stored as doc["payload"]) so the reply
+# path never re-parses [Label](buttonurl:URL) markup.
+
+import re
+
+# [Text](buttonurl:https://link)  or  [Text](buttonurl: <https://link>)
+BUTTON_RE = re.compile(r"\[([^\]]+)\]\(buttonurl:\s*<?([^>\s)]+)>?\)", re.IGNORECASE)
+
+
+def _button(b):
+    if isinstance(b, dict) and b.get("text") and b.get("url"):
+        return {"text": b["text"], "url": b["url"]}
+    return None
+
+
+def build_payload(doc):
+    """
+    Ready-to-send form of a filter document:
+    {"type": "photo"|"text", "file_id", "caption", "buttons": [[{text, url}], ...]}
+    Buttons found in the text come first, then the stored ones, one per row.
+    """
+    text = doc.get("text") or ""
+    rows = []
+    matches = BUTTON_RE.findall(text)
+    if matches:
+        for label, url in matches:
+            rows.append([{"text": label.strip(), "url": url.strip()}])
+        text = BUTTON_RE.sub("", text).strip()
+
+    for b in doc.get("buttons") or []:
+        # older imports may hold rows (lists) instead of single buttons
+        row = [x for x in map(_button, b if isinstance(b, list) else [b]) if x]
+        if row:
+            rows.append(row)
+
+    is_photo = doc.get("type") == "photo" and doc.get("file_id")
+    return {
+        "type": "photo" if is_photo else "text",
+        "file_id": doc.get("file_id") if is_photo else None,
+        "caption": text,
+        "buttons": rows,
+    }
+
+
+def get_payload(doc):
+    """Stored payload, or one built on the fly for filters saved before payloads existed."""
+    return doc.get("payload") or build_payload(doc)
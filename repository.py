@@ -0,0 +1,141 @@
+# repository.py - async MongoDB access layer for main.py
+# All handler DB traffic goes through here so a slow query only suspends the
+# handler that issued it, never the Pyrogram event loop.
+# Env: MONGO_POOL_SIZE (max pooled connections), MONGO_TIMEOUT (seconds per op)
+
+import inspect
+import os
+import time
+from contextlib import contextmanager
+
+import pymongo
+from pymongo import AsyncMongoClient
+
+from metrics import MONGO_ERRORS, MONGO_SECONDS
+
+MONGO_POOL_SIZE = int(os.environ.get("MONGO_POOL_SIZE", "50"))
+MONGO_TIMEOUT = float(os.environ.get("MONGO_TIMEOUT", "5"))
+DB_NAME = "Sachuscencespacks_db"
+
+
+async def maybe_await(value):
+    """Await value if it is awaitable; lets helpers take sync or async collections."""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class Collection:
+    """
+    Async wrapper around one collection. Every call runs under a
+    per-operation deadline (MONGO_TIMEOUT unless timeout= is given) and is
+    timed into mongo_op_seconds.
+    find() returns a list; use cursor() to stream large results.
+    """
+
+    def __init__(self, col, timeout=MONGO_TIMEOUT):
+        self.col = col
+        self.name = col.name
+        self.timeout = timeout
+
+    @contextmanager
+    def _op(self, op, timeout):
+        """Deadline plus latency/error metrics for one operation."""
+        start = time.perf_counter()
+        try:
+            with pymongo.timeout(timeout or self.timeout):
+                yield
+        except Exception:
+            MONGO_ERRORS.inc(collection=self.name, op=op)
+            raise
+        finally:
+            MONGO_SECONDS.observe(time.perf_counter() - start, collection=self.name, op=op)
+
+    async def find(self, query, projection=None, sort=None, limit=0, timeout=None):
+        with self._op("find", timeout):
+            cursor = self.col.find(query, projection, sort=sort, limit=limit)
+            return await cursor.to_list(None)
+
+    def cursor(self, query, projection=None, sort=None, batch_size=500):
+        """Raw async cursor for streaming; the caller owns its lifetime."""
+        return self.col.find(query, projection, sort=sort, batch_size=batch_size)
+
+    async def find_one(self, query, projection=None, timeout=None):
+        with self._op("find_one", timeout):
+            return await self.col.find_one(query, projection)
+
+    async def insert_one(self, doc, timeout=None):
+        with self._op("insert_one", timeout):
+            return await self.col.insert_one(doc)
+
+    async def update_one(self, query, update, upsert=False, timeout=None):
+        with self._op("update_one", timeout):
+            return await self.col.update_one(query, update, upsert=upsert)
+
+    async def update_many(self, query, update, timeout=None):
+        with self._op("update_many", timeout):
+            return await self.col.update_many(query, update)
+
+    async def find_one_and_update(self, query, update, upsert=False, timeout=None):
+        """Apply update and return the document as it is afterwards."""
+        with self._op("find_one_and_update", timeout):
+            return await self.col.find_one_and_update(
+                query, update, upsert=upsert, return_document=pymongo.ReturnDocument.AFTER
+            )
+
+    async def delete_one(self, query, timeout=None):
+        with self._op("delete_one", timeout):
+            return await self.col.delete_one(query)
+
+    async def delete_many(self, query, timeout=None):
+        with self._op("delete_many", timeout):
+            return await self.col.delete_many(query)
+
+    async def count_documents(self, query, timeout=None):
+        with self._op("count_documents", timeout):
+            return await self.col.count_documents(query)
+
+    async def distinct(self, key, query=None, timeout=None):
+        with self._op("distinct", timeout):
+            return await self.col.distinct(key, query)
+
+    async def bulk_write(self, requests, ordered=False, timeout=None):
+        with self._op("bulk_write", timeout):
+            return await self.col.bulk_write(requests, ordered=ordered)
+
+    async def aggregate(self, pipeline, timeout=None):
+        with self._op("aggregate", timeout):
+            cursor = await self.col.aggregate(pipeline)
+            return await cursor.to_list(None)
+
+
+class Repository:
+    """The bot's collections, each wrapped in Collection."""
+
+    def __init__(self, client, db_name=DB_NAME, timeout=MONGO_TIMEOUT):
+        self.client = client
+        self.db = client[db_name]
+        self.timeout = timeout
+        self.filters = Collection(self.db["filters"], timeout)
+        self.connections = Collection(self.db["connections"], timeout)
+        self.user_conn = Collection(self.db["user_conn"], timeout)
+        self.requests = Collection(self.db["requests"], timeout)
+        self.sync = Collection(self.db["sync"], timeout)
+        self.pending_deletes = Collection(self.db["pending_deletes"], timeout)
+        self.stats = Collection(self.db["stats"], timeout)
+
+    async def dbstats(self):
+        with pymongo.timeout(self.timeout):
+            return await self.client.admin.command("dbstats")
+
+
+def connect(uri, **kwargs):
+    """Pooled async client for uri. Connects lazily on first operation."""
+    client = AsyncMongoClient(
+        uri,
+        tls=True,
+        maxPoolSize=MONGO_POOL_SIZE,
+        minPoolSize=min(5, MONGO_POOL_SIZE),
+        **kwargs,
+    )
+    return Repository(client)
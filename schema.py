@@ -0,0 +1,121 @@
+# schema.py - index bootstrap and hot-query check for the bot collections
+# Run once at startup: creates the indexes every hot query relies on, then
+# explain()s each hot query and warns (or refuses to start with
+# SCHEMA_STRICT=1) if one would still scan a whole collection.
+# Works with the async repository db (main.py) or a pymongo db (testbot.py).
+
+import os
+
+from pymongo import ASCENDING, DESCENDING
+
+from repository import maybe_await
+
+SCHEMA_STRICT = os.environ.get("SCHEMA_STRICT", "0") == "1"
+REQUESTS_TTL_DAYS = int(os.environ.get("REQUESTS_TTL_DAYS", "30"))
+
+# collection -> [(keys, options)]
+MAIN_INDEXES = {
+    "filters": [
+        ([("chat_id", ASCENDING), ("keyword", ASCENDING)], {"name": "chat_keyword", "unique": True}),
+    ],
+    "connections": [
+        ([("admin_id", ASCENDING)], {"name": "admin_id"}),
+        ([("group_id", ASCENDING)], {"name": "group_id"}),
+    ],
+    "user_conn": [
+        ([("user_id", ASCENDING)], {"name": "user_id", "unique": True}),
+    ],
+    "requests": [
+        ([("time", ASCENDING)], {"name": "time_ttl", "expireAfterSeconds": REQUESTS_TTL_DAYS * 86400}),
+        ([("chat", ASCENDING), ("time", DESCENDING)], {"name": "chat_time"}),
+    ],
+    "pending_deletes": [
+        ([("due", ASCENDING)], {"name": "due"}),
+    ],
+}
+
+# collection -> [(query, sort)] issued on hot paths
+MAIN_HOT_QUERIES = {
+    "filters": [
+        ({"chat_id": 0}, None),
+        ({"chat_id": 0, "keyword": ""}, None),
+        ({"chat_id": 0}, [("keyword", ASCENDING)]),
+        ({"chat_id": 0, "keyword": {"$gt": ""}}, [("keyword", ASCENDING)]),  # /filters pages
+    ],
+    "connections": [
+        ({"admin_id": 0}, None),
+        ({"group_id": 0}, None),
+    ],
+    "user_conn": [
+        ({"user_id": 0}, None),
+    ],
+}
+
+# testbot.py (db.py). messages is only read by (_id, enabled), which the
+# default _id index already serves, so it needs no extra index.
+TESTBOT_INDEXES = {
+    "movieslist": [
+        ([("name", ASCENDING), ("enabled", ASCENDING)], {"name": "name_enabled"}),
+        ([("message_id", ASCENDING)], {"name": "message_id"}),
+    ],
+    "pending_deletes": [
+        ([("due", ASCENDING)], {"name": "due"}),
+    ],
+}
+
+TESTBOT_HOT_QUERIES = {
+    "movieslist": [
+        ({"name": "", "enabled": 1}, None),
+        ({"message_id": ""}, None),
+    ],
+    "messages": [
+        ({"_id": "", "enabled": 1}, None),
+    ],
+}
+
+
+def _collscan(plan):
+    """True if any stage of an explain plan is a COLLSCAN."""
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_collscan(v) for v in plan)
+    return False
+
+
+async def ensure_indexes(db, indexes):
+    for name, specs in indexes.items():
+        for keys, options in specs:
+            try:
+                await maybe_await(db[name].create_index(keys, **options))
+            except Exception as e:
+                # e.g. duplicate keys blocking a unique index; check_hot_queries reports the fallout
+                print(f"⚠️ Could not create index {name}.{options.get('name')}: {e}")
+
+
+async def check_hot_queries(db, hot_queries):
+    """Names of hot queries whose winning plan still scans a whole collection."""
+    scans = []
+    for name, queries in hot_queries.items():
+        for query, sort in queries:
+            try:
+                plan = await maybe_await(db[name].find(query, sort=sort).explain())
+            except Exception as e:
+                print(f"⚠️ Could not explain {name} {query}: {e}")
+                continue
+            if _collscan(plan.get("queryPlanner", {}).get("winningPlan", plan)):
+                scans.append(f"{name} {sorted(query)}" + (f" sort {sort}" if sort else ""))
+    return scans
+
+
+async def ensure_schema(db, indexes, hot_queries, strict=SCHEMA_STRICT):
+    """Create indexes, then verify hot queries; raises in strict mode on a COLLSCAN."""
+    await ensure_indexes(db, indexes)
+    scans = await check_hot_queries(db, hot_queries)
+    for scan in scans:
+        print(f"⚠️ Hot query would collection-scan: {scan}")
+    if scans and strict:
+        raise RuntimeError(f"Refusing to start, hot queries without an index: {', '.join(scans)}")
+    return scans
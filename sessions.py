@@ -0,0 +1,81 @@
+# sessions.py - in-process cache of user_conn (admin session state)
+# Private handlers read active_group / pending_import /
+# awaiting_clear_password from here instead of a find_one per message.
+# Writes go to Mongo first and are then applied to the cached copy; entries
+# expire after SESSION_TTL seconds so edits made elsewhere are picked up.
+# Users without a user_conn document are answered from a known-users set
+# (also refreshed every SESSION_TTL) without touching the DB.
+
+import os
+import time
+
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "600"))  # seconds
+
+
+def _apply(doc, update):
+    """Apply $set/$unset to doc in place; False if update uses anything else."""
+    for op, fields in update.items():
+        if op == "$set":
+            doc.update(fields)
+        elif op == "$unset":
+            for key in fields:
+                doc.pop(key, None)
+        else:
+            return False
+    return True
+
+
+class SessionCache:
+    """get(user_id) returns the user's user_conn document ({} if none)."""
+
+    def __init__(self, collection, ttl=SESSION_TTL):
+        self.col = collection
+        self.ttl = ttl
+        self._items = {}  # user_id -> (expires, doc)
+        self._known = None  # user_ids that have a document
+        self._known_expires = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def _known_users(self):
+        now = time.monotonic()
+        if self._known is None or now >= self._known_expires:
+            self._known = set(await self.col.distinct("user_id"))
+            self._known_expires = now + self.ttl
+        return self._known
+
+    async def get(self, user_id):
+        now = time.monotonic()
+        item = self._items.get(user_id)
+        if item is not None and item[0] > now:
+            self.hits += 1
+            return item[1]
+        if user_id not in await self._known_users():
+            self.hits += 1
+            return {}
+        self.misses += 1
+        doc = await self.col.find_one({"user_id": user_id}) or {}
+        self._items[user_id] = (now + self.ttl, doc)
+        return doc
+
+    async def update(self, user_id, update, upsert=False):
+        """Write-through update_one on the user's document."""
+        res = await self.col.update_one({"user_id": user_id}, update, upsert=upsert)
+        if upsert and self._known is not None:
+            self._known.add(user_id)
+        item = self._items.get(user_id)
+        if item is not None:
+            doc = dict(item[1])
+            if _apply(doc, update):
+                doc["user_id"] = user_id
+                self._items[user_id] = (item[0], doc)
+            else:
+                # operators we don't mirror ($addToSet, ...): reload next time
+                del self._items[user_id]
+        return res
+
+    def invalidate(self, user_id):
+        self._items.pop(user_id, None)
+
+    def stats(self):
+        return {"sessions": len(self._items), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,280 @@
+# shards.py - group auto reply matching sharded across worker processes by chat_id
+# With SHARD_WORKERS=N the fuzzy matching leaves the bot's event loop:
+# chat_id % N picks the worker process (python -m shards) that owns the
+# chat and keeps its filter index in a FilterCache of its own. The bot
+# process stays the coordinator: it receives every update, runs the
+# admin/private commands, does all Mongo and Telegram I/O, ships a chat's
+# filters to its worker on first use and forwards every filter write there.
+# Each worker reads its requests from one pipe in order, so a chat's writes
+# and matches never overtake each other. A match carries its deadline: a
+# worker that fell behind skips the ones nobody waits for any more, and the
+# bot matches those texts in process instead, from a small LRU of filters
+# it keeps for that (SHARD_FALLBACK_MB).
+# Env: SHARD_WORKERS (default 0 = match in the bot process), SHARD_TIMEOUT, SHARD_FALLBACK_MB
+
+import asyncio
+import itertools
+import os
+import pickle
+import struct
+import sys
+import time
+
+from filter_cache import ChatFilters, FilterCache
+from matcher import FUZZY_THRESHOLD, match_tiered
+from payloads import get_payload
+
+SHARD_WORKERS = int(os.environ.get("SHARD_WORKERS", "0"))
+SHARD_TIMEOUT = float(os.environ.get("SHARD_TIMEOUT", "10"))  # seconds to wait for a match
+SHARD_FALLBACK_MB = float(os.environ.get("SHARD_FALLBACK_MB", "16"))  # coordinator's filters for fallback matches
+
+_HEADER = struct.Struct(">I")  # frame length; frames are pickled tuples
+MISSING = "missing"  # worker reply: chat not loaded, send its filters
+
+
+class ShardError(Exception):
+    """A shard worker is down, failed a request or did not answer in time."""
+
+
+def _frame(obj):
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data)) + data
+
+
+# ---------------- worker process ----------------
+
+class ShardWorker:
+    """State of one worker process: the filters of the chats it owns."""
+
+    def __init__(self):
+        self.cache = FilterCache()
+
+    def match(self, chat_id, text, score_cutoff, docs=None, keep=True):
+        """
+        (has_filters, (kid, score, payload) or None, tier), or MISSING when
+        the chat is not loaded and docs were not sent. keep=False matches
+        against docs without caching them (they raced a write).
+        """
+        entry = self.cache.get(chat_id)
+        if entry is None:
+            if docs is None:
+                return MISSING
+            entry = self.cache.put(chat_id, docs) if keep else ChatFilters(chat_id, docs)
+        if not entry:
+            return False, None, None
+        tier, kid, score = match_tiered(text, entry.index, score_cutoff)
+        if kid is None:
+            return True, None, tier
+        return True, (kid, score, get_payload(entry.by_id[kid])), tier
+
+    def upsert(self, chat_id, doc):
+        self.cache.upsert(chat_id, doc)
+
+    def remove(self, chat_id, keyword):
+        self.cache.remove(chat_id, keyword)
+
+    def invalidate(self, chat_id):
+        self.cache.invalidate(chat_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def serve(inp, out):
+    """Worker loop: answer framed (req_id, op, args, deadline) requests until stdin closes."""
+    worker = ShardWorker()
+    while True:
+        header = inp.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        req_id, op, args, deadline = pickle.loads(inp.read(_HEADER.unpack(header)[0]))
+        try:
+            if deadline is not None and time.time() > deadline:
+                # the coordinator gave up on it already
+                raise ShardError("expired before it was served")
+            result, ok = getattr(worker, op)(*args), True
+        except Exception as e:
+            result, ok = f"{type(e).__name__}: {e}", False
+            if req_id is None:
+                print(f"Shard {op} error:", result)
+        if req_id is not None:
+            out.write(_frame((req_id, ok, result)))
+            out.flush()
+
+
+# ---------------- coordinator ----------------
+
+class _Shard:
+    """Coordinator side of one worker process; restarted if it dies."""
+
+    def __init__(self, index):
+        self.index = index
+        self.proc = None
+        self.pending = {}  # req_id -> future
+        self.restarts = 0
+        self.closing = False
+        self._ids = itertools.count()
+        self._reader = None
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "shards",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        self._reader = asyncio.create_task(self._read(self.proc))
+
+    def send(self, op, *args, reply=False, deadline=None):
+        """
+        Queue a request; returns (req_id, future for the reply) if reply is
+        set. deadline (time.time()) lets the worker skip it once it is late.
+        """
+        if self.proc is None or self.proc.returncode is not None or self.proc.stdin.is_closing():
+            if reply:
+                raise ShardError(f"shard {self.index} is not running")
+            # a restarted worker starts empty and loads fresh filters, nothing to replay
+            return None
+        req_id = next(self._ids) if reply else None
+        self.proc.stdin.write(_frame((req_id, op, args, deadline)))
+        if reply:
+            future = self.pending[req_id] = asyncio.get_running_loop().create_future()
+            return req_id, future
+        return None
+
+    async def _read(self, proc):
+        try:
+            while True:
+                header = await proc.stdout.readexactly(_HEADER.size)
+                req_id, ok, result = pickle.loads(await proc.stdout.readexactly(_HEADER.unpack(header)[0]))
+                future = self.pending.pop(req_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(ShardError(result))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ShardError(f"shard {self.index} worker exited"))
+        if self.closing:
+            return
+        await proc.wait()
+        print(f"Shard {self.index} worker exited ({proc.returncode}), restarting")
+        self.restarts += 1
+        await self.start()
+
+    async def close(self):
+        self.closing = True
+        if self.proc is None:
+            return
+        if not self.proc.stdin.is_closing():
+            self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), 5)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+        if self._reader is not None:
+            await self._reader
+
+
+class ShardPool:
+    """
+    N worker processes, chat_id % N owns a chat. match() asks the owner;
+    upsert/remove/invalidate forward filter writes without waiting.
+    """
+
+    def __init__(self, workers=SHARD_WORKERS, timeout=SHARD_TIMEOUT):
+        self.timeout = timeout
+        self._shards = [_Shard(i) for i in range(max(1, workers))]
+
+    def __len__(self):
+        return len(self._shards)
+
+    def shard(self, chat_id):
+        return self._shards[chat_id % len(self._shards)]
+
+    async def start(self):
+        await asyncio.gather(*(s.start() for s in self._shards))
+
+    async def close(self):
+        await asyncio.gather(*(s.close() for s in self._shards))
+
+    async def _ask(self, shard, op, *args):
+        req_id, future = shard.send(op, *args, reply=True, deadline=time.time() + self.timeout)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise ShardError(f"shard {shard.index} did not answer within {self.timeout:g}s")
+        finally:
+            # the reader pops answered requests; one that timed out is still here
+            shard.pending.pop(req_id, None)
+
+    async def match(self, chat_id, text, load, score_cutoff=FUZZY_THRESHOLD):
+        """
+        (has_filters, (kid, score, payload) or None, tier) for a group text.
+        load() returns (docs, keep) for the chat when its worker has not
+        got it yet; keep=False if a write raced the load.
+        """
+        shard = self.shard(chat_id)
+        result = await self._ask(shard, "match", chat_id, text, score_cutoff)
+        if result == MISSING:
+            docs, keep = await load()
+            result = await self._ask(shard, "match", chat_id, text, score_cutoff, docs, keep)
+        return result
+
+    def upsert(self, chat_id, doc):
+        self.shard(chat_id).send("upsert", chat_id, doc)
+
+    def remove(self, chat_id, keyword):
+        self.shard(chat_id).send("remove", chat_id, keyword)
+
+    def invalidate(self, chat_id):
+        self.shard(chat_id).send("invalidate", chat_id)
+
+    async def stats(self):
+        """Per-worker FilterCache stats (None for a worker that is down)."""
+        results = await asyncio.gather(*(self._ask(s, "stats") for s in self._shards), return_exceptions=True)
+        return [None if isinstance(r, Exception) else r for r in results]
+
+    def depth(self):
+        """Match requests waiting on a worker."""
+        return sum(len(s.pending) for s in self._shards)
+
+    @property
+    def restarts(self):
+        return sum(s.restarts for s in self._shards)
+
+
+class ShardedFilterCache(FilterCache):
+    """
+    The coordinator's FilterCache when matching is sharded: it keeps the
+    per-chat versions (used by filter_pages and loads), only the filters of
+    chats matched in process while their shard failed (budget_mb), and
+    forwards every write to the worker that owns the chat.
+    """
+
+    def __init__(self, pool, budget_mb=SHARD_FALLBACK_MB):
+        super().__init__(budget_mb=budget_mb)
+        self.pool = pool
+
+    def upsert(self, chat_id, doc):
+        super().upsert(chat_id, doc)
+        self.pool.upsert(chat_id, doc)
+
+    def remove(self, chat_id, keyword):
+        super().remove(chat_id, keyword)
+        self.pool.remove(chat_id, keyword)
+
+    def invalidate(self, chat_id):
+        super().invalidate(chat_id)
+        self.pool.invalidate(chat_id)
+
+
+if __name__ == "__main__":
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr  # the pipe carries replies only; stray prints go to the log
+    serve(sys.stdin.buffer, out)
@@ -0,0 +1,168 @@
+# stats.py - precomputed counters behind the /status dashboard
+# The stats collection holds one document per chat ({_id: chat_id, filters,
+# hits, misses}) and one global document ({_id: "global", filters, groups,
+# hits, misses, requests_by_day, storage_mb}). Filter writes adjust them as
+# they happen, match hits/misses and requests are buffered in memory and
+# flushed every STATS_FLUSH_INTERVAL seconds, and a reconcile pass recounts
+# everything every STATS_RECONCILE_INTERVAL seconds to correct any drift.
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+STATS_FLUSH_INTERVAL = int(os.environ.get("STATS_FLUSH_INTERVAL", "60"))  # seconds
+STATS_RECONCILE_INTERVAL = int(os.environ.get("STATS_RECONCILE_INTERVAL", "3600"))  # seconds
+STATS_DAYS_KEPT = int(os.environ.get("STATS_DAYS_KEPT", "90"))  # days of requests_by_day kept
+
+GLOBAL = "global"
+
+
+def _today():
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+class Stats:
+    """
+    Counters for /status. collection is the async repository stats
+    collection, filters the filters collection (read only by reconcile),
+    dbstats an async callable returning the dbstats command result.
+    """
+
+    def __init__(self, collection, filters, dbstats=None,
+                 flush_interval=STATS_FLUSH_INTERVAL, reconcile_interval=STATS_RECONCILE_INTERVAL):
+        self.col = collection
+        self.filters = filters
+        self.dbstats = dbstats
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self._matches = {}   # chat_id -> [hits, misses] since the last flush
+        self._requests = {}  # day -> count since the last flush
+        self._pending = [0, 0]  # hits, misses in _matches (keeps snapshot O(1))
+
+    # ---- write paths ----
+
+    async def filters_changed(self, chat_id, delta):
+        """A chat gained (delta > 0) or lost filters; keeps per-chat, total and group counts."""
+        if not delta:
+            return
+        try:
+            doc = await self.col.find_one_and_update({"_id": chat_id}, {"$inc": {"filters": delta}}, upsert=True)
+            after = doc.get("filters", 0)
+            groups = 0
+            if delta > 0 and after == delta:
+                groups = 1   # first filters in this chat
+            elif delta < 0 and after <= 0 < after - delta:
+                groups = -1  # last filters removed
+            await self.col.update_one({"_id": GLOBAL}, {"$inc": {"filters": delta, "groups": groups}}, upsert=True)
+        except Exception as e:
+            # counters are advisory; reconcile() repairs them
+            print("Stats update error:", e)
+
+    def record_match(self, chat_id, hit):
+        counts = self._matches.get(chat_id)
+        if counts is None:
+            counts = self._matches[chat_id] = [0, 0]
+        counts[0 if hit else 1] += 1
+        self._pending[0 if hit else 1] += 1
+
+    def record_request(self):
+        day = _today()
+        self._requests[day] = self._requests.get(day, 0) + 1
+
+    # ---- background ----
+
+    async def flush(self):
+        """Write buffered hit/miss and request counts with one bulk $inc."""
+        matches, self._matches = self._matches, {}
+        requests, self._requests = self._requests, {}
+        self._pending = [0, 0]
+        if not matches and not requests:
+            return
+        ops = []
+        total = {}
+        for chat_id, (hits, misses) in matches.items():
+            ops.append(UpdateOne({"_id": chat_id}, {"$inc": {"hits": hits, "misses": misses}}, upsert=True))
+            total["hits"] = total.get("hits", 0) + hits
+            total["misses"] = total.get("misses", 0) + misses
+        for day, count in requests.items():
+            total[f"requests_by_day.{day}"] = count
+        ops.append(UpdateOne({"_id": GLOBAL}, {"$inc": total}, upsert=True))
+        try:
+            await self.col.bulk_write(ops, ordered=False)
+        except Exception as e:
+            print("Stats flush error:", e)
+            # put the counts back so the next flush retries them
+            for chat_id, (hits, misses) in matches.items():
+                counts = self._matches.setdefault(chat_id, [0, 0])
+                counts[0] += hits
+                counts[1] += misses
+                self._pending[0] += hits
+                self._pending[1] += misses
+            for day, count in requests.items():
+                self._requests[day] = self._requests.get(day, 0) + count
+
+    async def reconcile(self):
+        """Recount filters per chat from the filters collection and refresh storage size."""
+        rows = await self.filters.aggregate([{"$group": {"_id": "$chat_id", "n": {"$sum": 1}}}], timeout=60)
+        counts = {row["_id"]: row["n"] for row in rows if row["_id"] is not None}
+        ops = [UpdateOne({"_id": chat_id}, {"$set": {"filters": n}}, upsert=True) for chat_id, n in counts.items()]
+        update = {
+            "filters": sum(counts.values()),
+            "groups": len(counts),
+            "reconciled_at": datetime.utcnow(),
+        }
+        if self.dbstats is not None:
+            try:
+                stats = await self.dbstats()
+                update["storage_mb"] = round(stats.get("storageSize", 0) / (1024 * 1024), 2)
+            except Exception as e:
+                print("Stats dbstats error:", e)
+        change = {"$set": update}
+        current = await self.col.find_one({"_id": GLOBAL}, {"requests_by_day": 1}) or {}
+        expired = sorted(current.get("requests_by_day", {}))[:-STATS_DAYS_KEPT]
+        if expired:
+            change["$unset"] = {f"requests_by_day.{day}": "" for day in expired}
+        ops.append(UpdateOne({"_id": GLOBAL}, change, upsert=True))
+        await self.col.bulk_write(ops, ordered=False, timeout=60)
+        await self.col.update_many(
+            {"_id": {"$nin": list(counts) + [GLOBAL]}, "filters": {"$ne": 0}},
+            {"$set": {"filters": 0}},
+        )
+
+    async def run(self):
+        """Flush loop with a reconcile at startup and then every reconcile_interval."""
+        next_reconcile = 0
+        while True:
+            if time.monotonic() >= next_reconcile:
+                try:
+                    await self.reconcile()
+                except Exception as e:
+                    print("Stats reconcile error:", e)
+                next_reconcile = time.monotonic() + self.reconcile_interval
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    # ---- read path ----
+
+    async def snapshot(self):
+        """The global counters (plus anything not flushed yet) as one dict."""
+        doc = await self.col.find_one({"_id": GLOBAL}) or {}
+        hits = doc.get("hits", 0) + self._pending[0]
+        misses = doc.get("misses", 0) + self._pending[1]
+        by_day = dict(doc.get("requests_by_day", {}))
+        for day, count in self._requests.items():
+            by_day[day] = by_day.get(day, 0) + count
+        return {
+            "filters": doc.get("filters", 0),
+            "groups": doc.get("groups", 0),
+            "storage_mb": doc.get("storage_mb", "N/A"),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "requests_today": by_day.get(_today(), 0),
+            "requests_by_day": by_day,
+            "reconciled_at": doc.get("reconciled_at"),
+        }
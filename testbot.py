@@ -2,7 +2,6 @@ from telegram import Update, error
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, Defaults, ContextTypes, MessageHandler, filters
 from zoneinfo import ZoneInfo
-from asyncio import sleep
 import logging
 import time
 import uuid
@@ -10,7 +9,9 @@ import sys
 import re
 # import pytz
 
-from db import Messages, MoviesList, collection, movie_collection
+from db import Messages, MoviesList, collection, movie_collection, pending_deletes_collection, db as bot_db
+from auto_delete import DeleteScheduler
+from schema import TESTBOT_INDEXES, TESTBOT_HOT_QUERIES, ensure_schema
 import logger
 
 
@@ -21,6 +22,9 @@ BOT_NAME = ""
 target_timezone = ZoneInfo("Asia/Kolkata")
 defaults = Defaults(tzinfo=target_timezone)
 
+# Deletions are persisted in pending_deletes and resumed on restart
+delete_scheduler = DeleteScheduler(pending_deletes_collection)
+
 
 async def handle_delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE, remove_msg="", seconds=6):
     chat_id = update.message.chat_id
@@ -35,13 +39,13 @@ async def handle_delete_message(update: Update, context: ContextTypes.DEFAULT_TY
 
     bot_msg_id = reply.message_id
 
-    await sleep(seconds)
+    await delete_scheduler.schedule(chat_id, [user_msg_id, bot_msg_id], seconds)
 
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=user_msg_id)
-        await context.bot.delete_message(chat_id=chat_id, message_id=bot_msg_id)
-    except Exception as e:
-        logging.error(f"Could not delete message: {e}")
+
+async def on_startup(app: Application):
+    await ensure_schema(bot_db, TESTBOT_INDEXES, TESTBOT_HOT_QUERIES)
+    await delete_scheduler.resume()
+    app.create_task(delete_scheduler.run(app.bot.delete_messages))
 
 
 
@@ -323,15 +327,12 @@ async def delall_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Only Admins has the access")
 
 
-def main():
-    app = (
-        Application.builder()
-        .token(TOKEN)
-        .defaults(defaults)
-        .build()
-    )
-
-    logging.info("Bot is running...")
+def build_application(token=TOKEN, request=None):
+    """Application with all handlers registered; request replaces the HTTP backend (benchmarks/replay.py)."""
+    builder = Application.builder().token(token).defaults(defaults).post_init(on_startup)
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    app = builder.build()
 
     #Commands
     app.add_handler(CommandHandler("start", start))
@@ -348,6 +349,14 @@ def main():
     # app.add_error_handler(error)
     # app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_unknown_message))
 
+    return app
+
+
+def main():
+    app = build_application()
+
+    logging.info("Bot is running...")
+
     app.run_polling(poll_interval=3)
 
 
@@ -0,0 +1,10 @@
+# tests/conftest.py - the bot's modules live flat in the repo root
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# logger.py opens errors.log and slow_queries.log in the working directory
+# on import; keep the test run's out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="bot-tests-"))
@@ -0,0 +1,148 @@
+# tests/test_backup.py - incremental backup parsing and the import report
+
+import asyncio
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+from backup import ImportReport, import_filters, iter_backup, normalize_item
+
+FILTERS = [{"keyword": f"Movie {i}", "text": f"caption {i} " + "x" * 40, "chat_id": -100 - i % 2} for i in range(30)]
+
+
+@pytest.fixture(autouse=True)
+def small_reads(monkeypatch):
+    # items and lines straddle many chunk boundaries
+    monkeypatch.setattr(backup, "_READ_SIZE", 16)
+
+
+def write(tmp_path, text, name="backup.json", gz=False):
+    path = tmp_path / name
+    if gz:
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_json_array_read_in_chunks(tmp_path, gz):
+    path = write(tmp_path, "\n  " + json.dumps(FILTERS, indent=1), gz=gz)
+    items = list(iter_backup(path))
+    assert [item for _, item in items] == FILTERS
+    assert items[-1][0] == f"item {len(FILTERS)}"
+
+
+def test_empty_array(tmp_path):
+    assert list(iter_backup(write(tmp_path, "[ ]"))) == []
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_ndjson_bad_line_is_an_item_error(tmp_path, gz):
+    lines = [json.dumps(f) for f in FILTERS[:3]]
+    lines.insert(2, '{"keyword": "broken"')
+    path = write(tmp_path, "\n".join(lines) + "\n\n", gz=gz)
+    items = list(iter_backup(path))
+    assert [where for where, _ in items] == ["line 1", "line 2", "line 3", "line 4"]
+    assert isinstance(items[2][1], ValueError)
+    assert [items[0][1], items[1][1], items[3][1]] == FILTERS[:3]
+
+
+def test_ndjson_without_final_newline(tmp_path):
+    path = write(tmp_path, "\n".join(json.dumps(f) for f in FILTERS[:4]))
+    assert [item for _, item in iter_backup(path)] == FILTERS[:4]
+
+
+def test_truncated_array_raises_after_the_good_items(tmp_path):
+    text = json.dumps(FILTERS[:3])
+    path = write(tmp_path, text[: text.rindex("{") + 10])
+    items = iter_backup(path)
+    assert [next(items)[1] for _ in range(2)] == FILTERS[:2]
+    with pytest.raises(ValueError, match="item 3"):
+        next(items)
+
+
+def test_truncated_gzip_raises(tmp_path):
+    path = write(tmp_path, "\n".join(json.dumps(f) for f in FILTERS), gz=True)
+    with open(path, "rb") as fh:
+        data = fh.read()
+    with open(path, "wb") as fh:
+        fh.write(data[: len(data) // 2])
+    with pytest.raises(EOFError):
+        list(iter_backup(path))
+
+
+def test_normalize_item():
+    doc = normalize_item({"keyword": "  Leo ", "text": "hi", "_id": "x", "chat_id": -5}, -1)
+    assert (doc["keyword"], doc["chat_id"], doc["type"]) == ("leo", -1, "text")
+    assert "_id" not in doc and doc["norm"] == "leo"
+    assert normalize_item({"keyword": "leo", "chat_id": "-5"}, -1, own_chat=True)["chat_id"] == -5
+    assert normalize_item({"keyword": "leo"}, -1, own_chat=True)["chat_id"] == -1
+    assert normalize_item({"keyword": "leo", "file_id": "f"}, -1)["type"] == "photo"
+    for bad, message in [
+        ([], "not a JSON object"),
+        ({"keyword": " "}, "missing keyword"),
+        ({"keyword": "a", "buttons": "x"}, "buttons must be a list"),
+        ({"keyword": "a", "text": 5}, "text must be a string"),
+        (ValueError("bad line"), "bad line"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            normalize_item(bad, -1)
+
+
+class Collection:
+    """bulk_write of upserts keyed by (chat_id, keyword)."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def bulk_write(self, ops, ordered=True, timeout=None):
+        upserted, matched = {}, 0
+        for i, op in enumerate(ops):
+            doc = op._doc["$set"]
+            key = (doc["chat_id"], doc["keyword"])
+            if key in self.docs:
+                matched += 1
+            else:
+                upserted[i] = key
+            self.docs[key] = doc
+        return SimpleNamespace(upserted_ids=upserted, matched_count=matched)
+
+
+def test_import_reports_bad_items_and_a_truncated_tail(tmp_path):
+    text = json.dumps(FILTERS[:5] + [{"keyword": ""}, FILTERS[0]] + FILTERS[5:8])
+    path = write(tmp_path, text[:-30])
+    collection = Collection()
+    batches = []
+
+    async def progress(report):
+        batches.append(report.read)
+
+    report = asyncio.run(import_filters(collection, path, -1, progress=progress, batch_size=3))
+    assert report.read == 9
+    assert (report.upserted, report.modified) == (7, 1)
+    assert [where for where, _ in report.errors] == ["item 6", "file"]
+    assert report.failed == 2
+    assert report.chats == {-1: 7}
+    assert batches == [3, 6, 9, 9]
+    assert len(collection.docs) == 7
+
+
+def test_import_own_chat_restores_each_group(tmp_path):
+    path = write(tmp_path, "\n".join(json.dumps(f) for f in FILTERS[:6]), gz=True)
+    collection = Collection()
+    report = asyncio.run(import_filters(collection, path, -1, own_chat=True))
+    assert report.chats == {-100: 3, -101: 3}
+    assert {chat_id for chat_id, _ in collection.docs} == {-100, -101}
+
+
+def test_import_report_keeps_the_first_errors():
+    report = ImportReport()
+    for i in range(backup.IMPORT_ERRORS_KEPT + 5):
+        report.error(f"line {i}", "bad")
+    assert report.failed == backup.IMPORT_ERRORS_KEPT + 5
+    assert len(report.errors) == backup.IMPORT_ERRORS_KEPT
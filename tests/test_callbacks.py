@@ -0,0 +1,110 @@
+# tests/test_callbacks.py - callbacks.py: callback data codec and router
+
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+import callbacks
+from callbacks import CALLBACK_MAX_BYTES, CallbackRouter, TokenStore, decode_cb, encode_cb
+
+
+@pytest.mark.parametrize("parts", [
+    (),
+    (-1001234567890, 3),
+    ("a|b:c~d", "x"),      # the codec's own separators inside a keyword
+    ("விக்ரம் 🔥", 7),
+    ("", "", ""),
+])
+def test_callback_round_trip(parts):
+    data = encode_cb("filters_view", *parts)
+    assert len(data.encode("utf-8")) <= CALLBACK_MAX_BYTES
+    assert decode_cb(data) == ("filters_view", [str(p) for p in parts])
+
+
+def test_long_callback_goes_through_token_store(monkeypatch):
+    monkeypatch.setattr(callbacks, "tokens", TokenStore(ttl=60, max_size=10))
+    parts = (-1001234567890, "a very long keyword " * 5)
+    data = encode_cb("filters_view", *parts)
+    assert "~" in data and len(data.encode("utf-8")) <= CALLBACK_MAX_BYTES
+    assert decode_cb(data) == ("filters_view", [str(p) for p in parts])
+
+
+def test_expired_or_unknown_token(monkeypatch):
+    monkeypatch.setattr(callbacks, "tokens", TokenStore(ttl=-1, max_size=10))
+    data = encode_cb("view", "k" * 100)
+    assert decode_cb(data) == ("view", None)
+    assert decode_cb("view~nosuchtoken") == ("view", None)
+
+
+@pytest.mark.parametrize("data", [
+    "view|%%%",                                                     # not base64
+    "view|a+b/",                                                    # standard, not url-safe, alphabet
+    "view|A",                                                       # truncated
+    "view|" + base64.urlsafe_b64encode(b"\xff\xfe").decode().rstrip("="),  # not utf-8
+    "view|é",                                                   # non-ascii payload
+])
+def test_callback_decode_rejects_garbage(data):
+    with pytest.raises(ValueError):
+        decode_cb(data)
+
+
+@pytest.mark.parametrize("data", [None, "", "plain"])
+def test_callback_without_payload(data):
+    assert decode_cb(data) == (data or "", [])
+
+
+def _query(data, user_id=1):
+    answers = []
+
+    async def answer(text=None, show_alert=False):
+        answers.append(text)
+
+    return SimpleNamespace(data=data, from_user=SimpleNamespace(id=user_id), answer=answer), answers
+
+
+def _router():
+    router = CallbackRouter(admins=[1])
+    calls = []
+
+    @router.route("page", int)
+    async def page(client, cq, gid, number="1"):
+        calls.append((gid, number))
+
+    @router.route("boom", admin_only=False)
+    async def boom(client, cq):
+        raise KeyError("handler bug")
+
+    return router, calls
+
+
+@pytest.mark.parametrize("data", [
+    encode_cb("page", "x"),        # part does not convert
+    encode_cb("page"),             # too few parts
+    encode_cb("page", 1, 2, 3),    # too many parts
+    "page|%%%",                    # does not decode
+])
+def test_router_answers_invalid_data(data):
+    router, calls = _router()
+    cq, answers = _query(data)
+    asyncio.run(router.dispatch(None, cq))
+    assert answers == ["Invalid data"] and calls == []
+
+
+def test_router_converts_parts_and_checks_admins():
+    router, calls = _router()
+    cq, answers = _query(encode_cb("page", -100, 2))
+    asyncio.run(router.dispatch(None, cq))
+    assert calls == [(-100, "2")] and answers == []
+    cq, answers = _query(encode_cb("page", -100), user_id=2)
+    asyncio.run(router.dispatch(None, cq))
+    assert calls == [(-100, "2")] and answers == ["⚠️ Only admins can use this."]
+
+
+def test_router_lets_handler_errors_propagate():
+    router, _ = _router()
+    cq, answers = _query(encode_cb("boom"))
+    with pytest.raises(KeyError):
+        asyncio.run(router.dispatch(None, cq))
+    assert answers == []
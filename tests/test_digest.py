@@ -0,0 +1,63 @@
+# tests/test_digest.py - admin request digest over the outbox
+
+import asyncio
+
+from digest import RequestDigest
+from outbox import HIGH, LOW, Outbox
+
+
+def _digest():
+    digest = RequestDigest()
+    digest.add(-100, "Leo!!", 1)
+    digest.add(-100, "leo", 2)
+    digest.add(-200, "Vikram", 3, source="request")
+    return digest
+
+
+def test_dropped_digest_goes_back_for_the_next_flush():
+    async def run():
+        outbox = Outbox(chat_queue=1)
+        digest = _digest()
+        sent = []
+
+        async def deliver(text):
+            sent.append(text)
+
+        def send(admin, text):
+            return outbox.submit(admin, lambda: deliver(text), LOW)
+
+        flushing = asyncio.create_task(digest.flush(send, [7]))
+        await asyncio.sleep(0)
+        # a HIGH send to the same chat pushes the LOW digest out of the full queue
+        outbox.submit(7, lambda: deliver("reply"), HIGH)
+        await flushing
+        assert not flushing.cancelled()
+        assert sent == []
+        # nothing lost, and what arrived meanwhile is merged in
+        digest.add(-100, "LEO", 4)
+        assert len(digest) == 2
+        entry = digest.pending[(-100, "leo")]
+        assert entry["count"] == 3 and entry["users"] == {1, 2, 4}
+
+        # once the outbox runs, the next flush delivers it
+        runner = asyncio.create_task(outbox.run())
+        await digest.flush(send, [8])
+        runner.cancel()
+        assert sent[0] == "reply" and "4 requests, 2 titles" in sent[1]
+        assert len(digest) == 0
+
+    asyncio.run(run())
+
+
+def test_failed_send_is_logged_not_retried(capsys):
+    async def run():
+        digest = _digest()
+
+        async def send(admin, text):
+            raise RuntimeError("blocked by user")
+
+        await digest.flush(send, [7, 8])
+        assert len(digest) == 0
+
+    asyncio.run(run())
+    assert capsys.readouterr().out.count("Admin digest error: blocked by user") == 2
@@ -0,0 +1,107 @@
+# tests/test_dispatch.py - FairDispatcher: round-robin across chats, FIFO within
+# one, per-chat and global caps, drop-oldest and the submitter's context
+
+import asyncio
+import contextvars
+import logging
+
+import pytest
+
+from dispatch import FairDispatcher
+
+label = contextvars.ContextVar("label", default=None)
+
+
+def _job(log, name, gate=None):
+    async def run():
+        if gate is not None:
+            await gate.wait()
+        log.append(name)
+        return name
+    return run
+
+
+def test_round_robin_across_chats_fifo_within():
+    async def run():
+        log = []
+        gate = asyncio.Event()
+        fair = FairDispatcher(workers=1, chat_inflight=1)
+        futures = [fair.submit(0, _job(log, "block", gate))]
+        futures += [fair.submit(1, _job(log, f"a{i}")) for i in range(3)]
+        futures += [fair.submit(2, _job(log, f"b{i}")) for i in range(2)]
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(*futures), 2)
+        assert log == ["block", "a0", "b0", "a1", "b1", "a2"]
+        assert fair.handled == 6 and fair.inflight == 0 and fair.depth() == 0
+
+    asyncio.run(run())
+
+
+def test_inflight_caps():
+    async def run():
+        gate = asyncio.Event()
+        fair = FairDispatcher(workers=3, chat_inflight=2)
+        futures = [fair.submit(1, _job([], i, gate)) for i in range(4)]
+        futures += [fair.submit(2, _job([], i, gate)) for i in range(4)]
+        await asyncio.sleep(0)
+        assert fair.inflight == 3
+        assert fair.depth() == 5
+        assert fair._chats[1].inflight <= 2 and fair._chats[2].inflight <= 2
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(*futures), 2)
+        assert fair.handled == 8
+
+    asyncio.run(run())
+
+
+def test_full_chat_queue_drops_oldest():
+    async def run():
+        log = []
+        gate = asyncio.Event()
+        fair = FairDispatcher(workers=1, chat_inflight=1, chat_queue=2)
+        running = fair.submit(1, _job(log, "running", gate))
+        queued = [fair.submit(1, _job(log, f"q{i}")) for i in range(3)]
+        assert queued[0].cancelled()
+        assert fair.dropped == 1
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(running, *queued[1:]), 2)
+        assert log == ["running", "q1", "q2"]
+
+    asyncio.run(run())
+
+
+def test_job_runs_in_the_submitters_context():
+    async def run():
+        fair = FairDispatcher(workers=1)
+
+        async def read():
+            return label.get()
+
+        label.set("first")
+        first = fair.submit(1, read)
+        label.set("second")
+        second = fair.submit(1, read)
+        assert await asyncio.wait_for(asyncio.gather(first, second), 2) == ["first", "second"]
+
+    asyncio.run(run())
+
+
+def test_handler_error_is_logged_and_the_chat_keeps_going(caplog):
+    async def run():
+        log = []
+        fair = FairDispatcher(workers=1)
+
+        async def boom():
+            raise ValueError("boom")
+
+        failed = fair.submit(7, boom)
+        after = fair.submit(7, _job(log, "after"))
+        await asyncio.wait_for(asyncio.wait([failed, after]), 2)
+        with pytest.raises(ValueError):
+            failed.result()
+        assert after.result() == "after"
+        assert fair._chats == {}
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(run())
+    assert "Handler failed in chat 7" in caplog.text
@@ -0,0 +1,93 @@
+# tests/test_filter_pages.py - keyset pages and their cache
+
+import asyncio
+
+import callbacks
+from callbacks import TokenStore, decode_cb, encode_cb
+from filter_pages import NEXT, PREV, FilterPages
+
+
+class MemoryFilters:
+    """The find/count_documents slice of the repository filters collection."""
+
+    def __init__(self, keywords):
+        self.keywords = sorted(keywords)
+        self.finds = 0
+
+    async def find(self, query, projection=None, sort=None, limit=0):
+        self.finds += 1
+        cond = query.get("keyword", {})
+        kws = [k for k in self.keywords if ("$gt" not in cond or k > cond["$gt"]) and ("$lt" not in cond or k < cond["$lt"])]
+        if sort and sort[0][1] == -1:
+            kws.reverse()
+        return [{"keyword": k} for k in kws[:limit or None]]
+
+    async def count_documents(self, query):
+        return len(self.keywords)
+
+
+KEYWORDS = [f"title {i:02d}" for i in range(25)]
+
+
+def _pages(keywords=KEYWORDS):
+    versions = {}
+    col = MemoryFilters(keywords)
+    return col, versions, FilterPages(col, lambda chat_id: versions.get(chat_id, 0))
+
+
+def test_keyset_paging_both_ways():
+    async def run():
+        _, _, pages = _pages()
+        first = await pages.get(1, lambda p: p, size=10)
+        assert first.keywords == KEYWORDS[:10] and (first.has_prev, first.has_next) == (False, True)
+        second = await pages.get(1, lambda p: p, 2, NEXT, first.last, size=10)
+        third = await pages.get(1, lambda p: p, 3, NEXT, second.last, size=10)
+        assert third.keywords == KEYWORDS[20:] and (third.has_next, third.pages) == (False, 3)
+        back = await pages.get(1, lambda p: p, 2, PREV, third.first, size=10)
+        assert back.keywords == second.keywords and (back.has_prev, back.has_next) == (True, True)
+
+    asyncio.run(run())
+
+
+def test_slices_cached_until_the_version_moves():
+    async def run():
+        col, versions, pages = _pages()
+        await pages.get(1, lambda p: p, size=10)
+        await pages.get(1, lambda p: p, size=10)
+        assert (col.finds, pages.hits, pages.misses) == (1, 1, 1)
+        versions[1] = 1  # a filter write
+        await pages.get(1, lambda p: p, size=10)
+        assert col.finds == 2
+
+    asyncio.run(run())
+
+
+def test_stale_anchor_starts_over():
+    async def run():
+        _, _, pages = _pages()
+        page = await pages.get(1, lambda p: p, 4, NEXT, "zzz", size=10)
+        assert page.number == 1 and page.keywords == KEYWORDS[:10]
+
+    asyncio.run(run())
+
+
+def test_cached_page_gets_fresh_callback_tokens(monkeypatch):
+    async def run():
+        # keywords too long to inline: their buttons go through the token store
+        long_keywords = [f"{'விக்ரம் ' * 3}{i}" for i in range(5)]
+        col, _, pages = _pages(long_keywords)
+
+        def render(page):
+            return [encode_cb("filters_view", -100, kw) for kw in page.keywords]
+
+        monkeypatch.setattr(callbacks, "tokens", TokenStore(ttl=3600))
+        before = await pages.get(1, render)
+        assert all("~" in data for data in before)
+        # the tokens die (TTL or restart); the cached slice must not serve them
+        monkeypatch.setattr(callbacks, "tokens", TokenStore(ttl=3600))
+        assert decode_cb(before[0]) == ("filters_view", None)
+        after = await pages.get(1, render)
+        assert col.finds == 1
+        assert [decode_cb(data) for data in after] == [("filters_view", ["-100", kw]) for kw in long_keywords]
+
+    asyncio.run(run())
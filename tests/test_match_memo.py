@@ -0,0 +1,49 @@
+# tests/test_match_memo.py - memoized match results: version check and LRU bound
+
+from match_memo import MatchMemo
+
+
+def test_hit_for_the_same_version_only():
+    memo = MatchMemo(size=10)
+    memo.put(1, "leo", 5, "result")
+    assert memo.get(1, "leo", 5) == "result"
+    assert memo.get(2, "leo", 5) is None
+    assert memo.get(1, "leo", 6) is None
+    # the stale entry is gone, not kept for the old version
+    assert memo.get(1, "leo", 5) is None
+    assert len(memo) == 0
+
+
+def test_none_result_is_a_miss():
+    memo = MatchMemo(size=10)
+    assert memo.get(1, "leo", 0) is None
+    assert (memo.hits, memo.misses) == (0, 1)
+
+
+def test_lru_bound_keeps_recently_used():
+    memo = MatchMemo(size=2)
+    memo.put(1, "a", 0, "A")
+    memo.put(1, "b", 0, "B")
+    assert memo.get(1, "a", 0) == "A"  # a is now the most recent
+    memo.put(1, "c", 0, "C")
+    assert memo.get(1, "b", 0) is None
+    assert memo.get(1, "a", 0) == "A"
+    assert memo.get(1, "c", 0) == "C"
+    assert len(memo) == 2
+
+
+def test_size_zero_disables():
+    memo = MatchMemo(size=0)
+    memo.put(1, "a", 0, "A")
+    assert len(memo) == 0
+    assert memo.get(1, "a", 0) is None
+
+
+def test_hit_ratio():
+    memo = MatchMemo(size=10)
+    assert memo.hit_ratio() == 0.0
+    memo.put(1, "a", 0, "A")
+    memo.get(1, "a", 0)
+    memo.get(1, "a", 0)
+    memo.get(1, "b", 0)
+    assert memo.stats()["hit_ratio"] == round(2 / 3, 3)
@@ -0,0 +1,112 @@
+# tests/test_matcher.py - tiered and indexed matching agree with best_match
+# best_match (one rapidfuzz call over every keyword) is the reference: the
+# n-gram index must find the same winner, and match_tiered may only differ
+# where a prefix/token tier is confident (FAST_EXIT_SCORE) or closer.
+
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from benchmarks.corpus import make_corpus, make_queries, typo
+from matcher import (
+    EXACT, FAST_EXIT_SCORE, FUZZY, FUZZY_THRESHOLD, INDEX_MIN_KEYWORDS, NONE, PREFIX, TOKEN,
+    TieredIndex, best_match, match_indexed, match_tiered,
+)
+from normalize import normalize
+
+EXTRA = ["master", "master 2", "leo das", "vikram", "jailer", "beast mode on"]
+
+
+def build(size):
+    keywords = sorted({normalize(k) for k in make_corpus(size, seed=11)} | set(EXTRA))
+    index = TieredIndex()
+    for kid, keyword in enumerate(keywords):
+        index.add(kid, keyword)
+    return keywords, index
+
+
+def queries(keywords):
+    rnd = random.Random(12)
+    out = [normalize(q) for q in make_queries(keywords, count=600, seed=13)]
+    # typos, extra and missing words, reordered words of known keywords
+    for keyword in rnd.sample(keywords, 200):
+        words = keyword.split()
+        out.append(typo(rnd, keyword))
+        out.append(keyword + " " + rnd.choice(["bro", "scene", "2", "pls"]))
+        out.append(" ".join(reversed(words)))
+        if len(words) > 1:
+            out.append(" ".join(words[:-1]))
+    return [q for q in out if q]
+
+
+@pytest.fixture(scope="module", params=[300, INDEX_MIN_KEYWORDS + 1000], ids=["scan", "indexed"])
+def corpus(request):
+    keywords, index = build(request.param)
+    return keywords, index, queries(keywords)
+
+
+def test_indexed_matches_best_match(corpus):
+    keywords, index, texts = corpus
+    for text in texts:
+        expected = best_match(text, keywords)
+        found = match_indexed(text, index)
+        if expected is None:
+            assert found is None, text
+        else:
+            assert found is not None, text
+            assert found[0] == expected[0], text
+            assert found[1] == pytest.approx(expected[1]), text
+
+
+def test_tiered_never_worse_than_best_match(corpus):
+    keywords, index, texts = corpus
+    tiers = set()
+    for text in texts:
+        expected = best_match(text, keywords)
+        tier, kid, score = match_tiered(text, index)
+        tiers.add(tier)
+        if tier == NONE:
+            assert expected is None, text
+            continue
+        keyword = keywords[kid]
+        if tier == TOKEN:
+            # words in any order, scored on the lengths as if in order
+            assert set(text.split()) >= set(keyword.split()), text
+            assert score == pytest.approx(200 * len(keyword) / (len(text) + len(keyword))), text
+        else:
+            # the other tiers report the real ratio of the keyword they picked
+            assert score == pytest.approx(fuzz.ratio(text, keyword)), text
+        assert score >= FUZZY_THRESHOLD, text
+        if tier in (EXACT, FUZZY):
+            assert (kid, score) == (expected[0], pytest.approx(expected[1])), text
+        elif expected is not None:
+            # a fast tier wins when confident, or when fuzzy found nothing as close
+            assert score >= FAST_EXIT_SCORE or score > expected[1], text
+    assert tiers == {EXACT, PREFIX, TOKEN, FUZZY, NONE}
+
+
+@pytest.mark.parametrize("text, tier, keyword", [
+    ("vikram", EXACT, "vikram"),
+    ("vikrm", FUZZY, "vikram"),
+    ("jailar", FUZZY, "jailer"),
+    ("master 2", EXACT, "master 2"),
+    ("beast mode on 2", PREFIX, "beast mode on"),
+    ("master 2 pls", FUZZY, "master 2"),  # prefix under FAST_EXIT_SCORE, fuzzy ties it
+    ("das leo", TOKEN, "leo das"),
+    ("on mode beast", TOKEN, "beast mode on"),
+])
+def test_tiered_cases(text, tier, keyword):
+    keywords, index = build(300)
+    found_tier, kid, _ = match_tiered(text, index)
+    assert (found_tier, keywords[kid]) == (tier, keyword)
+
+
+def test_index_follows_removals():
+    keywords, index = build(300)
+    kid = keywords.index("leo das")
+    index.remove(kid)
+    assert match_tiered("das leo", index)[1] != kid
+    assert match_tiered("leo das", index)[0] != EXACT
+    index.add(kid, "leo das")
+    assert match_tiered("leo das", index)[:2] == (EXACT, kid)
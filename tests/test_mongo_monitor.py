@@ -0,0 +1,57 @@
+# tests/test_mongo_monitor.py - CommandMonitor: per-op timing for every command,
+# query shapes only for slow ones
+
+from types import SimpleNamespace
+
+import mongo_monitor
+from mongo_monitor import CommandMonitor, command_shape
+
+
+def run(monitor, command, ms, request_id=1):
+    name = next(iter(command))
+    event = SimpleNamespace(
+        command_name=name, command=command, connection_id=("db", 1), request_id=request_id,
+        database_name="bot", duration_micros=int(ms * 1000),
+    )
+    monitor.started(event)
+    monitor.succeeded(event)
+
+
+def test_command_shape_hides_values():
+    shape = command_shape("find", {"find": "filters", "filter": {"chat_id": 5, "keyword": {"$in": ["a", "b"]}}})
+    assert shape == {"find": {"filter": {"chat_id": "?", "keyword": {"$in": "?"}}}}
+
+
+def test_fast_commands_skip_the_shape(monkeypatch):
+    calls = []
+    monkeypatch.setattr(mongo_monitor, "command_shape", lambda *a: calls.append(a) or {})
+    monitor = CommandMonitor(slow_ms=50)
+    for i in range(5):
+        run(monitor, {"find": "filters", "filter": {"chat_id": i}}, ms=1, request_id=i)
+    assert calls == []
+    assert monitor.shapes == {}
+    op = monitor.by_op[("filters", "find")]
+    assert (op.count, op.slow) == (5, 0)
+
+
+def test_slow_commands_are_grouped_by_shape(monkeypatch):
+    queued = []
+    monitor = CommandMonitor(slow_ms=50)
+    monkeypatch.setattr(monitor, "_ensure_thread", lambda: None)
+    monkeypatch.setattr(monitor._queue, "put_nowait", queued.append)
+    run(monitor, {"find": "filters", "filter": {"chat_id": 1}}, ms=80, request_id=1)
+    run(monitor, {"find": "filters", "filter": {"chat_id": 2}}, ms=120, request_id=2)
+    run(monitor, {"find": "filters", "filter": {"chat_id": 3}}, ms=2, request_id=3)
+    assert len(monitor.shapes) == 1
+    (_, _, shape, stats), = monitor.top()
+    assert (stats.count, stats.max_ms) == (2, 120)
+    assert '"chat_id": "?"' in shape
+    assert len(queued) == 2
+    op = monitor.by_op[("filters", "find")]
+    assert (op.count, op.slow) == (3, 2)
+    text = monitor.render_top()
+    assert "filters.find 3 calls" in text and "over 2 slow runs" in text
+
+
+def test_render_top_empty():
+    assert "No operations recorded yet." in CommandMonitor().render_top()
@@ -0,0 +1,118 @@
+# tests/test_negative_cache.py - remembered misses: version guard, expiry,
+# per-chat and global bounds, clearing on filter writes, reply cooldown
+
+import pytest
+
+import negative_cache
+from negative_cache import NegativeCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(negative_cache.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_miss_is_remembered_until_ttl(clock):
+    cache = NegativeCache(ttl=60)
+    cache.add(1, "leo", True)
+    assert cache.get(1, "leo") is True
+    assert cache.get(2, "leo") is None
+    clock.now += 60
+    assert cache.get(1, "leo") is None
+    assert len(cache) == 0 and cache.hits == 1
+
+
+def test_add_is_skipped_when_the_version_moved(clock):
+    versions = {1: 3}
+    cache = NegativeCache(version=versions.get, ttl=60)
+    cache.add(1, "leo", True, version=2)
+    assert cache.get(1, "leo") is None
+    cache.add(1, "leo", True, version=3)
+    assert cache.get(1, "leo") is True
+
+
+def test_ttl_zero_disables(clock):
+    cache = NegativeCache(ttl=0)
+    cache.add(1, "leo", True)
+    assert len(cache) == 0
+
+
+def test_per_chat_bound_drops_oldest(clock):
+    cache = NegativeCache(ttl=60, per_chat=2)
+    for text in ("a", "b", "c"):
+        cache.add(1, text, True)
+    assert cache.get(1, "a") is None
+    assert cache.get(1, "c") is True
+    assert len(cache) == 2
+
+
+def test_global_bound_evicts_from_the_quietest_chat(clock):
+    cache = NegativeCache(ttl=60, per_chat=10, max_size=3)
+    cache.add(1, "a", True)
+    cache.add(2, "b", True)
+    cache.add(1, "c", True)  # chat 1 missed most recently
+    cache.add(3, "d", True)
+    assert cache.get(2, "b") is None
+    assert [cache.get(1, "a"), cache.get(1, "c"), cache.get(3, "d")] == [True, True, True]
+    assert len(cache) == 3 and cache.evicted == 1
+
+
+def test_sweep_drops_expired_misses_of_quiet_chats(clock):
+    cache = NegativeCache(ttl=60)
+    cache.add(1, "a", True)
+    cache.add(2, "b", True)
+    clock.now += 61
+    cache.add(3, "c", True)  # past the sweep time
+    assert len(cache) == 1
+    assert cache.stats()["chats"] == 1
+
+
+def test_filter_added_drops_matching_misses(clock):
+    cache = NegativeCache(ttl=60)
+    cache.add(1, "leo", True)
+    cache.add(1, "jailer", True)
+    cache.filter_added(1, {"keyword": "Leo"})
+    assert cache.get(1, "leo") is None
+    assert cache.get(1, "jailer") is True
+    assert cache.cleared == 1
+
+
+def test_filter_added_drops_no_filters_misses(clock):
+    cache = NegativeCache(ttl=60)
+    cache.add(1, "jailer", False)
+    cache.filter_added(1, {"keyword": "leo"})
+    assert cache.get(1, "jailer") is None
+
+
+def test_clear_forgets_a_chat(clock):
+    cache = NegativeCache(ttl=60)
+    cache.add(1, "a", True)
+    cache.add(1, "b", True)
+    cache.add(2, "c", True)
+    cache.clear(1)
+    assert len(cache) == 1 and cache.cleared == 2
+
+
+def test_reply_cooldown_per_user_and_chat(clock):
+    cache = NegativeCache(ttl=60, cooldown=30)
+    assert cache.reply_allowed(1, 7)
+    assert not cache.reply_allowed(1, 7)
+    assert cache.reply_allowed(1, 8)
+    assert cache.reply_allowed(2, 7)
+    clock.now += 30
+    assert cache.reply_allowed(1, 7)
+
+
+def test_no_cooldown_always_replies(clock):
+    cache = NegativeCache(ttl=60, cooldown=0)
+    assert cache.reply_allowed(1, 7) and cache.reply_allowed(1, 7)
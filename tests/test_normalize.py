@@ -0,0 +1,48 @@
+# tests/test_normalize.py - normalize.py: one comparable form per title
+
+import pytest
+
+from benchmarks.corpus import CHATTER, TAMIL, make_corpus, make_queries
+from normalize import NORM_VERSION, keyword_norm, normalize, set_norm
+
+SAMPLES = make_corpus(300, seed=21) + make_queries(make_corpus(100, seed=22), count=300, seed=23) + CHATTER + TAMIL
+
+
+@pytest.mark.parametrize("translit", [False, True])
+def test_normalize_is_idempotent(translit):
+    for text in SAMPLES:
+        once = normalize(text, translit)
+        assert normalize(once, translit) == once, text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Leo!!", "leo"),
+    ("  LEO \t 2 ", "leo 2"),
+    ("𝗟𝗲𝗼", "leo"),          # mathematical bold
+    ("ＬＥＯ", "leo"),         # fullwidth
+    ("Leo ❤️🔥", "leo"),       # emoji and variation selector
+    ("leo-das", "leo das"),
+    ("விக்ரம்", "விக்ரம்"),     # vowel signs are kept
+])
+def test_normalize_folds(text, expected):
+    assert normalize(text, translit=False) == expected
+
+
+def test_normalize_transliterates_tamil_and_spellings():
+    assert normalize("விக்ரம்", translit=True) == normalize("Vikram", translit=True) == "vikram"
+    assert normalize("Maaster", translit=True) == normalize("master", translit=True)
+
+
+@pytest.mark.parametrize("text", [None, "", "   ", "🔥🔥", "!!! ???", "‍️", "\x00\x1f"])
+def test_normalize_nothing_to_match(text):
+    assert normalize(text) == ""
+
+
+def test_norm_round_trip():
+    doc = set_norm({"keyword": "Leo DAS!"})
+    assert (doc["norm"], doc["norm_v"]) == ("leo das", NORM_VERSION)
+    assert keyword_norm(doc) == "leo das"
+    # a norm stored under other settings (or none at all) is recomputed
+    assert keyword_norm({"keyword": "Leo DAS!", "norm": "stale", "norm_v": "0"}) == "leo das"
+    assert keyword_norm({"keyword": "Leo DAS!"}) == "leo das"
+    assert keyword_norm({}) == ""
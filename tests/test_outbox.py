@@ -0,0 +1,129 @@
+# tests/test_outbox.py - outbound queue: order, bounds and FloodWait retries
+
+import asyncio
+
+import pytest
+
+import outbox as outbox_module
+from outbox import HIGH, LOW, NORMAL, Outbox
+
+
+class FloodWait(Exception):
+    def __init__(self, value):
+        super().__init__(f"wait {value}s")
+        self.value = value
+
+
+@pytest.fixture(autouse=True)
+def fast_chats(monkeypatch):
+    # per-chat buckets off the real 1 msg/s so a test doesn't wait on them
+    monkeypatch.setattr(outbox_module, "OUTBOX_CHAT_RATE", 1000)
+    monkeypatch.setattr(outbox_module, "OUTBOX_GROUP_PER_MIN", 60000)
+
+
+def _recorder(sent):
+    def send(label):
+        async def deliver():
+            sent.append(label)
+            return label
+        return deliver
+    return send
+
+
+async def _drain(box, futures):
+    runner = asyncio.create_task(box.run())
+    try:
+        await asyncio.wait_for(asyncio.wait(futures), 2)
+    finally:
+        runner.cancel()
+
+
+def test_priority_then_fifo_per_chat():
+    async def run():
+        box = Outbox(global_rate=1000)
+        sent = []
+        send = _recorder(sent)
+        futures = [
+            box.submit(-1, send("low"), LOW),
+            box.submit(-1, send("normal 1"), NORMAL),
+            box.submit(-1, send("high"), HIGH),
+            box.submit(-1, send("normal 2"), NORMAL),
+        ]
+        await _drain(box, futures)
+        assert sent == ["high", "normal 1", "normal 2", "low"]
+        assert [f.result() for f in futures] == ["low", "normal 1", "high", "normal 2"]
+        assert (box.sent, box.dropped, box.depth()) == (4, 0, 0)
+
+    asyncio.run(run())
+
+
+def test_full_queue_drops_lowest_priority_newest():
+    async def run():
+        box = Outbox(global_rate=1000, chat_queue=2)
+        sent = []
+        send = _recorder(sent)
+        low_1 = box.submit(-1, send("low 1"), LOW)
+        low_2 = box.submit(-1, send("low 2"), LOW)
+        high = box.submit(-1, send("high"), HIGH)  # low 2 gives way
+        low_3 = box.submit(-1, send("low 3"), LOW)  # worse than all queued: refused
+        assert low_2.cancelled() and low_3.cancelled()
+        assert box.dropped == 2 and box.depth() == 2
+        await _drain(box, [low_1, high])
+        assert sent == ["high", "low 1"]
+
+    asyncio.run(run())
+
+
+def test_stale_normal_and_low_are_dropped_high_is_not():
+    async def run():
+        box = Outbox(global_rate=1000, stale_after=0.05)
+        sent = []
+        send = _recorder(sent)
+        futures = [box.submit(-1, send(p), p) for p in (LOW, NORMAL, HIGH)]
+        await asyncio.sleep(0.1)
+        fresh = box.submit(-1, send("fresh"), NORMAL)
+        await _drain(box, futures + [fresh])
+        assert sent == [HIGH, "fresh"]
+        assert futures[0].cancelled() and futures[1].cancelled()
+        assert box.dropped == 2
+
+    asyncio.run(run())
+
+
+def test_flood_wait_is_retried_then_fails():
+    async def run():
+        box = Outbox(flood_wait=FloodWait, global_rate=1000, max_retries=2)
+        attempts = []
+
+        def flaky(fail_times):
+            async def deliver():
+                attempts.append(fail_times)
+                if attempts.count(fail_times) <= fail_times:
+                    raise FloodWait(0.01)
+                return "ok"
+            return deliver
+
+        recovers = box.submit(-1, flaky(2), HIGH)
+        gives_up = box.submit(-2, flaky(5), HIGH)
+        await _drain(box, [recovers, gives_up])
+        assert recovers.result() == "ok"
+        assert isinstance(gives_up.exception(), FloodWait)
+        assert attempts.count(2) == 3 and attempts.count(5) == 3
+        assert (box.sent, box.failed, box.flood_waits) == (1, 1, 4)
+
+    asyncio.run(run())
+
+
+def test_other_errors_fail_without_retry():
+    async def run():
+        box = Outbox(flood_wait=FloodWait, global_rate=1000)
+
+        async def broken():
+            raise ValueError("bad request")
+
+        future = box.submit(-1, broken, HIGH)
+        await _drain(box, [future])
+        assert isinstance(future.exception(), ValueError)
+        assert (box.failed, box.flood_waits) == (1, 0)
+
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+# tests/test_sessions.py - SessionCache: cached reads and write-through updates
+
+import asyncio
+
+import pytest
+
+import sessions
+from sessions import SessionCache
+
+
+class Users:
+    """user_conn collection: find_one/update_one/distinct, counting reads."""
+
+    def __init__(self, docs=()):
+        self.docs = {d["user_id"]: dict(d) for d in docs}
+        self.finds = 0
+        self.distincts = 0
+
+    async def find_one(self, query):
+        self.finds += 1
+        doc = self.docs.get(query["user_id"])
+        return dict(doc) if doc else None
+
+    async def distinct(self, field):
+        self.distincts += 1
+        return list(self.docs)
+
+    async def update_one(self, query, update, upsert=False):
+        user_id = query["user_id"]
+        doc = self.docs.get(user_id)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self.docs[user_id] = {"user_id": user_id}
+        for op, fields in update.items():
+            if op == "$set":
+                doc.update(fields)
+            elif op == "$unset":
+                for key in fields:
+                    doc.pop(key, None)
+            elif op == "$inc":
+                for key, n in fields.items():
+                    doc[key] = doc.get(key, 0) + n
+        return None
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_reads_are_cached_until_ttl(clock):
+    async def run():
+        col = Users([{"user_id": 1, "active_group": -5}])
+        cache = SessionCache(col, ttl=60)
+        assert (await cache.get(1))["active_group"] == -5
+        assert (await cache.get(1))["active_group"] == -5
+        assert col.finds == 1
+        clock.now += 60
+        await cache.get(1)
+        assert col.finds == 2 and col.distincts == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    asyncio.run(run())
+
+
+def test_unknown_users_skip_the_db(clock):
+    async def run():
+        col = Users([{"user_id": 1}])
+        cache = SessionCache(col, ttl=60)
+        assert await cache.get(2) == {}
+        assert await cache.get(3) == {}
+        assert col.finds == 0 and col.distincts == 1
+
+    asyncio.run(run())
+
+
+def test_set_and_unset_are_written_through(clock):
+    async def run():
+        col = Users([{"user_id": 1, "active_group": -5}])
+        cache = SessionCache(col, ttl=60)
+        await cache.get(1)
+        await cache.update(1, {"$set": {"pending_import": True}})
+        assert (await cache.get(1))["pending_import"] is True
+        await cache.update(1, {"$unset": {"pending_import": ""}})
+        assert "pending_import" not in await cache.get(1)
+        assert col.finds == 1
+        assert col.docs[1] == {"user_id": 1, "active_group": -5}
+
+    asyncio.run(run())
+
+
+def test_cached_doc_is_not_mutated_in_place(clock):
+    async def run():
+        col = Users([{"user_id": 1}])
+        cache = SessionCache(col, ttl=60)
+        before = await cache.get(1)
+        await cache.update(1, {"$set": {"active_group": -7}})
+        assert "active_group" not in before
+        assert (await cache.get(1))["active_group"] == -7
+
+    asyncio.run(run())
+
+
+def test_other_operators_reload(clock):
+    async def run():
+        col = Users([{"user_id": 1}])
+        cache = SessionCache(col, ttl=60)
+        await cache.get(1)
+        await cache.update(1, {"$inc": {"imports": 1}})
+        assert (await cache.get(1))["imports"] == 1
+        assert col.finds == 2
+
+    asyncio.run(run())
+
+
+def test_upsert_makes_a_new_user_known(clock):
+    async def run():
+        col = Users()
+        cache = SessionCache(col, ttl=60)
+        assert await cache.get(9) == {}
+        await cache.update(9, {"$set": {"awaiting_clear_password": True}}, upsert=True)
+        assert (await cache.get(9))["awaiting_clear_password"] is True
+
+    asyncio.run(run())
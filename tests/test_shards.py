@@ -0,0 +1,66 @@
+# tests/test_shards.py - shard worker protocol and the coordinator's requests
+
+import asyncio
+import io
+import pickle
+import time
+
+from normalize import set_norm
+from shards import _HEADER, MISSING, ShardError, ShardPool, ShardWorker, _frame, serve
+
+DOCS = [set_norm({"chat_id": -1, "keyword": k, "type": "text", "text": k}) for k in ("leo", "vikram", "jailer")]
+
+
+def _replies(requests):
+    out = io.BytesIO()
+    serve(io.BytesIO(b"".join(_frame(r) for r in requests)), out)
+    data, replies = out.getvalue(), []
+    while data:
+        size = _HEADER.unpack(data[:_HEADER.size])[0]
+        replies.append(pickle.loads(data[_HEADER.size:_HEADER.size + size]))
+        data = data[_HEADER.size + size:]
+    return replies
+
+
+def test_worker_asks_for_filters_then_keeps_them():
+    worker = ShardWorker()
+    assert worker.match(-1, "leo", 80) == MISSING
+    has_filters, (kid, score, payload), tier = worker.match(-1, "vikrm", 80, DOCS)
+    assert (has_filters, tier, payload["caption"]) == (True, "fuzzy", "vikram")
+    assert worker.match(-1, "jailer", 80)[2] == "exact"
+    # docs that raced a write are matched but not kept
+    assert worker.match(-2, "leo", 80, DOCS, False)[1] is not None
+    assert worker.match(-2, "leo", 80) == MISSING
+    assert worker.match(-3, "leo", 80, []) == (False, None, None)
+
+
+def test_serve_skips_requests_past_their_deadline():
+    late = time.time() - 1
+    replies = _replies([
+        (None, "upsert", (-1, DOCS[0]), None),
+        (1, "match", (-1, "leo", 80, DOCS), late),
+        (2, "match", (-1, "leo", 80, DOCS), time.time() + 60),
+        (3, "stats", (), None),
+    ])
+    assert [(req_id, ok) for req_id, ok, _ in replies] == [(1, False), (2, True), (3, True)]
+    assert "expired" in replies[0][2]
+    assert replies[1][2][1][2]["caption"] == "leo"
+
+
+def test_timed_out_request_is_forgotten():
+    async def run():
+        pool = ShardPool(1, timeout=0.001)
+        await pool.start()
+        try:
+            shard = pool._shards[0]
+            try:
+                await pool._ask(shard, "stats")
+            except ShardError:
+                pass
+            assert shard.pending == {}
+            pool.timeout = 10
+            assert (await pool._ask(shard, "stats"))["chats"] == 0
+        finally:
+            await pool.close()
+
+    asyncio.run(run())